@@ -0,0 +1,95 @@
+"""
+評論菜名抽取的微基準：舊版（兩個 regex + 線性去重）對比菜名詞庫 trie regex（dish_lexicon.compile_trie_pattern）版本，
+同時列出兩者在範例評論上的輸出，方便看雜訊片段是否減少。
+
+    python -m benchmarks.dish_extraction [--rounds 2000]
+"""
+import argparse
+import os
+import re
+import time
+
+# config 在 import 時就要 DISCORD_BOT_TOKEN；這裡用不到。
+os.environ.setdefault("DISCORD_BOT_TOKEN", "offline")
+
+from dish_lexicon import get_extractor  # noqa: E402
+
+REVIEWS = [
+    [
+        {"text": "推薦豚骨拉麵，湯頭很濃，叉燒好吃，溏心蛋也很入味。"},
+        {"text": "中午人很多要排隊，拉麵值得等，餃子普通。"},
+        {"text": "必點豚骨拉麵！加麵免費，服務很好推薦給大家"},
+    ],
+    [
+        {"text": "牛肉湯好喝，肉很嫩，配肉燥飯剛好。"},
+        {"text": "招牌牛肉湯一早就排隊，推薦早點來。"},
+        {"text": "環境乾淨，老闆很親切，價格在學區算合理。"},
+    ],
+    [
+        {"text": "推薦這家的氣氛，很適合聊天，鬆餅好吃，拿鐵也不錯。"},
+        {"text": "舒芙蕾很推，但等很久，咖啡值得一試。"},
+    ],
+    [
+        {"text": "超推他們家的鍋燒意麵跟虱目魚肚粥，蝦捲好吃。"},
+        {"text": "炒飯太鹹，其他都還可以，碗粿值得一試。"},
+    ],
+    [
+        {"text": "The ramen is great, highly recommend the tonkotsu."},
+        {"text": "老闆推薦的今日特餐很好吃"},
+    ],
+]
+
+
+def legacy_extract(reviews: list[dict]) -> list[str]:
+    patterns = [
+        re.compile(r"(推薦|必點|招牌|必吃|超推)\s*([^\s，。.!！?？]{1,10})"),
+        re.compile(r"([^\s，。.!！?？]{1,10})(好吃|好喝|很推|值得)"),
+    ]
+    generic_words = {"好吃", "好喝", "很推", "值得", "推薦", "必點", "招牌", "必吃", "超推"}
+    items: list[str] = []
+    for rev in reviews or []:
+        text = rev.get("text", "") or ""
+        for p in patterns:
+            for m in p.finditer(text):
+                dish = (m.group(2) if m.re is patterns[0] else m.group(1)) or ""
+                dish = dish.strip("：:，。.!！?？ 、「」[]()（）")
+                if not dish or dish in generic_words:
+                    continue
+                if dish not in items:
+                    items.append(dish)
+        if len(items) >= 5:
+            break
+    return items[:5]
+
+
+def _time(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for reviews in REVIEWS:
+            fn(reviews)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    extractor = get_extractor()
+    current = lambda reviews: extractor.extract(reviews, limit=5)  # noqa: E731
+    for reviews in REVIEWS:
+        print(f"legacy : {legacy_extract(reviews)}")
+        print(f"current: {current(reviews)}")
+        print()
+
+    legacy_s = _time(legacy_extract, args.rounds)
+    current_s = _time(current, args.rounds)
+    n = args.rounds * len(REVIEWS)
+    print(f"places : {n}（lexicon {len(extractor.dishes)} 個菜名）")
+    print(f"legacy : {legacy_s / n * 1e6:8.2f} µs/place")
+    print(f"current: {current_s / n * 1e6:8.2f} µs/place")
+    print(f"speedup: {legacy_s / current_s:.2f}x（快取命中時不再掃描）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+本機假上游：一個 aiohttp 伺服器同時實作 Google Maps、USDA、Open-Meteo 與 LLM gateway
+被 bot 呼叫到的端點，資料來自 benchmarks.synthetic.World（以成大為中心的合成餐廳）。
+
+    python -m benchmarks.fake_upstream --port 8765 \
+        --latency place_details=180:0.4 --latency llm=6000:0.5 --llm-ms-per-kchar 400 \
+        --error-rate 0.01 --rate-limit-rate 0.02 --rps-limit place_details=50
+
+再把 .env 的 GOOGLE_MAPS_BASE_URL / USDA_BASE_URL / OPEN_METEO_GEOCODING_URL /
+OPEN_METEO_FORECAST_URL / LLM_BASE_URL 指到 http://127.0.0.1:8765 即可。
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional
+
+from aiohttp import web
+
+from benchmarks import synthetic
+
+ENDPOINTS = (
+    "geocode", "places_search", "place_details", "distance_matrix",
+    "weather_geocode", "weather", "usda", "llm",
+)
+
+DEFAULT_LATENCY = {
+    "geocode": (120.0, 0.3),
+    "places_search": (380.0, 0.3),
+    "place_details": (190.0, 0.35),
+    "distance_matrix": (160.0, 0.3),
+    "weather_geocode": (90.0, 0.3),
+    "weather": (130.0, 0.3),
+    "usda": (320.0, 0.3),
+    "llm": (1500.0, 0.4),
+}
+
+
+@dataclass
+class FaultProfile:
+    # endpoint -> (median ms, lognormal sigma)
+    latency: dict[str, tuple[float, float]] = field(default_factory=lambda: dict(DEFAULT_LATENCY))
+    latency_scale: float = 1.0
+    llm_ms_per_kchar: float = 300.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    # endpoint -> 每秒上限；超過回 429
+    rps_limit: dict[str, float] = field(default_factory=dict)
+    seed: int = 0
+
+
+class _TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class FakeUpstream:
+    def __init__(self, world: Optional[synthetic.World] = None, profile: Optional[FaultProfile] = None):
+        self.world = world or synthetic.World()
+        self.profile = profile or FaultProfile()
+        self.stats: Counter = Counter()
+        self._rng = random.Random(self.profile.seed)
+        self._buckets = {name: _TokenBucket(rate) for name, rate in self.profile.rps_limit.items()}
+
+    # ---- 故障與延遲注入 ----
+    async def _inject(self, endpoint: str, extra_ms: float = 0.0) -> Optional[web.Response]:
+        self.stats[f"{endpoint}.requests"] += 1
+        bucket = self._buckets.get(endpoint)
+        if (bucket and not bucket.take()) or self._rng.random() < self.profile.rate_limit_rate:
+            self.stats[f"{endpoint}.429"] += 1
+            return web.json_response({"status": "OVER_QUERY_LIMIT", "error": "rate limited"}, status=429)
+        median, sigma = self.profile.latency.get(endpoint, (0.0, 0.0))
+        delay_ms = (median * self._rng.lognormvariate(0.0, sigma) if median > 0 else 0.0) + extra_ms
+        delay_ms *= self.profile.latency_scale
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000)
+        if self._rng.random() < self.profile.error_rate:
+            self.stats[f"{endpoint}.500"] += 1
+            return web.json_response({"status": "UNKNOWN_ERROR", "error": "injected failure"}, status=500)
+        return None
+
+    # ---- Google Maps ----
+    async def geocode(self, request: web.Request) -> web.Response:
+        if (fault := await self._inject("geocode")) is not None:
+            return fault
+        return web.json_response(self.world.geocode(request.query.get("address", "")))
+
+    async def places_search(self, request: web.Request) -> web.Response:
+        if (fault := await self._inject("places_search")) is not None:
+            return fault
+        q = request.query
+        return web.json_response(
+            self.world.text_search(q.get("query", ""), q.get("location", ""), float(q.get("radius", 2000)))
+        )
+
+    async def place_details(self, request: web.Request) -> web.Response:
+        if (fault := await self._inject("place_details")) is not None:
+            return fault
+        return web.json_response(self.world.place_details(request.query.get("place_id", "")))
+
+    async def distance_matrix(self, request: web.Request) -> web.Response:
+        if (fault := await self._inject("distance_matrix")) is not None:
+            return fault
+        q = request.query
+        return web.json_response(
+            synthetic.distance_matrix(q.get("origins", ""), q.get("destinations", ""), q.get("mode", "walking"))
+        )
+
+    # ---- Open-Meteo ----
+    async def weather_geocode(self, request: web.Request) -> web.Response:
+        if (fault := await self._inject("weather_geocode")) is not None:
+            return fault
+        return web.json_response(synthetic.weather_geocode(request.query.get("name", "")))
+
+    async def weather(self, request: web.Request) -> web.Response:
+        if (fault := await self._inject("weather")) is not None:
+            return fault
+        q = request.query
+        return web.json_response(synthetic.weather(q.get("latitude", ""), q.get("longitude", "")))
+
+    # ---- USDA ----
+    async def usda_search(self, request: web.Request) -> web.Response:
+        if (fault := await self._inject("usda")) is not None:
+            return fault
+        return web.json_response(synthetic.usda_search(request.query.get("query", "")))
+
+    async def usda_food(self, request: web.Request) -> web.Response:
+        if (fault := await self._inject("usda")) is not None:
+            return fault
+        return web.json_response(synthetic.usda_food(request.match_info["fdc_id"]))
+
+    # ---- LLM gateway ----
+    async def llm_generate(self, request: web.Request) -> web.Response:
+        try:
+            payload = await request.json()
+        except json.JSONDecodeError:
+            return web.json_response({"error": "invalid json"}, status=400)
+        prompt = str(payload.get("prompt", ""))
+        # prompt 越長 prefill 越久，模擬 gemma3 的實際行為。
+        extra = len(prompt) / 1000 * self.profile.llm_ms_per_kchar
+        if (fault := await self._inject("llm", extra)) is not None:
+            return fault
+        return web.json_response(synthetic.llm_answer_from_prompt(prompt))
+
+    async def stats_handler(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.get("/maps/api/geocode/json", self.geocode),
+            web.get("/maps/api/place/textsearch/json", self.places_search),
+            web.get("/maps/api/place/details/json", self.place_details),
+            web.get("/maps/api/distancematrix/json", self.distance_matrix),
+            web.get("/v1/search", self.weather_geocode),
+            web.get("/v1/forecast", self.weather),
+            web.get("/fdc/v1/foods/search", self.usda_search),
+            web.get("/fdc/v1/food/{fdc_id}", self.usda_food),
+            web.post("/api/generate", self.llm_generate),
+            web.get("/_stats", self.stats_handler),
+        ])
+        return app
+
+
+async def start(host: str = "127.0.0.1", port: int = 8765, **kwargs) -> tuple[web.AppRunner, FakeUpstream]:
+    """在目前的 event loop 起伺服器（給 load generator 之類的工具內嵌使用）。"""
+    upstream = FakeUpstream(**kwargs)
+    runner = web.AppRunner(upstream.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, upstream
+
+
+def _parse_latency(values: list[str]) -> dict[str, tuple[float, float]]:
+    out = dict(DEFAULT_LATENCY)
+    for item in values:
+        endpoint, _, spec = item.partition("=")
+        median, _, sigma = spec.partition(":")
+        if endpoint not in ENDPOINTS:
+            raise SystemExit(f"unknown endpoint {endpoint!r}; choose from {', '.join(ENDPOINTS)}")
+        out[endpoint] = (float(median), float(sigma) if sigma else out[endpoint][1])
+    return out
+
+
+def _parse_rps(values: list[str]) -> dict[str, float]:
+    out = {}
+    for item in values:
+        endpoint, _, rate = item.partition("=")
+        out[endpoint] = float(rate)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--places", type=int, default=400, help="合成餐廳數量")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--latency", action="append", default=[], metavar="ENDPOINT=MEDIAN_MS[:SIGMA]")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--llm-ms-per-kchar", type=float, default=300.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--rps-limit", action="append", default=[], metavar="ENDPOINT=RPS")
+    args = parser.parse_args()
+
+    profile = FaultProfile(
+        latency=_parse_latency(args.latency),
+        latency_scale=args.latency_scale,
+        llm_ms_per_kchar=args.llm_ms_per_kchar,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        rps_limit=_parse_rps(args.rps_limit),
+        seed=args.seed,
+    )
+    upstream = FakeUpstream(synthetic.World(size=args.places, seed=args.seed), profile)
+    print(f"fake upstream on http://{args.host}:{args.port}（{len(upstream.world.places)} places）")
+    web.run_app(upstream.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
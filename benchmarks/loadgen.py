@@ -0,0 +1,344 @@
+"""
+Discord 合成負載：不連 Discord，直接用假的 Message / Interaction 呼叫 MyClient.on_message
+與斜線指令的 handler，量測吞吐量、延遲百分位、event loop lag 與記憶體。
+
+    python -m benchmarks.loadgen --rate 5 --duration 60 --mix eat=0.4,chat=0.3,food_msg=0.2,spin=0.1
+    python -m benchmarks.loadgen --upstream http://127.0.0.1:8765     # 使用已啟動的 fake_upstream
+
+預設會自己起一個 benchmarks.fake_upstream 子行程，並把所有上游 base URL 指過去。
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Optional
+
+from benchmarks.pipeline import CORPUS as EAT_CORPUS
+from benchmarks.transport import percentile
+
+CHAT_CORPUS = [
+    "今天好累喔",
+    "你覺得週末要幹嘛",
+    "台南今天天氣如何",
+    "一碗牛肉麵的熱量是多少",
+    "幫我用轉盤選一個晚餐",
+    "推薦一部電影",
+]
+FOOD_MSG_CORPUS = [f"想吃{q}" for q in EAT_CORPUS]
+NUTRITION_CORPUS = ["1 bowl beef noodles", "1 apple", "2 slices pizza", "一碗白飯"]
+UPSTREAM_ENV = (
+    "GOOGLE_MAPS_BASE_URL", "USDA_BASE_URL", "OPEN_METEO_GEOCODING_URL",
+    "OPEN_METEO_FORECAST_URL", "LLM_BASE_URL",
+)
+
+
+# ---- 假 Discord 物件：只實作 bot 用得到的屬性與方法 ----
+class FakeUser:
+    def __init__(self, user_id: int, bot: bool = False, manage_guild: bool = False):
+        self.id = user_id
+        self.bot = bot
+        self.guild_permissions = type("Perms", (), {"manage_guild": manage_guild})()
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+
+
+class FakeMessage:
+    def __init__(self, content: str, channel: "FakeChannel", author: FakeUser, guild: Optional[FakeGuild],
+                 embeds: Optional[list] = None):
+        self.content = content
+        self.embeds = embeds or []
+        self.channel = channel
+        self.author = author
+        self.guild = guild
+
+    async def edit(self, content: Optional[str] = None, **kwargs) -> "FakeMessage":
+        self.channel.stats["edits"] += 1
+        if content is not None:
+            self.content = content
+        return self
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, stats: dict, send_latency: float = 0.0):
+        self.id = channel_id
+        self.stats = stats
+        self.send_latency = send_latency
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        embeds = kwargs.get("embeds") or []
+        self.stats["sends"] += 1
+        self.stats["embed_sends"] += bool(embeds)
+        self.stats["sent_chars"] += len(content or "") + sum(len(e.description or "") for e in embeds)
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        return FakeMessage(content or "", self, FakeUser(0, bot=True), None, embeds)
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, **kwargs) -> None:
+        self._done = True
+
+    async def send_message(self, content: Optional[str] = None, **kwargs) -> None:
+        self._done = True
+        self._interaction.original = await self._interaction.channel.send(content, **kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, channel: FakeChannel):
+        self._channel = channel
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        return await self._channel.send(content, **kwargs)
+
+
+class FakeInteraction:
+    def __init__(self, channel: FakeChannel, user: FakeUser, guild: Optional[FakeGuild]):
+        self.channel = channel
+        self.user = user
+        self.guild = guild
+        self.guild_id = guild.id if guild else None
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(channel)
+        self.original: Optional[FakeMessage] = None
+
+    async def original_response(self) -> FakeMessage:
+        return self.original or FakeMessage("", self.channel, FakeUser(0, bot=True), self.guild)
+
+
+# ---- 工作負載 ----
+class Workload:
+    def __init__(self, bot_module, mix: dict[str, float], guilds: int, users: int, skew: float,
+                 send_latency: float, seed: int):
+        self.bot = bot_module
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.rng = random.Random(seed)
+        # Zipf 分布：少數大伺服器貢獻大部分流量。
+        self.guild_ids = [10_000 + i for i in range(guilds)]
+        self.guild_weights = [1 / (i + 1) ** skew for i in range(guilds)]
+        self.users = users
+        self.send_stats: dict = defaultdict(int)
+        self.send_latency = send_latency
+        self._channel_ids = itertools.count(1)
+
+    def _context(self) -> tuple[FakeChannel, FakeUser, FakeGuild]:
+        guild = FakeGuild(self.rng.choices(self.guild_ids, self.guild_weights)[0])
+        user = FakeUser(self.rng.randrange(1, self.users + 1))
+        channel = FakeChannel(next(self._channel_ids), self.send_stats, self.send_latency)
+        return channel, user, guild
+
+    def next_job(self):
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        channel, user, guild = self._context()
+        if kind in ("chat", "food_msg"):
+            corpus = CHAT_CORPUS if kind == "chat" else FOOD_MSG_CORPUS
+            msg = FakeMessage(self.rng.choice(corpus), channel, user, guild)
+            return kind, self.bot.dc.on_message(msg)
+        inter = FakeInteraction(channel, user, guild)
+        if kind == "eat":
+            return kind, self.bot.eat.callback(inter, self.rng.choice(EAT_CORPUS))
+        if kind == "spin":
+            return kind, self.bot.spin.callback(inter, "", "auto", True)
+        if kind == "nutrition":
+            return kind, self.bot.nutrition.callback(inter, self.rng.choice(NUTRITION_CORPUS))
+        if kind == "wishlist_show":
+            return kind, self.bot.wishlist_show.callback(inter)
+        raise ValueError(f"unknown workload kind: {kind}")
+
+
+# ---- 量測 ----
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def _lag_monitor(samples: list[float], interval: float, stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - start - interval))
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.completed = 0
+        self.in_flight = 0
+
+    async def run(self, kind: str, coro) -> None:
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await coro
+            self.latencies[kind].append(time.perf_counter() - start)
+        except Exception as e:
+            self.errors[f"{kind}:{type(e).__name__}"] += 1
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+
+async def run_load(
+    workload: Workload,
+    rate: float,
+    duration: float,
+    report_every: float,
+    drain: float,
+    trace_memory: bool = False,
+) -> None:
+    from loop_monitor import start_loop_monitor
+
+    recorder = Recorder()
+    lag: list[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_lag_monitor(lag, 0.05, stop))
+    # 抓卡住 loop 的同步呼叫（門檻與模式見 LOOP_BLOCK_THRESHOLD_MS / LOOP_MONITOR）
+    blocking = start_loop_monitor()
+    tasks: set[asyncio.Task] = set()
+    if trace_memory:
+        # tracemalloc 本身很重，會放大 loop lag，只在要追 Python 物件記憶體時開。
+        tracemalloc.start()
+
+    print(f"{'t(s)':>6}{'sent':>7}{'done':>7}{'inflight':>9}{'rps':>7}{'lag p99 ms':>12}{'rss MB':>9}{'py MB':>8}")
+    start = time.perf_counter()
+    next_report = start + report_every
+    last_done, sent = 0, 0
+    rng = random.Random(0)
+    next_arrival = start
+    while time.perf_counter() - start < duration:
+        now = time.perf_counter()
+        # 開放式負載（Poisson 到達），不會因為 bot 變慢就降低送出速率。
+        while next_arrival <= now:
+            kind, coro = workload.next_job()
+            task = asyncio.create_task(recorder.run(kind, coro))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            sent += 1
+            next_arrival += rng.expovariate(rate)
+        if now >= next_report:
+            window_lag = lag[-int(report_every / 0.05):] or [0.0]
+            rps = (recorder.completed - last_done) / report_every
+            last_done = recorder.completed
+            rss = _rss_mb()
+            py_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024 if trace_memory else float("nan")
+            print(f"{now - start:>6.0f}{sent:>7}{recorder.completed:>7}{recorder.in_flight:>9}{rps:>7.1f}"
+                  f"{percentile(window_lag, 99) * 1000:>12.1f}{(rss or float('nan')):>9.1f}{py_mb:>8.1f}")
+            next_report += report_every
+        await asyncio.sleep(min(0.01, max(0.0, next_arrival - time.perf_counter())))
+
+    if tasks:
+        await asyncio.wait(tasks, timeout=drain)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    if trace_memory:
+        tracemalloc.stop()
+
+    print()
+    print(f"sent {sent}, completed {recorder.completed}, unfinished {len(tasks)}, "
+          f"throughput {recorder.completed / elapsed:.2f}/s over {elapsed:.1f}s")
+    print(f"{'kind':<16}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for kind, values in sorted(recorder.latencies.items()):
+        p50, p95, p99 = (percentile(values, p) * 1000 for p in (50, 95, 99))
+        print(f"{kind:<16}{len(values):>6}{p50:>10.0f}{p95:>10.0f}{p99:>10.0f}")
+    print(f"event loop lag p50/p99/max: {percentile(lag, 50) * 1000:.1f} / "
+          f"{percentile(lag, 99) * 1000:.1f} / {max(lag or [0]) * 1000:.1f} ms")
+    print(
+        f"discord sends {workload.send_stats['sends']} ({workload.send_stats['embed_sends']} with embeds),"
+        f" edits {workload.send_stats['edits']}"
+    )
+    if blocking is not None:
+        print(blocking.report())
+    for name, count in sorted(recorder.errors.items()):
+        print(f"error {name}: {count}")
+
+
+def _parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=2.0, help="每秒到達的訊息/指令數")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--mix", default="eat=0.4,chat=0.3,food_msg=0.2,spin=0.05,nutrition=0.05")
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--guild-skew", type=float, default=1.1, help="guild 流量的 Zipf 指數")
+    parser.add_argument("--send-latency-ms", type=float, default=0.0, help="模擬 Discord send/edit 的延遲")
+    parser.add_argument("--report-every", type=float, default=5.0)
+    parser.add_argument("--drain", type=float, default=120.0, help="結束後等待未完成請求的秒數")
+    parser.add_argument("--upstream", default="", help="已啟動的 fake_upstream URL；空白則自動啟動")
+    parser.add_argument("--upstream-port", type=int, default=8765)
+    parser.add_argument("--upstream-args", default="", help="傳給自動啟動的 fake_upstream 的參數")
+    parser.add_argument("--trace-memory", action="store_true", help="用 tracemalloc 追蹤 Python 配置的記憶體")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    proc = None
+    upstream = args.upstream
+    if not upstream:
+        upstream = f"http://127.0.0.1:{args.upstream_port}"
+        cmd = [sys.executable, "-m", "benchmarks.fake_upstream", "--port", str(args.upstream_port)]
+        proc = subprocess.Popen(cmd + args.upstream_args.split())
+        time.sleep(1.5)
+    for name in UPSTREAM_ENV:
+        os.environ[name] = upstream
+    for name in ("DISCORD_BOT_TOKEN", "GOOGLE_API_KEY", "LLM_API_KEY", "USDA_API_KEY"):
+        os.environ.setdefault(name, "loadtest")
+    # 假上游的行程時間不該拿來校正正式的估計器
+    os.environ.setdefault("TRAVEL_CALIBRATION_PATH", "")
+    # 量的是完整流程，預設關掉推薦結果快取（想看快取效果可自行設定 FOOD_CACHE_MAX_ENTRIES）
+    os.environ.setdefault("FOOD_CACHE_MAX_ENTRIES", "0")
+    os.environ.setdefault("QUERY_LOG_PATH", "")
+    os.environ.setdefault("PREWARM_HISTORY_PATH", "")
+    # 假伺服器的狀態不要寫進正式的 bot_state.db
+    os.environ.setdefault("STATE_DB_PATH", os.path.join(tempfile.gettempdir(), "loadgen_state.db"))
+
+    try:
+        import bot
+
+        workload = Workload(
+            bot, _parse_mix(args.mix), args.guilds, args.users, args.guild_skew,
+            args.send_latency_ms / 1000, args.seed,
+        )
+        asyncio.run(run_load(
+            workload, args.rate, args.duration, args.report_every, args.drain, args.trace_memory,
+        ))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+從錄好的 Place Details 回應挖出詞庫沒有的菜名，寫成 DISH_LEXICON_PATH（一行一個）給 dish_lexicon 載入。
+
+    python -m benchmarks.pipeline --record            # 先用真實 API 錄一份 fixture
+    python -m benchmarks.mine_dishes benchmarks/fixtures/pipeline.json --min-count 3
+"""
+import argparse
+import json
+import os
+
+# config 在 import 時就要 DISCORD_BOT_TOKEN；這裡用不到。
+os.environ.setdefault("DISCORD_BOT_TOKEN", "offline")
+
+from config import DISH_LEXICON_PATH  # noqa: E402
+from dish_lexicon import load_mined_dishes, mine_dish_ngrams, seed_dishes  # noqa: E402
+
+
+def iter_review_texts(node):
+    """遞迴走過任意 JSON，找出所有 reviews[].text"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "reviews" and isinstance(value, list):
+                for rev in value:
+                    if isinstance(rev, dict) and rev.get("text"):
+                        yield rev["text"]
+            else:
+                yield from iter_review_texts(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from iter_review_texts(value)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="含 Place Details 回應的 JSON 檔（例如 pipeline fixture）")
+    parser.add_argument("--min-count", type=int, default=3)
+    parser.add_argument("--output", default=DISH_LEXICON_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="只印出結果，不寫檔")
+    args = parser.parse_args()
+
+    texts: list[str] = []
+    for path in args.paths:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.extend(iter_review_texts(json.load(f)))
+
+    existing = load_mined_dishes(args.output)
+    mined = mine_dish_ngrams(texts, args.min_count, known=set(seed_dishes()) | set(existing))
+    print(f"reviews: {len(texts)}，新菜名 {len(mined)} 個")
+    for gram, count in mined:
+        print(f"  {gram}\t{count}")
+    if args.dry_run or not mined:
+        return
+    with open(args.output, "a", encoding="utf-8") as f:
+        for gram, _ in mined:
+            f.write(gram + "\n")
+    print(f"已附加到 {args.output}（可手動刪掉不像菜名的行）")
+
+
+if __name__ == "__main__":
+    main()
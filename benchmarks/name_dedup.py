@@ -0,0 +1,90 @@
+"""
+name_index 的待吃清單去重複：先檢查固定案例（同一家的寫法要合併、同字首的不同店不能合併），
+再量在大清單上 find 的耗時（應該跟清單長度無關）。
+
+    python -m benchmarks.name_dedup [--sizes 100,1000,10000] [--rounds 2000] [--seed 0]
+"""
+import argparse
+import random
+import time
+
+from name_index import NameIndex, compact, normalize_name
+
+# 每組都是同一家店
+SAME = [
+    ("鼎泰豐", "鼎泰豐 台南店"),
+    ("鼎泰豐", "鼎泰豐（台南）"),
+    ("鼎泰豐", "鼎泰豐信義店"),
+    ("鼎泰豐信義店", "鼎泰豐台南店"),
+    ("麥當勞", "麥當勞-成大店"),
+    ("一蘭拉麵", "一蘭 拉麵"),
+    ("一蘭拉麵", "一蘭拉麵 公館分店"),
+    ("阿宗麵線", "阿宗麵線總店"),
+    ("ichiran", "ＩＣＨＩＲＡＮ"),
+    ("McDonald's", "mcdonalds"),
+]
+
+# 每組都是不同的店
+DIFFERENT = [
+    ("老街咖啡店", "老街麵包店"),
+    ("阿婆小吃店", "阿婆冰品店"),
+    ("成大炸雞店", "成大牛排店"),
+    ("老街 咖啡店", "老街 麵包店"),
+    ("牛肉麵", "老王牛肉麵"),
+    ("拉麵", "拉麵店"),
+    ("日本料理店", "日本拉麵店"),
+    ("阿明牛肉麵", "阿明牛肉湯"),
+    ("文章牛肉湯", "文章牛肉麵"),
+    ("Burger King", "King Burger"),
+    ("店0_1號口味", "店0_2號口味"),
+    ("店12號口味", "店13號口味"),
+    ("老王麵線", "老王麵店"),
+]
+
+# 同字首的不同店：compact 一個都不能刪
+SAME_PREFIX = ["老街咖啡店", "老街麵包店", "阿婆小吃店", "阿婆冰品店", "成大炸雞店", "成大牛排店"]
+
+
+def check_cases() -> int:
+    n = 0
+    for a, b in SAME:
+        if NameIndex([a]).find(b) != a:
+            raise SystemExit(f"應該合併：{a!r} / {b!r}（{normalize_name(a)!r} / {normalize_name(b)!r}）")
+        n += 1
+    for a, b in DIFFERENT:
+        found = NameIndex([a]).find(b)
+        if found is not None:
+            raise SystemExit(f"不該合併：{a!r} / {b!r}（{normalize_name(a)!r} / {normalize_name(b)!r}）")
+        n += 1
+    kept, merged, _ = compact(SAME_PREFIX)
+    if merged:
+        raise SystemExit(f"compact 刪掉了不同的店：{merged}")
+    return n + 1
+
+
+def random_name(rng: random.Random) -> str:
+    chars = "老王阿婆成大街口小吃麵飯粥湯雞鴨牛豬魚蝦麵包咖啡甜點茶屋家記坊堂軒樓館"
+    return "".join(rng.choice(chars) for _ in range(rng.randint(3, 7))) + rng.choice(["", "店", " 台南店"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"cases: {check_cases()} ok")
+    rng = random.Random(args.seed)
+    queries = [random_name(rng) for _ in range(args.rounds)]
+    for size in (int(s) for s in args.sizes.split(",")):
+        index = NameIndex(random_name(rng) for _ in range(size))
+        start = time.perf_counter()
+        for q in queries:
+            index.find(q)
+        elapsed = time.perf_counter() - start
+        print(f"list {size:>6} ({len(index):>6} unique): {elapsed / len(queries) * 1e6:8.2f} µs/find")
+
+
+if __name__ == "__main__":
+    main()
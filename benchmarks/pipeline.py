@@ -0,0 +1,135 @@
+"""
+/eat 全流程（run_food_agent）離線基準：重播錄好的 Google / Open-Meteo / LLM 回應，
+依 stage 與端到端回報 p50/p95/p99。
+
+    python -m benchmarks.pipeline                       # 重播 fixture（CI 用，完全離線）
+    python -m benchmarks.pipeline --record              # 打真實 API 重新錄製（需 .env）
+    python -m benchmarks.pipeline --synthesize          # 用合成資料產生 fixture
+    python -m benchmarks.pipeline --latency llm_answer=8000 --latency place_details=150 --jitter 0.3
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.transport import Transport, percentile
+
+DEFAULT_FIXTURES = Path(__file__).with_name("fixtures") / "pipeline.json"
+FROZEN_NOW = "2026-01-05T12:10:00"
+
+CORPUS = [
+    "拉麵 200內 不要排隊 下雨想吃熱的",
+    "成大附近有什麼好吃的午餐",
+    "台南火車站附近 步行 10 分鐘內的牛肉湯",
+    "想吃宵夜，騎車 15 分鐘內的鹽酥雞",
+    "4.5 星以上的咖哩飯",
+    "便宜又大碗的滷肉飯",
+    "下雨天想吃火鍋",
+    "至少 1000 則評論的牛肉麵",
+    "早午餐 鬆餅 走路 10 分鐘",
+    "蛋包飯",
+]
+
+
+def _parse_latency(values: list[str]) -> dict[str, float]:
+    out = {}
+    for item in values:
+        stage, _, ms = item.partition("=")
+        out[stage.strip()] = float(ms)
+    return out
+
+
+def _prepare_env(mode: str) -> None:
+    # 重播與合成不需要真的金鑰，但 config / food_tool 在 import 時就會讀環境變數。
+    if mode != "record":
+        for name in ("DISCORD_BOT_TOKEN", "GOOGLE_API_KEY", "LLM_API_KEY", "USDA_API_KEY"):
+            os.environ.setdefault(name, "offline")
+    # 行程時間校正樣本只留在記憶體，不寫進正式的 travel_calibration.json
+    os.environ.setdefault("TRAVEL_CALIBRATION_PATH", "")
+    # 量的是完整流程，預設關掉推薦結果快取（想看快取效果可自行設定 FOOD_CACHE_MAX_ENTRIES）
+    os.environ.setdefault("FOOD_CACHE_MAX_ENTRIES", "0")
+    os.environ.setdefault("QUERY_LOG_PATH", "")
+
+
+def _freeze_time(module, iso: str) -> None:
+    frozen = datetime.fromisoformat(iso)
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return frozen.replace(tzinfo=tz) if tz else frozen
+
+    module.datetime = FrozenDatetime
+
+
+async def _run(corpus: list[str], transport: Transport, repeat: int) -> tuple[list[float], dict[str, list[float]]]:
+    from food_agents import run_food_agent
+
+    e2e: list[float] = []
+    per_stage: dict[str, list[float]] = defaultdict(list)
+    for _ in range(repeat):
+        for text in corpus:
+            transport.reset_timings()
+            start = time.perf_counter()
+            await run_food_agent(text, None)
+            e2e.append(time.perf_counter() - start)
+            for stage, values in transport.timings.items():
+                per_stage[stage].append(sum(values))
+    return e2e, per_stage
+
+
+def _report(e2e: list[float], per_stage: dict[str, list[float]]) -> None:
+    print(f"{'stage':<22}{'n':>5}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    rows = sorted(per_stage.items(), key=lambda kv: -percentile(kv[1], 50))
+    rows.append(("end_to_end", e2e))
+    for stage, values in rows:
+        p50, p95, p99 = (percentile(values, p) * 1000 for p in (50, 95, 99))
+        print(f"{stage:<22}{len(values):>5}{p50:>11.1f}{p95:>11.1f}{p99:>11.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", action="store_true", help="打真實上游並覆寫 fixture")
+    mode.add_argument("--synthesize", action="store_true", help="用合成資料重建並覆寫 fixture")
+    parser.add_argument("--fixtures", default=str(DEFAULT_FIXTURES))
+    parser.add_argument("--latency", action="append", default=[], metavar="STAGE=MS",
+                        help="覆寫某個 stage 的注入延遲（預設用錄製時的實測值）")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.0, help="對數常態抖動的 sigma")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--now", default=FROZEN_NOW, help="固定「現在時間」，讓 prompt 可重播")
+    args = parser.parse_args()
+
+    mode_name = "record" if args.record else "synthesize" if args.synthesize else "replay"
+    _prepare_env(mode_name)
+
+    import food_agents
+    _freeze_time(food_agents, args.now)
+
+    options = dict(
+        mode=mode_name,
+        latency_ms=_parse_latency(args.latency),
+        latency_scale=args.latency_scale,
+        jitter=args.jitter,
+    )
+    if mode_name == "replay":
+        transport = Transport.load(args.fixtures, **options)
+    else:
+        transport = Transport(**options)
+
+    with transport.installed():
+        e2e, per_stage = asyncio.run(_run(CORPUS, transport, args.repeat))
+
+    if mode_name != "replay":
+        Path(args.fixtures).parent.mkdir(parents=True, exist_ok=True)
+        transport.save(args.fixtures)
+        print(f"fixtures written: {args.fixtures}（{len(transport.fixtures)} entries）")
+    _report(e2e, per_stage)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+彙整 query_log.py 寫下的查詢紀錄：各伺服器 × 時段的熱門關鍵字、快取可命中比例、各階段延遲。
+
+    python -m benchmarks.query_stats                          # 讀 QUERY_LOG_PATH、各 worker 的檔與輪替出的舊檔
+    python -m benchmarks.query_stats --top 5 --bucket hour    # 時段改用小時
+    python -m benchmarks.query_stats --since-hours 24 --kind food
+"""
+import argparse
+import glob
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# config 在 import 時就要 DISCORD_BOT_TOKEN；這裡用不到。
+os.environ.setdefault("DISCORD_BOT_TOKEN", "offline")
+
+from benchmarks.transport import percentile  # noqa: E402
+from config import QUERY_LOG_PATH  # noqa: E402
+from query_log import log_files, read_records  # noqa: E402
+from text_utils import infer_meal_by_time  # noqa: E402
+
+TAIPEI = ZoneInfo("Asia/Taipei")
+TTL_CANDIDATES = (60, 180, 900, 3600)
+
+
+def _bucket(record: dict, how: str) -> str:
+    at = datetime.fromtimestamp(record["ts"], TAIPEI)
+    if how == "hour":
+        return f"{at:%H}:00"
+    if how == "day":
+        return f"{at:%Y-%m-%d}"
+    return infer_meal_by_time(at)
+
+
+def _cache_key(record: dict) -> tuple:
+    # 與 food_agents 的推薦快取 key 對應（風格不在紀錄裡，這裡算出的是上限）
+    return (
+        record["keyword"], record["location"], record["max_travel_time"], record["min_rating"],
+        record["min_reviews"], record["travel_mode"], record["meal"], record["meal_from_text"], record["fast"],
+    )
+
+
+def report_top_keywords(records: list[dict], top: int, bucket: str) -> None:
+    counts: dict[tuple, Counter] = defaultdict(Counter)
+    for r in records:
+        if r["kind"] == "nutrition" or not r["keyword"]:
+            continue
+        counts[(r["guild_id"] or "DM", _bucket(r, bucket))][r["keyword"]] += 1
+    print(f"== 熱門關鍵字（每個伺服器 × {bucket}，前 {top} 名）")
+    for (guild, slot), counter in sorted(counts.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+        items = "、".join(f"{kw}×{n}" for kw, n in counter.most_common(top))
+        print(f"  {guild!s:<20} {slot:<12} {items}")
+    print()
+
+
+def report_cache_potential(records: list[dict]) -> None:
+    food = sorted((r for r in records if r["kind"] == "food"), key=lambda r: r["ts"])
+    if not food:
+        return
+    print(f"== 推薦快取（{len(food)} 筆 /eat）")
+    actual = Counter(r["cache"] or "off" for r in food)
+    print("  實際：" + "、".join(f"{state} {n / len(food):.1%}" for state, n in actual.most_common()))
+    for ttl in TTL_CANDIDATES:
+        last_seen: dict[tuple, float] = {}
+        hits = 0
+        for r in food:
+            key = _cache_key(r)
+            seen = last_seen.get(key)
+            if seen is not None and r["ts"] - seen < ttl:
+                hits += 1
+            else:
+                # 快取在 miss 時才重新寫入，所以命中不會延長 TTL
+                last_seen[key] = r["ts"]
+        print(f"  TTL {ttl:>5}s 可命中：{hits / len(food):.1%}")
+    distinct = len({_cache_key(r) for r in food})
+    print(f"  不同查詢數：{distinct}（快取上限設到這個數字就不會因容量被擠掉）")
+    print()
+
+
+def report_latency(records: list[dict]) -> None:
+    print(f"{'== 延遲 (ms)':<34}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+    groups: dict[str, list[float]] = defaultdict(list)
+    for r in records:
+        if r["kind"] == "spin":
+            continue
+        label = r["kind"] + (f"[{r['cache']}]" if r["cache"] else "") + (" fast" if r["fast"] else "")
+        groups[f"{label} total"].append(r["total_ms"])
+        for stage, ms in r["stages"].items():
+            groups[f"{r['kind']}.{stage}"].append(ms)
+    for name, values in sorted(groups.items(), key=lambda kv: -percentile(kv[1], 50)):
+        p50, p95, p99 = (percentile(values, p) for p in (50, 95, 99))
+        print(f"  {name:<32}{len(values):>6}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
+    errors = sum(1 for r in records if r["error"])
+    if errors:
+        print(f"  錯誤：{errors} 筆")
+    print()
+
+
+def default_paths() -> list[str]:
+    # launcher.py 的每個 worker 各寫一份（query_log.w0.bin …），一起讀
+    root, ext = os.path.splitext(QUERY_LOG_PATH)
+    bases = [QUERY_LOG_PATH] + sorted(glob.glob(f"{glob.escape(root)}.w*{ext}"))
+    return [p for base in bases for p in log_files(base)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="*", help=f"紀錄檔（預設 {QUERY_LOG_PATH} 與輪替的舊檔）")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--bucket", choices=("meal", "hour", "day"), default="meal")
+    parser.add_argument("--kind", choices=("food", "nutrition", "spin"))
+    parser.add_argument("--since-hours", type=float, default=0.0, help="只看最近幾小時（0 = 全部）")
+    args = parser.parse_args()
+
+    paths = args.paths or default_paths()
+    if not paths:
+        raise SystemExit(f"找不到紀錄檔：{QUERY_LOG_PATH}")
+    cutoff = time.time() - args.since_hours * 3600 if args.since_hours else 0.0
+    records = [
+        r for path in paths for r in read_records(path)
+        if r["ts"] >= cutoff and (args.kind is None or r["kind"] == args.kind)
+    ]
+    kinds = Counter(r["kind"] for r in records)
+    print(f"{len(records)} 筆紀錄（{'、'.join(f'{k} {n}' for k, n in kinds.most_common())}），來源：{', '.join(paths)}\n")
+    if not records:
+        return
+    report_top_keywords(records, args.top, args.bucket)
+    report_cache_potential(records)
+    report_latency(records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+合成的上游回應（Google Maps / Open-Meteo / USDA / LLM gateway），格式與真實 API 相同。
+同一組參數永遠產生同一份資料，方便離線重現。
+"""
+import hashlib
+import json
+import math
+import random
+import re
+from typing import Optional
+
+NCKU_LAT, NCKU_LNG = 22.9997, 120.2196
+
+DISH_POOL = [
+    "牛肉湯", "牛肉麵", "拉麵", "滷肉飯", "雞肉飯", "鍋貼", "水餃", "蝦仁飯", "碗粿", "肉圓",
+    "虱目魚肚粥", "擔仔麵", "鱔魚意麵", "炒飯", "咖哩飯", "豚骨拉麵", "鹽酥雞", "蛋包飯",
+    "蔥抓餅", "鬆餅", "義大利麵", "火鍋", "燒肉", "叉燒飯", "餛飩麵",
+]
+NAME_PREFIX = ["阿", "老", "小", "大", "府城", "成大", "東寧", "勝利", "育樂", "長榮"]
+NAME_SUFFIX = ["食堂", "小吃", "麵館", "飯館", "本舖", "商行", "廚房", "屋"]
+STREETS = ["大學路", "勝利路", "育樂街", "東寧路", "長榮路", "小東路", "前鋒路", "府連路"]
+WEEKDAYS = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
+
+
+def _rng(*parts) -> random.Random:
+    seed = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return random.Random(int(seed[:16], 16))
+
+
+def place_id_for(index: int, seed: str = "") -> str:
+    return "synth_" + hashlib.sha1(f"{seed}|{index}".encode("utf-8")).hexdigest()[:20]
+
+
+def geocode(address: str) -> dict:
+    rng = _rng("geocode", address)
+    lat = NCKU_LAT + rng.uniform(-0.01, 0.01)
+    lng = NCKU_LNG + rng.uniform(-0.01, 0.01)
+    return {
+        "status": "OK",
+        "results": [{
+            "formatted_address": address,
+            "geometry": {"location": {"lat": round(lat, 6), "lng": round(lng, 6)}},
+        }],
+    }
+
+
+def text_search(query: str, location: str, count: int = 12) -> dict:
+    rng = _rng("search", query)
+    try:
+        lat0, lng0 = (float(v) for v in location.split(",", 1))
+    except ValueError:
+        lat0, lng0 = NCKU_LAT, NCKU_LNG
+    results = []
+    for i in range(count):
+        pid = place_id_for(rng.randrange(10_000), query)
+        results.append({
+            "place_id": pid,
+            "name": place_name(pid),
+            "geometry": {"location": {
+                "lat": round(lat0 + rng.uniform(-0.012, 0.012), 6),
+                "lng": round(lng0 + rng.uniform(-0.012, 0.012), 6),
+            }},
+        })
+    return {"status": "OK", "results": results}
+
+
+def place_name(place_id: str) -> str:
+    rng = _rng("name", place_id)
+    return f"{rng.choice(NAME_PREFIX)}{rng.choice(DISH_POOL)}{rng.choice(NAME_SUFFIX)}"
+
+
+def place_details(place_id: str) -> dict:
+    rng = _rng("details", place_id)
+    dishes = rng.sample(DISH_POOL, 3)
+    reviews = [
+        {"text": f"推薦{dishes[0]}，湯頭很濃，{dishes[1]}好吃，份量也夠。"},
+        {"text": f"{dishes[2]}值得一試，中午人比較多要排一下。"},
+        {"text": "環境乾淨，老闆很親切，價格在學區算合理。"},
+    ]
+    open_h, close_h = rng.choice([(10, 20), (11, 21), (7, 14), (17, 24)])
+    periods = [
+        {"open": {"day": d, "time": f"{open_h:02d}00"},
+         "close": {"day": d if close_h < 24 else (d + 1) % 7, "time": f"{close_h % 24:02d}00"}}
+        for d in range(7)
+    ]
+    weekday_text = [f"{w}: {open_h:02d}:00 – {close_h % 24:02d}:00" for w in WEEKDAYS]
+    return {
+        "status": "OK",
+        "result": {
+            "place_id": place_id,
+            "name": place_name(place_id),
+            "rating": round(rng.uniform(3.4, 4.9), 1),
+            "user_ratings_total": rng.randint(20, 6000),
+            "price_level": rng.choice([1, 1, 2, 2, 3, None]),
+            "formatted_address": f"台南市東區{rng.choice(STREETS)}{rng.randint(1, 300)}號",
+            "reviews": reviews,
+            "opening_hours": {"periods": periods, "weekday_text": weekday_text},
+            "url": f"https://maps.google.com/?cid={int(place_id[-10:], 16)}",
+        },
+    }
+
+
+def distance_matrix(origins: str, destinations: str, mode: str = "walking") -> dict:
+    speed_kmh = {"walking": 4.5, "bicycling": 13.0, "driving": 28.0, "transit": 18.0}.get(mode, 4.5)
+    rows = []
+    for origin in origins.split("|"):
+        elements = []
+        for dest in destinations.split("|"):
+            try:
+                lat1, lng1 = (float(v) for v in origin.split(",", 1))
+                lat2, lng2 = (float(v) for v in dest.split(",", 1))
+            except ValueError:
+                elements.append({"status": "NOT_FOUND"})
+                continue
+            # 粗略的平面距離加上繞路係數，夠用來模擬行程時間。
+            km = (((lat1 - lat2) * 111.0) ** 2 + ((lng1 - lng2) * 102.0) ** 2) ** 0.5 * 1.3
+            seconds = int(km / speed_kmh * 3600) + 60
+            elements.append({
+                "status": "OK",
+                "distance": {"value": int(km * 1000), "text": f"{km:.1f} 公里"},
+                "duration": {"value": seconds, "text": f"{seconds // 60} 分鐘"},
+            })
+        rows.append({"elements": elements})
+    return {"status": "OK", "rows": rows}
+
+
+def weather_geocode(name: str) -> dict:
+    body = geocode(name)["results"][0]["geometry"]["location"]
+    return {"results": [{"name": name, "latitude": body["lat"], "longitude": body["lng"]}]}
+
+
+def weather(latitude: str, longitude: str) -> dict:
+    rng = _rng("weather", latitude, longitude)
+    return {"current_weather": {
+        "temperature": round(rng.uniform(16, 33), 1),
+        "windspeed": round(rng.uniform(2, 25), 1),
+        "weathercode": rng.choice([0, 1, 2, 3, 61, 63, 80]),
+    }}
+
+
+def usda_search(query: str) -> dict:
+    rng = _rng("usda", query)
+    return {"foods": [{"fdcId": rng.randint(100000, 999999), "description": query.upper()}]}
+
+
+def usda_food(fdc_id: str) -> dict:
+    rng = _rng("usda_food", fdc_id)
+    return {"foodNutrients": [
+        {"nutrient": {"name": "Energy", "unitName": "kcal"}, "amount": rng.randint(50, 700)},
+        {"nutrient": {"name": "Protein", "unitName": "g"}, "amount": round(rng.uniform(0, 40), 1)},
+        {"nutrient": {"name": "Carbohydrate, by difference", "unitName": "g"}, "amount": round(rng.uniform(0, 90), 1)},
+        {"nutrient": {"name": "Total lipid (fat)", "unitName": "g"}, "amount": round(rng.uniform(0, 35), 1)},
+        {"nutrient": {"name": "Fiber, total dietary", "unitName": "g"}, "amount": round(rng.uniform(0, 8), 1)},
+        {"nutrient": {"name": "Sodium, Na", "unitName": "mg"}, "amount": rng.randint(0, 1800)},
+    ]}
+
+
+def llm_response(prompt: str, user_text: Optional[str] = None) -> dict:
+    """依 prompt 類型回傳看起來合理的 gateway 回應（{"response": ...}）。"""
+    if "抽出「地點」與「餐點」" in prompt:
+        text = user_text if user_text is not None else prompt.rsplit("使用者：", 1)[-1]
+        dish = next((d for d in DISH_POOL if d in text), "")
+        location = "台南火車站" if "火車站" in text else ""
+        return {"response": json.dumps({"location": location, "dish": dish}, ensure_ascii=False)}
+    if "餐廳篩選條件" in prompt:
+        return {"response": "{}"}
+    if "路由器" in prompt:
+        return {"response": "food"}
+    rng = _rng("llm", prompt)
+    lines = []
+    for i in range(1, 4):
+        dishes = rng.sample(DISH_POOL, 2)
+        lines += [
+            f"[{i}️⃣] {rng.choice(NAME_PREFIX)}{dishes[0]}{rng.choice(NAME_SUFFIX)}（在地老店）",
+            f"   評分：{rng.uniform(3.8, 4.8):.1f}（{rng.randint(100, 4000)} 則評論）",
+            f"   步行：{rng.randint(3, 18)} 分鐘",
+            "   地圖：https://maps.google.com/?cid=123",
+            "   推薦菜品：",
+            f"   • {dishes[0]} — 招牌",
+            f"   • {dishes[1]} — 份量足",
+            "   推薦理由：離學校近，出餐快。",
+        ]
+    return {"response": "\n".join(lines)}
+
+
+LANDMARKS = {
+    "國立成功大學": (22.9997, 120.2196),
+    "成功大學": (22.9997, 120.2196),
+    "成大": (22.9997, 120.2196),
+    "台南火車站": (22.9971, 120.2126),
+    "臺南火車站": (22.9971, 120.2126),
+    "台南": (22.9908, 120.2133),
+    "台南市": (22.9908, 120.2133),
+    "台北車站": (25.0478, 121.5170),
+    "台北市": (25.0375, 121.5637),
+    "高雄市": (22.6273, 120.3014),
+    "台中市": (24.1477, 120.6736),
+}
+MEAL_WORDS = {"早餐", "午餐", "下午茶", "晚餐", "宵夜", "餐廳"}
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    rlat1, rlat2 = math.radians(lat1), math.radians(lat2)
+    dlat = rlat2 - rlat1
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(rlat1) * math.cos(rlat2) * math.sin(dlng / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+class World:
+    """以成大為中心、固定 seed 產生的一批餐廳，給 fake_upstream 當資料庫用。"""
+
+    def __init__(self, size: int = 400, seed: int = 7, spread_km: float = 3.0):
+        rng = random.Random(seed)
+        self.places: dict[str, dict] = {}
+        for i in range(size):
+            pid = place_id_for(i, f"world{seed}")
+            dishes = rng.sample(DISH_POOL, rng.randint(2, 4))
+            # 越靠近成大越密集，符合學區的實際分布。
+            dist = abs(rng.gauss(0, spread_km / 2))
+            bearing = rng.uniform(0, 2 * math.pi)
+            lat = NCKU_LAT + dist / 111.0 * math.cos(bearing)
+            lng = NCKU_LNG + dist / 102.0 * math.sin(bearing)
+            details = place_details(pid)["result"]
+            details["name"] = f"{rng.choice(NAME_PREFIX)}{dishes[0]}{rng.choice(NAME_SUFFIX)}"
+            details["reviews"] = [
+                {"text": f"推薦{dishes[0]}，{dishes[-1]}好吃，份量也夠。"},
+                {"text": f"{dishes[1]}值得一試，中午人比較多要排一下。"},
+                {"text": "環境乾淨，老闆很親切，價格在學區算合理。"},
+            ]
+            self.places[pid] = {
+                "details": details,
+                "dishes": dishes,
+                "lat": round(lat, 6),
+                "lng": round(lng, 6),
+            }
+
+    def geocode(self, address: str) -> dict:
+        for name, (lat, lng) in LANDMARKS.items():
+            if name in address:
+                return {"status": "OK", "results": [{
+                    "formatted_address": address,
+                    "geometry": {"location": {"lat": lat, "lng": lng}},
+                }]}
+        return geocode(address)
+
+    def text_search(self, query: str, location: str, radius: float = 2000) -> dict:
+        tokens = [t for t in query.split() if t and t not in MEAL_WORDS]
+        try:
+            lat0, lng0 = (float(v) for v in location.split(",", 1))
+        except ValueError:
+            lat0, lng0 = NCKU_LAT, NCKU_LNG
+        scored = []
+        for pid, place in self.places.items():
+            haystack = place["details"]["name"] + "".join(place["dishes"])
+            if tokens and not any(t in haystack for t in tokens):
+                continue
+            km = haversine_km(lat0, lng0, place["lat"], place["lng"])
+            if km * 1000 > radius:
+                continue
+            scored.append((km, pid))
+        scored.sort()
+        results = [{
+            "place_id": pid,
+            "name": self.places[pid]["details"]["name"],
+            "geometry": {"location": {"lat": self.places[pid]["lat"], "lng": self.places[pid]["lng"]}},
+            "rating": self.places[pid]["details"]["rating"],
+            "user_ratings_total": self.places[pid]["details"]["user_ratings_total"],
+        } for _, pid in scored[:20]]
+        return {"status": "OK" if results else "ZERO_RESULTS", "results": results}
+
+    def place_details(self, place_id: str) -> dict:
+        place = self.places.get(place_id)
+        if place is None:
+            return {"status": "NOT_FOUND"}
+        return {"status": "OK", "result": dict(place["details"], place_id=place_id)}
+
+
+def llm_answer_from_prompt(prompt: str) -> dict:
+    """照 prompt 裡的搜尋結果清單產生推薦，讓假 LLM 的輸出能被 wishlist 按鈕解析。"""
+    names = re.findall(r"^\d+\. (.+)$", prompt, flags=re.MULTILINE)
+    if not names:
+        return llm_response(prompt)
+    lines = []
+    for i, name in enumerate(names[:5], 1):
+        lines += [
+            f"[{i}️⃣] {name.strip()}（在地人氣）",
+            "   推薦菜品：",
+            "   • 招牌餐 — 份量足",
+            "   推薦理由：離得近、評價穩定。",
+        ]
+    return {"response": "\n".join(lines)}
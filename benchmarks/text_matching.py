@@ -0,0 +1,160 @@
+"""
+text_utils / router 關鍵字解析的微基準：比較舊版（逐一 re.search / any(k in text)）與
+Aho–Corasick 單趟掃描版本，並先確認兩者在語料上的輸出完全一致。
+
+    python -m benchmarks.text_matching [--rounds 200]
+"""
+import argparse
+import re
+import time
+
+import text_utils
+from text_utils import extract_english_location
+
+CORPUS = [
+    "拉麵 200內 不要排隊 下雨想吃熱的",
+    "成大附近有什麼好吃的午餐",
+    "台南火車站附近 步行 10 分鐘內的牛肉湯",
+    "台北車站 晚餐 評分 4.5 以上 至少 1000 則評論",
+    "想吃宵夜，騎車 15 分鐘內的鹽酥雞",
+    "開車 30 分鐘內 高雄 燒肉吃到飽",
+    "今天天氣如何？會下雨嗎",
+    "一碗牛肉麵的熱量和蛋白質是多少",
+    "幫我選一個要吃的，轉盤抽一下",
+    "板橋捷運站 早午餐 brunch 推薦",
+    "自行車 20 分內 中西區 咖啡廳 甜點",
+    "ramen near Tainan station",
+    "best pizza in Taichung",
+    "weather in Taipei now",
+    "下午茶吃什麼好？想要點心",
+    "新竹 晚上吃 火鍋 4.2 星以上",
+    "嘉義 雞肉飯 500 則評論以上",
+    "隨便聊聊，你今天過得好嗎",
+    "我想知道蘋果的卡路里",
+    "走路 5 分鐘 便當",
+]
+
+
+# ---- 舊版實作（照抄原本的 text_utils / router）----
+def legacy_extract_nutrition_target(text: str) -> str:
+    cleaned = re.sub(r"(請問|請幫我|幫我|想知道|查詢|查|一下|可以|嗎|？|\?)", "", text)
+    cleaned = re.sub(r"(營養成分|營養|熱量|卡路里|蛋白質|碳水|脂肪|多少)", "", cleaned)
+    cleaned = cleaned.strip()
+    return cleaned or text
+
+
+def legacy_extract_city(text: str) -> str:
+    for k, v in text_utils.CITY_MAPPING.items():
+        if k in text:
+            return v
+    eng_loc = extract_english_location(text)
+    if eng_loc:
+        return eng_loc
+    return "Tainan"
+
+
+def legacy_detect_food_location(text: str):
+    station_match = re.search(r"([\u4e00-\u9fffA-Za-z0-9]+(?:火車站|車站|捷運站))", text)
+    if station_match:
+        label = station_match.group(1)
+        for keywords, city in text_utils.STATION_CITY_KEYWORDS:
+            if any(k in text for k in keywords):
+                return (city, label)
+        return ("Tainan", label)
+    for keywords, result in text_utils.FOOD_LOCATION_KEYWORDS:
+        if any(k in text for k in keywords):
+            return result
+    eng_loc = extract_english_location(text)
+    if eng_loc:
+        return (eng_loc, eng_loc)
+    return ("Tainan", "國立成功大學")
+
+
+def legacy_detect_meal_from_text(text: str):
+    for meal, kws in text_utils.MEAL_KEYWORDS.items():
+        if any(k in text for k in kws):
+            return meal
+    return None
+
+
+def legacy_extract_food_filters(text: str):
+    max_travel_time, min_rating, min_reviews, travel_mode = 20, 3.5, 0, "walking"
+    if re.search(r"(車程|開車|駕車|行車|車行|汽車)", text):
+        travel_mode = "driving"
+    elif re.search(r"(步行|走路)", text):
+        travel_mode = "walking"
+    elif re.search(r"(騎車|自行車|腳踏車|單車)", text):
+        travel_mode = "bicycling"
+    m = re.search(
+        r"(?:車程|開車|駕車|行車|車行|步行|走路|騎車|自行車|腳踏車|單車)?\s*(\d{1,3})\s*分(?:鐘)?\s*(?:內|以內|左右)?",
+        text,
+    )
+    if m:
+        max_travel_time = int(m.group(1))
+    m = re.search(r"(?:評分|評價)?\s*([0-5](?:\.\d)?)\s*星?\s*(?:以上|起|或以上)", text)
+    if m:
+        min_rating = float(m.group(1))
+    m = re.search(r"(?:至少|最少)?\s*(\d{2,6})\s*(?:則|个|個)?\s*評?論(?:數量)?\s*(?:以上|起|或以上)?", text)
+    if m:
+        min_reviews = int(m.group(1))
+    return max_travel_time, min_rating, min_reviews, travel_mode
+
+
+def legacy_intents(text: str) -> set[str]:
+    return {intent for intent, kws in text_utils.INTENT_KEYWORDS.items() if any(k in text for k in kws)}
+
+
+def legacy_parse(text: str) -> tuple:
+    return (
+        legacy_detect_food_location(text),
+        legacy_detect_meal_from_text(text),
+        legacy_extract_city(text),
+        legacy_extract_food_filters(text),
+        legacy_extract_nutrition_target(text),
+        legacy_intents(text),
+    )
+
+
+def current_parse(text: str) -> tuple:
+    return (
+        text_utils.detect_food_location(text),
+        text_utils.detect_meal_from_text(text),
+        text_utils.extract_city(text),
+        text_utils.extract_food_filters(text),
+        text_utils.extract_nutrition_target(text),
+        text_utils.detect_intents(text),
+    )
+
+
+def _time(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        # 每輪清掉快取，量的是「每則新訊息」的成本，而不是重複字串命中快取。
+        text_utils.scan_keywords.cache_clear()
+        extract_english_location.cache_clear()
+        for text in CORPUS:
+            fn(text)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    for text in CORPUS:
+        old, new = legacy_parse(text), current_parse(text)
+        if old != new:
+            raise SystemExit(f"輸出不一致：{text!r}\n  legacy={old}\n  current={new}")
+
+    legacy = _time(legacy_parse, args.rounds)
+    current = _time(current_parse, args.rounds)
+    n = args.rounds * len(CORPUS)
+    print(f"messages: {n}")
+    print(f"legacy : {legacy / n * 1e6:8.2f} µs/message")
+    print(f"current: {current / n * 1e6:8.2f} µs/message")
+    print(f"speedup: {legacy / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
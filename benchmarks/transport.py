@@ -0,0 +1,273 @@
+"""
+攔截 `requests.get`（food_tool.Tools）與 `httpx.AsyncClient.send`（天氣、USDA、LLM），
+用來錄製真實回應成 fixture，或離線重播並注入延遲。每次呼叫都會依上游分類成 stage 並計時。
+"""
+import asyncio
+import contextlib
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+
+from benchmarks import synthetic
+
+SECRET_PARAMS = {"key", "api_key"}
+
+# 合成 fixture 的「錄製延遲」，取自實際部署觀察到的量級。
+SYNTHETIC_LATENCY_MS = {
+    "google_geocode": 120.0,
+    "places_search": 380.0,
+    "place_details": 190.0,
+    "distance_matrix": 160.0,
+    "weather_geocode": 90.0,
+    "weather": 130.0,
+    "usda": 320.0,
+    "llm_route": 900.0,
+    "llm_extract_query": 1500.0,
+    "llm_extract_filters": 1800.0,
+    "llm_answer": 14000.0,
+}
+
+
+def classify(url: str, prompt: Optional[str] = None) -> str:
+    if "maps.googleapis.com" in url or "/maps/api/" in url:
+        if "/geocode/" in url:
+            return "google_geocode"
+        if "/place/textsearch/" in url:
+            return "places_search"
+        if "/place/details/" in url:
+            return "place_details"
+        if "/distancematrix/" in url:
+            return "distance_matrix"
+        return "google_other"
+    if "geocoding-api.open-meteo.com" in url or "/v1/search" in url:
+        return "weather_geocode"
+    if "/v1/forecast" in url:
+        return "weather"
+    if "/fdc/v1/" in url:
+        return "usda"
+    if url.rstrip("/").endswith("/api/generate"):
+        if prompt and "抽出「地點」與「餐點」" in prompt:
+            return "llm_extract_query"
+        if prompt and "餐廳篩選條件" in prompt:
+            return "llm_extract_filters"
+        if prompt and "路由器" in prompt:
+            return "llm_route"
+        return "llm_answer"
+    return "other"
+
+
+def request_key(method: str, url: str, params: Optional[dict] = None, prompt: Optional[str] = None) -> str:
+    parts = urlsplit(url)
+    base = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    clean = sorted((str(k), str(v)) for k, v in (params or {}).items() if k not in SECRET_PARAMS)
+    query = "&".join(f"{k}={v}" for k, v in clean)
+    key = f"{method.upper()} {base}?{query}"
+    if prompt is not None:
+        key += " #" + hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+    return key
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def synthesize(stage: str, url: str, params: dict, prompt: Optional[str]) -> dict:
+    if stage == "google_geocode":
+        return synthetic.geocode(params.get("address", ""))
+    if stage == "places_search":
+        return synthetic.text_search(params.get("query", ""), params.get("location", ""))
+    if stage == "place_details":
+        return synthetic.place_details(params.get("place_id", ""))
+    if stage == "distance_matrix":
+        return synthetic.distance_matrix(
+            params.get("origins", ""), params.get("destinations", ""), params.get("mode", "walking")
+        )
+    if stage == "weather_geocode":
+        return synthetic.weather_geocode(params.get("name", ""))
+    if stage == "weather":
+        return synthetic.weather(params.get("latitude", ""), params.get("longitude", ""))
+    if stage == "usda":
+        if url.rstrip("/").endswith("/foods/search"):
+            return synthetic.usda_search(params.get("query", ""))
+        return synthetic.usda_food(url.rstrip("/").rsplit("/", 1)[-1])
+    if stage.startswith("llm_"):
+        return synthetic.llm_response(prompt or "")
+    raise KeyError(f"no synthetic responder for {url}")
+
+
+class _FakeRequestsResponse:
+    def __init__(self, status_code: int, body: dict, url: str):
+        self.status_code = status_code
+        self._body = body
+        self.url = url
+
+    def json(self) -> dict:
+        return self._body
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class Transport:
+    """
+    mode:
+    - record：打真實上游並存下回應（需有效 API key）。
+    - replay：只讀 fixture；缺少的請求直接報錯，避免 CI 偷偷連網。
+      若 fixture 本身是合成的，缺少的請求就照樣合成（行程時間估計器等會隨樣本改變呼叫路徑）。
+    - synthesize：用 benchmarks.synthetic 產生回應並存下，給沒有 API key 的人建 fixture。
+    """
+
+    def __init__(
+        self,
+        mode: str = "replay",
+        fixtures: Optional[dict] = None,
+        latency_ms: Optional[dict[str, float]] = None,
+        latency_scale: float = 1.0,
+        jitter: float = 0.0,
+        seed: int = 0,
+        synthetic: bool = False,
+    ):
+        if mode not in ("record", "replay", "synthesize"):
+            raise ValueError(f"unknown mode: {mode}")
+        self.mode = mode
+        self.synthetic = synthetic or mode == "synthesize"
+        self.fixtures: dict = dict(fixtures or {})
+        self.latency_ms = dict(latency_ms or {})
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+        self.timings: dict[str, list[float]] = defaultdict(list)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # ---- fixtures ----
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "Transport":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(fixtures=data.get("entries", {}), synthetic=data.get("synthetic", False), **kwargs)
+
+    def save(self, path: str) -> None:
+        data = {"version": 1, "synthetic": self.synthetic, "entries": self.fixtures}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+    # ---- latency / timings ----
+    def _delay_for(self, stage: str, entry: dict) -> float:
+        base = self.latency_ms.get(stage)
+        if base is None:
+            base = entry.get("elapsed_ms", 0.0)
+        base *= self.latency_scale
+        if self.jitter and base > 0:
+            base *= self._rng.lognormvariate(0.0, self.jitter)
+        return base / 1000.0
+
+    def _observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.timings[stage].append(seconds)
+
+    def reset_timings(self) -> None:
+        with self._lock:
+            self.timings = defaultdict(list)
+
+    def _lookup(self, key: str, stage: str, url: str, params: dict, prompt: Optional[str]) -> dict:
+        entry = self.fixtures.get(key)
+        if entry is None:
+            if not self.synthetic:
+                raise KeyError(f"fixture missing for {key}（請先用 --record 或 --synthesize 錄製）")
+            entry = {
+                "stage": stage,
+                "status": 200,
+                "elapsed_ms": SYNTHETIC_LATENCY_MS.get(stage, 100.0),
+                "body": synthesize(stage, url, params, prompt),
+            }
+            with self._lock:
+                self.fixtures[key] = entry
+        return entry
+
+    # ---- requests ----
+    def _requests_get(self, original: Callable):
+        def get(url, params=None, **kwargs):
+            params = dict(params or {})
+            stage = classify(url)
+            key = request_key("GET", url, params)
+            start = time.perf_counter()
+            try:
+                if self.mode == "record":
+                    resp = original(url, params=params, **kwargs)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with self._lock:
+                        self.fixtures[key] = {
+                            "stage": stage, "status": resp.status_code,
+                            "elapsed_ms": round(elapsed, 1), "body": resp.json(),
+                        }
+                    return resp
+                entry = self._lookup(key, stage, url, params, None)
+                delay = self._delay_for(stage, entry)
+                if delay:
+                    time.sleep(delay)
+                return _FakeRequestsResponse(entry.get("status", 200), entry["body"], url)
+            finally:
+                self._observe(stage, time.perf_counter() - start)
+        return get
+
+    # ---- httpx ----
+    def _httpx_send(self, original: Callable):
+        transport = self
+
+        async def send(client, request: httpx.Request, **kwargs):
+            url = str(request.url.copy_with(query=None))
+            params = dict(request.url.params)
+            prompt = None
+            if request.method == "POST":
+                try:
+                    prompt = json.loads(request.content or b"{}").get("prompt")
+                except ValueError:
+                    prompt = None
+            stage = classify(url, prompt)
+            key = request_key(request.method, url, params, prompt)
+            start = time.perf_counter()
+            try:
+                if transport.mode == "record":
+                    resp = await original(client, request, **kwargs)
+                    await resp.aread()
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with transport._lock:
+                        transport.fixtures[key] = {
+                            "stage": stage, "status": resp.status_code,
+                            "elapsed_ms": round(elapsed, 1), "body": resp.json(),
+                        }
+                    return resp
+                entry = transport._lookup(key, stage, url, params, prompt)
+                delay = transport._delay_for(stage, entry)
+                if delay:
+                    await asyncio.sleep(delay)
+                return httpx.Response(entry.get("status", 200), json=entry["body"], request=request)
+            finally:
+                transport._observe(stage, time.perf_counter() - start)
+        return send
+
+    @contextlib.contextmanager
+    def installed(self):
+        original_get = requests.get
+        original_send = httpx.AsyncClient.send
+        requests.get = self._requests_get(original_get)
+        httpx.AsyncClient.send = self._httpx_send(original_send)
+        try:
+            yield self
+        finally:
+            requests.get = original_get
+            httpx.AsyncClient.send = original_send
@@ -1,43 +1,91 @@
+import startup  # 第一個 import：冷啟動計時從這裡開始
+
 import asyncio
 import random
+from typing import Optional
+
 import discord
 from discord import app_commands
 
-from config import DISCORD_TOKEN
-from food_agents import run_food_agent
-from nutrition import llm_translate_list, llm_translate_single, usda_food_nutrition
+import telemetry
+import state_store
+from config import DISCORD_TOKEN, METRICS_PORT, SHARD_COUNT, SHARD_IDS, TELEMETRY_ENABLED, TRACE_LOG_PATH
+from fast_mode_store import set_guild_fast_mode
+from loop_monitor import start_loop_monitor
+from query_log import log_spin
+from discord_output import send_text
 from response_utils import send_food_result
-from router import run_agent
-from spin import pick_spin_candidates
-from text_utils import make_urls_clickable
-from wishlist import list_wishlist, remove_from_wishlist
+from text_utils import extract_city, make_urls_clickable
+from wishlist import CompactConfirmView, WishlistButton, list_wishlist, preview_compact, remove_from_wishlist
 from style_store import set_guild_style, get_guild_style
+import profiles
 
 # ====== Discord bot（Slash command + 一般聊天）=====
-# 紀錄每個 guild 是否開啟一般訊息回覆（預設 True）；重啟會重置
-BOT_ENABLED_BY_GUILD = {}
+# agent 模組（food_agents / nutrition / router / spin …）在 setup_hook 之後才於背景載入，
+# handler 先 await startup.ensure_agents() 再在函式內 import。
+# AutoShardedClient：單獨執行時跑 Discord 建議的全部分片；由 launcher.py 啟動時只跑分到的 SHARD_IDS。
+# 每個 guild 是否開啟一般訊息回覆（預設 True）存在 state_store：讀的是記憶體快取，重啟後保留、各 worker 共用。
 
 
 def bot_enabled(guild_id: int) -> bool:
-    return BOT_ENABLED_BY_GUILD.get(guild_id, True)
+    return bool(state_store.get(guild_id, "bot_enabled", True))
+
+
+def set_bot_enabled(guild_id: int, enabled: bool) -> None:
+    state_store.set(guild_id, "bot_enabled", enabled)
 
 
-class MyClient(discord.Client):
+class MyClient(discord.AutoShardedClient):
     def __init__(self):
         intents = discord.Intents.default()
         intents.message_content = True  # 需要在 Discord Portal 打開 Message Content Intent
-        super().__init__(intents=intents)
+        super().__init__(
+            intents=intents,
+            shard_ids=SHARD_IDS or None,
+            shard_count=SHARD_COUNT or None,
+        )
         self.tree = app_commands.CommandTree(self)
+        self.indexer_task = None
+        self.prewarm_task = None
+        self.startup_task = None
 
     async def setup_hook(self):
-        # 只保留全域指令，避免全域 + guild 重複顯示
-        for guild in self.guilds:
-            try:
-                self.tree.clear_commands(guild=guild)
-                await self.tree.sync(guild=guild)
-            except Exception as e:
-                print(f"guild clear failed for {guild}: {e}")
-        await self.tree.sync()
+        startup.mark("login")
+        start_loop_monitor()
+        # 先把狀態載進記憶體，on_message 的 bot_enabled() 就只是查 dict
+        state_store.load()
+        # 所有待吃清單按鈕（包含重啟前發出的）都由這個 handler 處理
+        self.add_dynamic_items(WishlistButton)
+        # 不在這裡等：agent 載入與指令同步都在背景跑，gateway 連線不用排在它們後面
+        self.startup_task = asyncio.create_task(self._finish_startup())
+
+    async def _finish_startup(self):
+        try:
+            await startup.ensure_agents()
+            import food_agents
+            from place_index import start_indexer
+            from prewarm import start_prewarmer
+
+            self.indexer_task = start_indexer(food_agents.get_food_tools())
+            self.prewarm_task = start_prewarmer(food_agents.get_food_tools(), food_agents.get_weather_by_location)
+        except Exception as e:
+            print(f"agent startup failed: {e}")
+
+        # 等 guild 清單到齊再比對指令；定義沒變就不同步。全域指令只需要一個 worker（擁有 shard 0 的）同步
+        await self.wait_until_ready()
+        if 0 not in (self.shard_ids or [0]):
+            print(startup.report())
+            return
+        try:
+            synced = await startup.sync_commands_if_changed(self, self.tree)
+            print("slash commands synced" if synced else "slash commands unchanged, sync skipped")
+        except Exception as e:
+            print(f"command sync failed: {e}")
+        startup.mark("commands")
+        print(startup.report())
+
+    async def on_ready(self):
+        startup.mark("ready")
 
     async def on_message(self, message: discord.Message):
         if message.author.bot:
@@ -49,16 +97,17 @@ class MyClient(discord.Client):
             return
 
         try:
-            ans = await run_agent(message)
+            with telemetry.span("discord.on_message", guild_id=guild_id):
+                await startup.ensure_agents()
+                from router import run_agent
+                ans = await run_agent(message)
         except Exception as e:
             ans = f"抱歉，聊天時出錯：{e}"
 
         if not ans:
             return
 
-        safe_ans = make_urls_clickable(ans)
-        for i in range(0, len(safe_ans), 1800):
-            await message.channel.send(safe_ans[i:i+1800])
+        await send_text(message.channel.send, make_urls_clickable(ans))
 
 
 dc = MyClient()
@@ -67,9 +116,14 @@ dc = MyClient()
 @dc.tree.command(name="eat", description="推薦我在成大/台南附近吃什麼")
 @app_commands.describe(需求="例如：拉麵 200內 不要排隊 下雨想吃熱的")
 async def eat(interaction: discord.Interaction, 需求: str):
-    await interaction.response.defer(thinking=True)
-    ans, raw_ans = await run_food_agent(需求, interaction.guild_id)
-    await send_food_result(interaction.followup.send, ans, raw_ans)
+    with telemetry.span("discord.eat", guild_id=interaction.guild_id):
+        await interaction.response.defer(thinking=True)
+        await startup.ensure_agents()
+        from food_agents import food_blurb, is_fast_mode, run_food_agent
+        fast = is_fast_mode(interaction.guild_id)
+        ans, raw_ans = await run_food_agent(需求, interaction.guild_id, fast=fast, user_id=interaction.user.id)
+        blurb = food_blurb(需求, raw_ans, interaction.guild_id) if fast else None
+        await send_food_result(interaction.followup.send, ans, raw_ans, blurb=blurb)
 
 
 @dc.tree.command(name="bot_toggle", description="開/關 bot 回覆一般訊息（不影響 /eat），作用於此伺服器")
@@ -83,9 +137,27 @@ async def bot_toggle(interaction: discord.Interaction, 狀態: str):
     if status_lower not in ("on", "off"):
         await interaction.response.send_message("請輸入 on 或 off", ephemeral=True)
         return
-    BOT_ENABLED_BY_GUILD[guild_id] = status_lower == "on"
+    set_bot_enabled(guild_id, status_lower == "on")
+    await interaction.response.send_message(
+        f"已{'開啟' if status_lower == 'on' else '關閉'}此伺服器的一般聊天回覆功能。",
+        ephemeral=False,
+    )
+
+
+@dc.tree.command(name="fast_mode", description="開/關 /eat 快速模式（不經 LLM 直接列出搜尋結果），作用於此伺服器")
+@app_commands.describe(狀態="on 開啟；off 關閉（恢復 LLM 整理的推薦）")
+async def fast_mode(interaction: discord.Interaction, 狀態: str):
+    guild_id = interaction.guild_id
+    if guild_id is None:
+        await interaction.response.send_message("請在伺服器頻道使用此指令。", ephemeral=True)
+        return
+    status_lower = 狀態.lower()
+    if status_lower not in ("on", "off"):
+        await interaction.response.send_message("請輸入 on 或 off", ephemeral=True)
+        return
+    set_guild_fast_mode(guild_id, status_lower == "on")
     await interaction.response.send_message(
-        f"已{'開啟' if BOT_ENABLED_BY_GUILD[guild_id] else '關閉'}此伺服器的一般聊天回覆功能。",
+        f"已{'開啟' if status_lower == 'on' else '關閉'}此伺服器的 /eat 快速模式。",
         ephemeral=False,
     )
 
@@ -103,6 +175,9 @@ async def spin(
     search: bool = True,
 ):
     guild_id = interaction.guild_id
+    await startup.ensure_agents()
+    from food_agents import food_blurb, is_fast_mode, run_food_agent
+    from spin import pick_spin_candidates, spin_once
 
     item_list = [s.strip() for s in items.split(",") if s.strip()] if items.strip() else []
     source = source.lower().strip()
@@ -123,32 +198,36 @@ async def spin(
         )
         return
 
+    table, last_choice = spin_once(guild_id, candidates, custom=bool(item_list))
     await interaction.response.send_message("🎡 轉盤啟動中…", ephemeral=False)
     msg = await interaction.original_response()
 
     steps = random.randint(8, 12)
     delay = 0.18
-    last_choice = ""
     for _ in range(steps):
-        last_choice = random.choice(candidates)
-        await msg.edit(content=f"🎡 轉盤滾動中… **{last_choice}**")
+        await msg.edit(content=f"🎡 轉盤滾動中… **{table.draw()}**")
         await asyncio.sleep(delay)
         delay = min(delay + 0.05, 0.6)
 
     await msg.edit(content=f"🎯 美食轉盤結果：**{last_choice}**")
+    log_spin(guild_id, last_choice, "items" if item_list else source)
 
     if not search:
         return
 
     await interaction.followup.send(f"🔎 正在搜尋「{last_choice}」附近餐廳…")
-    ans, raw_ans = await run_food_agent(last_choice, interaction.guild_id)
-    await send_food_result(interaction.followup.send, ans, raw_ans)
+    fast = is_fast_mode(interaction.guild_id)
+    ans, raw_ans = await run_food_agent(last_choice, interaction.guild_id, fast=fast, user_id=interaction.user.id)
+    blurb = food_blurb(last_choice, raw_ans, interaction.guild_id) if fast else None
+    await send_food_result(interaction.followup.send, ans, raw_ans, blurb=blurb)
 
 
 @dc.tree.command(name="nutrition", description="查詢食物的營養分析（Edamam）")
 @app_commands.describe(食物="例如：1 bowl beef noodles / 1 apple / 2 slices pizza")
 async def nutrition(interaction: discord.Interaction, 食物: str):
     await interaction.response.defer(thinking=True)
+    await startup.ensure_agents()
+    from nutrition import llm_translate_single, usda_food_nutrition
     ingr = await llm_translate_single(食物)
     result = await usda_food_nutrition(ingr)
     await interaction.followup.send(result)
@@ -162,6 +241,8 @@ async def recipe_nutrition(interaction: discord.Interaction, 食材列表: str):
     if not lines:
         await interaction.followup.send("請輸入食材列表，例如：1 cup rice, 200g chicken, 1 tbsp oil")
         return
+    await startup.ensure_agents()
+    from nutrition import llm_translate_list, usda_food_nutrition
     converted = await llm_translate_list(lines)
     if len(converted) > 1:
         note = "（提示：目前以第一個食材做查詢）\n"
@@ -190,13 +271,35 @@ async def wishlist_remove(interaction: discord.Interaction, index: int):
     if interaction.guild_id is None:
         await interaction.response.send_message("請在伺服器頻道使用此指令。", ephemeral=True)
         return
-    ok, removed = remove_from_wishlist(interaction.guild_id, index)
+    ok, removed = await asyncio.to_thread(remove_from_wishlist, interaction.guild_id, index)
     if not ok:
         await interaction.response.send_message("刪除失敗：請確認編號是否正確。", ephemeral=False)
         return
     await interaction.response.send_message(f"已刪除：{removed}", ephemeral=False)
 
 
+@dc.tree.command(name="wishlist_compact", description="預覽並合併待吃清單裡的重複店家（需管理伺服器權限）")
+async def wishlist_compact(interaction: discord.Interaction):
+    if interaction.guild_id is None:
+        await interaction.response.send_message("請在伺服器頻道使用此指令。", ephemeral=True)
+        return
+    if not interaction.user.guild_permissions.manage_guild:
+        await interaction.response.send_message("需要「管理伺服器」權限才能合併清單。", ephemeral=True)
+        return
+    await interaction.response.defer()
+    merged = await asyncio.to_thread(preview_compact, interaction.guild_id)
+    if not merged:
+        await interaction.followup.send("待吃清單沒有重複的項目。")
+        return
+    text = "\n".join(f"- {removed} → {kept}" for removed, kept in merged)
+    # 先預覽，按下確認才寫回；合併很多項時會超過一則訊息的長度
+    await send_text(
+        interaction.followup.send,
+        f"以下 {len(merged)} 個項目會被合併（保留箭頭右邊的）：\n{text}",
+        view=CompactConfirmView(interaction.user.id, merged),
+    )
+
+
 @dc.tree.command(name="sync_commands", description="重新同步斜線指令（需管理伺服器權限）")
 async def sync_commands(interaction: discord.Interaction):
     if not interaction.user.guild_permissions.manage_guild:
@@ -210,6 +313,7 @@ async def sync_commands(interaction: discord.Interaction):
             dc.tree.clear_commands(guild=guild)
             await dc.tree.sync(guild=guild)
         synced = await dc.tree.sync()
+        startup.save_sync_state(dc.tree, dc.application_id)
         await interaction.followup.send(f"已同步全域指令共 {len(synced)} 個。")
     except Exception as e:
         await interaction.followup.send(f"同步失敗：{e}")
@@ -231,4 +335,76 @@ async def style(interaction: discord.Interaction, 風格: str):
     await interaction.response.send_message(f"已設定此伺服器風格：{style_text}", ephemeral=False)
 
 
-dc.run(DISCORD_TOKEN)
+
+@dc.tree.command(name="profile", description="設定 /eat 沒講時用的預設地點與條件；不帶參數則顯示目前設定")
+@app_commands.describe(
+    scope="guild 此伺服器（預設）/ user 只套用在自己身上（蓋過伺服器設定）",
+    location="預設地點，例如：台北車站",
+    travel_mode="walking / driving / bicycling / transit",
+    max_minutes="最多幾分鐘路程",
+    min_rating="最低評分，例如 4.0",
+    min_reviews="最少評論數",
+    diet="飲食偏好，例如：素食、不吃辣",
+    clear="清除這個範圍的設定",
+)
+async def profile(
+    interaction: discord.Interaction,
+    scope: str = "guild",
+    location: str = "",
+    travel_mode: str = "",
+    max_minutes: Optional[int] = None,
+    min_rating: Optional[float] = None,
+    min_reviews: Optional[int] = None,
+    diet: str = "",
+    clear: bool = False,
+):
+    scope = scope.lower().strip()
+    if scope not in profiles.SCOPES:
+        await interaction.response.send_message("scope 只接受 guild / user", ephemeral=True)
+        return
+    if scope == "guild" and interaction.guild_id is None:
+        await interaction.response.send_message("請在伺服器頻道使用，或改用 scope:user。", ephemeral=True)
+        return
+    travel_mode = travel_mode.lower().strip()
+    if travel_mode and travel_mode not in profiles.TRAVEL_MODES:
+        await interaction.response.send_message("travel_mode 只接受 walking / driving / bicycling / transit", ephemeral=True)
+        return
+    owner_id = interaction.guild_id if scope == "guild" else interaction.user.id
+    label = "此伺服器" if scope == "guild" else "你個人"
+
+    if clear:
+        await asyncio.to_thread(profiles.clear_profile, owner_id, scope)
+        await interaction.response.send_message(f"已清除{label}的 /eat 預設設定。", ephemeral=scope == "user")
+        return
+    if not any([location.strip(), travel_mode, diet.strip()]) and \
+            max_minutes is None and min_rating is None and min_reviews is None:
+        current = profiles.describe_profile(profiles.get_scope_profile(owner_id, scope))
+        await interaction.response.send_message(f"{label}的 /eat 預設設定：\n{current}", ephemeral=True)
+        return
+
+    await interaction.response.defer(thinking=True, ephemeral=scope == "user")
+    fields = {
+        "travel_mode": travel_mode or None,
+        "max_travel_time": max_minutes,
+        "min_rating": min_rating,
+        "min_reviews": min_reviews,
+        "diet": diet.strip() or None,
+    }
+    location = location.strip()
+    if location:
+        # 設定時就 geocode 一次，之後 /eat 直接用座標
+        await startup.ensure_agents()
+        from food_agents import get_food_tools
+        try:
+            latlng = await asyncio.to_thread(get_food_tools()._geocode, location)
+        except Exception as e:
+            await interaction.followup.send(f"找不到這個地點：{location}（{e}）")
+            return
+        fields.update(location=location, latlng=latlng, city_en=extract_city(location))
+    updated = await asyncio.to_thread(lambda: profiles.update_profile(owner_id, scope, **fields))
+    await interaction.followup.send(f"已更新{label}的 /eat 預設設定：\n{profiles.describe_profile(updated)}")
+
+
+if __name__ == "__main__":
+    telemetry.configure(TELEMETRY_ENABLED, METRICS_PORT, TRACE_LOG_PATH)
+    dc.run(DISCORD_TOKEN)
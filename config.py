@@ -10,7 +10,111 @@ LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://api-gateway.netdb.csie.nc
 LLM_API_KEY = os.environ.get("LLM_API_KEY", os.environ.get("OPENAI_API_KEY", ""))
 USDA_API_KEY = os.environ.get("USDA_API_KEY", "")
 
+# 上游 base URL；壓測時可指向 benchmarks/fake_upstream.py 起的本機假伺服器。
+GOOGLE_MAPS_BASE_URL = os.environ.get("GOOGLE_MAPS_BASE_URL") or "https://maps.googleapis.com"
+USDA_BASE_URL = os.environ.get("USDA_BASE_URL") or "https://api.nal.usda.gov"
+OPEN_METEO_GEOCODING_URL = os.environ.get("OPEN_METEO_GEOCODING_URL") or "https://geocoding-api.open-meteo.com"
+OPEN_METEO_FORECAST_URL = os.environ.get("OPEN_METEO_FORECAST_URL") or "https://api.open-meteo.com"
+
+# Telemetry：TELEMETRY_ENABLED=1 開啟；METRICS_PORT>0 時在本機提供 /metrics；TRACE_LOG_PATH 寫 JSON lines。
+TELEMETRY_ENABLED = os.environ.get("TELEMETRY_ENABLED", "").lower() in ("1", "true", "yes", "on")
+METRICS_PORT = int(os.environ.get("METRICS_PORT") or 0)
+TRACE_LOG_PATH = os.environ.get("TRACE_LOG_PATH", "")
+# event loop 監控（loop_monitor.py）：on 量 lag 並在 loop 被卡超過 LOOP_BLOCK_THRESHOLD_MS 時記下卡住的 stack；
+# debug 另外開 asyncio debug 模式（點名慢 callback，開銷較大）；off 關閉。
+LOOP_MONITOR = (os.environ.get("LOOP_MONITOR") or "on").lower()
+LOOP_MONITOR_INTERVAL_MS = float(os.environ.get("LOOP_MONITOR_INTERVAL_MS") or 100)
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get("LOOP_BLOCK_THRESHOLD_MS") or 250)
+
+# 上游韌性層（resilience.py）：連續失敗 CIRCUIT_FAILURE_THRESHOLD 次開啟斷路器，CIRCUIT_RESET_SECONDS 後試探；
+# timeout = 成功延遲 p99 × UPSTREAM_TIMEOUT_K（不超過原本的上限）；UPSTREAM_HEDGING=0 關閉 GET 對冲請求。
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD") or 5)
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS") or 30)
+UPSTREAM_TIMEOUT_K = float(os.environ.get("UPSTREAM_TIMEOUT_K") or 3.0)
+UPSTREAM_HEDGING = (os.environ.get("UPSTREAM_HEDGING") or "1").lower() in ("1", "true", "yes", "on")
+
+# /eat 最終 prompt 的 token 預算（估計值）；超過時逐級壓縮搜尋結果。
+FOOD_PROMPT_TOKEN_BUDGET = int(os.environ.get("FOOD_PROMPT_TOKEN_BUDGET") or 1000)
+
+# 熱門地點的本機餐廳索引（place_index.py）：PLACE_INDEX_ENABLED=1 開啟，背景每 PLACE_INDEX_REFRESH_MINUTES 重爬一次。
+PLACE_INDEX_ENABLED = os.environ.get("PLACE_INDEX_ENABLED", "").lower() in ("1", "true", "yes", "on")
+PLACE_INDEX_PATH = os.environ.get("PLACE_INDEX_PATH") or "place_index.json"
+PLACE_INDEX_LOCATIONS = [
+    s.strip() for s in (os.environ.get("PLACE_INDEX_LOCATIONS") or "國立成功大學").split(",") if s.strip()
+]
+PLACE_INDEX_KEYWORDS = [
+    s.strip()
+    for s in (
+        os.environ.get("PLACE_INDEX_KEYWORDS")
+        or "小吃,早餐,早午餐,便當,拉麵,牛肉湯,牛肉麵,滷肉飯,雞肉飯,火鍋,燒肉,咖哩,義大利麵,鍋貼,水餃,咖啡,甜點,宵夜"
+    ).split(",")
+    if s.strip()
+]
+PLACE_INDEX_REFRESH_MINUTES = float(os.environ.get("PLACE_INDEX_REFRESH_MINUTES") or 360)
+PLACE_INDEX_MIN_RESULTS = int(os.environ.get("PLACE_INDEX_MIN_RESULTS") or 3)
+
+# Distance Matrix 回應的校正樣本（travel_estimator.py 用來估計行程時間、少打 API）；設成空字串則不存檔。
+TRAVEL_CALIBRATION_PATH = os.environ.get("TRAVEL_CALIBRATION_PATH", "travel_calibration.json")
+
+# /eat 推薦結果快取（result_cache.py）：soft TTL 內直接回，過了 soft TTL 先回舊答案再背景更新，過了 hard TTL 才重算。
+# FOOD_CACHE_MAX_ENTRIES=0 關閉；MAX_CHARS 是快取答案的總字數上限。
+FOOD_CACHE_SOFT_TTL_SECONDS = float(os.environ.get("FOOD_CACHE_SOFT_TTL_SECONDS") or 180)
+FOOD_CACHE_HARD_TTL_SECONDS = float(os.environ.get("FOOD_CACHE_HARD_TTL_SECONDS") or 900)
+FOOD_CACHE_MAX_ENTRIES = int(os.environ.get("FOOD_CACHE_MAX_ENTRIES") or 256)
+FOOD_CACHE_MAX_CHARS = int(os.environ.get("FOOD_CACHE_MAX_CHARS") or 1_000_000)
+
+# 餐期尖峰前的快取預熱（prewarm.py）：PREWARM_MEALS 各餐期開始前 PREWARM_LEAD_MINUTES 分鐘，
+# 預查熱門地點的座標/天氣與各伺服器最常搜的 PREWARM_TOP_KEYWORDS 個關鍵字；PREWARM_ENABLED=0 關閉。
+PREWARM_ENABLED = (os.environ.get("PREWARM_ENABLED") or "1").lower() in ("1", "true", "yes", "on")
+PREWARM_MEALS = [s.strip() for s in (os.environ.get("PREWARM_MEALS") or "午餐,晚餐").split(",") if s.strip()]
+PREWARM_LEAD_MINUTES = float(os.environ.get("PREWARM_LEAD_MINUTES") or 10)
+PREWARM_LOCATIONS = [
+    s.strip() for s in (os.environ.get("PREWARM_LOCATIONS") or ",".join(PLACE_INDEX_LOCATIONS)).split(",") if s.strip()
+]
+PREWARM_TOP_KEYWORDS = int(os.environ.get("PREWARM_TOP_KEYWORDS") or 5)
+PREWARM_MIN_INTERVAL_SECONDS = float(os.environ.get("PREWARM_MIN_INTERVAL_SECONDS") or 1.0)
+# 各伺服器的搜尋關鍵字次數（只存解析後的餐點與地點），預熱用來挑熱門關鍵字；設成空字串則不存檔。
+PREWARM_HISTORY_PATH = os.environ.get("PREWARM_HISTORY_PATH", "query_history.json")
+# 天氣快取秒數；要比 PREWARM_LEAD_MINUTES 長，尖峰開始時預熱的結果才還有效。
+WEATHER_CACHE_TTL_SECONDS = float(os.environ.get("WEATHER_CACHE_TTL_SECONDS") or 900)
+
+# 解析後查詢的二進位分析紀錄（query_log.py，背景 thread 寫入）；超過 QUERY_LOG_MAX_BYTES 輪替，保留 QUERY_LOG_BACKUPS 份。
+# 設成空字串則不記錄。分析：python -m benchmarks.query_stats
+QUERY_LOG_PATH = os.environ.get("QUERY_LOG_PATH", "query_log.bin")
+QUERY_LOG_MAX_BYTES = int(os.environ.get("QUERY_LOG_MAX_BYTES") or 8 * 1024 * 1024)
+QUERY_LOG_BACKUPS = int(os.environ.get("QUERY_LOG_BACKUPS") or 5)
+
+# 分片：預設由 Discord 建議分片數、單一行程跑全部分片；launcher.py 會替每個 worker 設好 SHARD_IDS / SHARD_COUNT。
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT") or 0)
+SHARD_IDS = [int(s) for s in (os.environ.get("SHARD_IDS") or "").split(",") if s.strip()]
+
+# 各伺服器的待吃清單 / 風格 / 快速模式 / 聊天開關（state_store.py，SQLite，多個 worker 共用）
+STATE_DB_PATH = os.environ.get("STATE_DB_PATH") or "bot_state.db"
+# 修改先留在記憶體，每 STATE_FLUSH_SECONDS 秒批次寫回（也是看到其他 worker 修改的延遲）；
+# 每 STATE_SNAPSHOT_MINUTES 分鐘寫一份 STATE_DB_PATH.snapshot（0 = 不寫）
+STATE_FLUSH_SECONDS = float(os.environ.get("STATE_FLUSH_SECONDS") or 1.0)
+STATE_SNAPSHOT_MINUTES = float(os.environ.get("STATE_SNAPSHOT_MINUTES") or 60)
+# 舊版待吃清單 JSON；第一次開 STATE_DB_PATH 時匯入
 WISHLIST_PATH = "wishlist.json"
+# 待吃清單按鈕的候選資料保留多久（小時）；之後按下會提示重新查詢
+WISHLIST_BUTTON_TTL_HOURS = float(os.environ.get("WISHLIST_BUTTON_TTL_HOURS") or 168)
+# 待吃清單去重複（name_index.py）：正規化後店名的字元 bigram Jaccard ≥ 這個值（且數字、結尾食物字相同）才當成同一家；
+# 0 = 只比對正規化後完全相同
+WISHLIST_DEDUP_THRESHOLD = float(os.environ.get("WISHLIST_DEDUP_THRESHOLD") or 0.9)
+# 上次同步斜線指令時的 schema hash；啟動時一樣就不打 sync API（startup.py）
+COMMAND_SYNC_PATH = os.environ.get("COMMAND_SYNC_PATH") or "command_sync.json"
+# 長回覆：放不進一則訊息時改用 embed（最多 6000 字一則）；每個頻道在本地限流 CHANNEL_SEND_BURST 則 / CHANNEL_SEND_WINDOW_SECONDS 秒
+OUTPUT_EMBEDS = (os.environ.get("OUTPUT_EMBEDS") or "1").lower() in ("1", "true", "yes", "on")
+CHANNEL_SEND_BURST = int(os.environ.get("CHANNEL_SEND_BURST") or 5)
+CHANNEL_SEND_WINDOW_SECONDS = float(os.environ.get("CHANNEL_SEND_WINDOW_SECONDS") or 5.0)
+# 從評論挖出的額外菜名（一行一個，可用 python -m benchmarks.mine_dishes 產生）；檔案不存在就只用內建詞庫。
+DISH_LEXICON_PATH = os.environ.get("DISH_LEXICON_PATH") or "dish_lexicon.txt"
+# 轉盤加權（spin.py）：最近 SPIN_NO_REPEAT 次的結果不再出現；抽中次數以 SPIN_HISTORY_HALF_LIFE_DAYS 天為半衰期降權；
+# 待吃清單最新一道的權重是最舊一道的 1 + SPIN_RECENCY_BOOST 倍；符合現在餐別的菜乘 SPIN_MEAL_BOOST
+SPIN_NO_REPEAT = int(os.environ.get("SPIN_NO_REPEAT") or 3)
+SPIN_HISTORY_HALF_LIFE_DAYS = float(os.environ.get("SPIN_HISTORY_HALF_LIFE_DAYS") or 7)
+SPIN_RECENCY_BOOST = float(os.environ.get("SPIN_RECENCY_BOOST") or 1.0)
+SPIN_MEAL_BOOST = float(os.environ.get("SPIN_MEAL_BOOST") or 2.0)
 
 DEFAULT_SPIN_CANDIDATES = [
     "炒飯", "拉麵", "蔥抓餅/蛋餅", "麻油雞麵線", "鍋貼/水餃", "火鍋", "蒙古烤肉", "牛肉麵",
@@ -0,0 +1,188 @@
+import asyncio
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Iterator, Optional
+
+import discord
+
+from config import CHANNEL_SEND_BURST, CHANNEL_SEND_WINDOW_SECONDS, OUTPUT_EMBEDS
+from telemetry import describe, inc, observe
+from text_utils import BARE_URL
+
+# ====== 送出長回覆 =====
+# - 切段：依邏輯邊界切成每段 ≤ 2000 字。優先在餐廳區塊（空行）之間切，其次換行，
+#   單行太長才在空白 / 中文標點處切，不會切斷 URL 或 emoji（keycap、膚色、ZWJ 組合）。
+#   split_message 是 generator，第一段切好就能先送。
+# - embed：一則訊息放不下、但放得進一則訊息的 embed（每個 4096 字、合計 6000 字）時改用 embed，
+#   原本要分 2～3 則的回覆只送一則（OUTPUT_EMBEDS=0 關閉）。
+# - 每個頻道一個佇列：同一個回覆的各段連續送出，不會跟其他回覆交錯；並用 token bucket
+#   （CHANNEL_SEND_BURST 則 / CHANNEL_SEND_WINDOW_SECONDS 秒）在本地排隊，不去撞 Discord 的 429。
+
+DISCORD_MESSAGE_LIMIT = 2000
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_TOTAL_LIMIT = 6000
+MAX_QUEUES = 1024
+
+# 切在這些字元之後不會拆開一個字：空白、中文標點
+SOFT_BREAK = re.compile(r"[\s。！？，；、）」』]")
+BLANK_LINES = re.compile(r"\n\s*\n")
+_ZWJ = "\u200d"
+
+
+def _joins_previous(text: str, i: int) -> bool:
+    """text[i] 跟前一個字元屬於同一個字形（不能從這裡切）"""
+    ch = text[i]
+    if text[i - 1] == _ZWJ or ch == _ZWJ:
+        return True
+    if "\U0001F3FB" <= ch <= "\U0001F3FF":  # 膚色
+        return True
+    return unicodedata.category(ch) in ("Mn", "Me", "Mc")  # 變體選擇符、keycap 等
+
+
+def _cut_point(line: str, limit: int) -> int:
+    cut = 0
+    for m in SOFT_BREAK.finditer(line, 0, limit):
+        cut = m.end()
+    if cut == 0:
+        cut = limit
+    # 切點落在 URL 中間：退到 URL 前面，URL 在行首就切在 URL 後面（URL 本身比 limit 長就只好切開）
+    for m in BARE_URL.finditer(line, 0, limit + 1):
+        if m.start() < cut < m.end():
+            if m.start() > 0:
+                cut = m.start()
+            elif m.end() <= limit:
+                cut = m.end()
+            break
+    while cut > 1 and _joins_previous(line, cut):
+        cut -= 1
+    return cut
+
+
+def _split_line(line: str, limit: int) -> Iterator[str]:
+    while len(line) > limit:
+        cut = _cut_point(line, limit)
+        head = line[:cut].rstrip()
+        if head:
+            yield head
+        line = line[cut:].lstrip()
+    if line:
+        yield line
+
+
+def _pack(pieces: Iterator[str], sep: str, limit: int) -> Iterator[str]:
+    current = ""
+    for piece in pieces:
+        if not current:
+            current = piece
+        elif len(current) + len(sep) + len(piece) <= limit:
+            current = current + sep + piece
+        else:
+            yield current
+            current = piece
+    if current:
+        yield current
+
+
+def _block_pieces(block: str, limit: int) -> Iterator[str]:
+    if len(block) <= limit:
+        yield block
+        return
+    lines = (part for line in block.split("\n") for part in _split_line(line, limit))
+    yield from _pack(lines, "\n", limit)
+
+
+def split_message(text: str, limit: int = DISCORD_MESSAGE_LIMIT) -> Iterator[str]:
+    """依邏輯邊界切成每段 ≤ limit 的訊息；合併相鄰的區塊讓訊息數最少"""
+    blocks = (
+        piece
+        for block in BLANK_LINES.split(text) if block.strip()
+        for piece in _block_pieces(block.strip("\n"), limit)
+    )
+    yield from _pack(blocks, "\n\n", limit)
+
+
+def _as_embeds(text: str) -> Optional[list[discord.Embed]]:
+    """放得進一則訊息的 embed 就回傳 embed 清單，否則 None"""
+    if len(text) > EMBED_TOTAL_LIMIT:
+        return None
+    parts = list(split_message(text, EMBED_DESCRIPTION_LIMIT))
+    if sum(len(p) for p in parts) > EMBED_TOTAL_LIMIT or len(parts) > 10:
+        return None
+    return [discord.Embed(description=p) for p in parts]
+
+
+# ------------------------------------------------------------
+# 每個頻道的送出佇列
+# ------------------------------------------------------------
+class ChannelQueue:
+    def __init__(self, burst: int, window: float):
+        self.lock = asyncio.Lock()
+        self.burst = burst
+        self.rate = burst / window
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            wait = (1 - self.tokens) / self.rate
+            observe("discord_send_wait_seconds", wait)
+            await asyncio.sleep(wait)
+            self.tokens = 1.0
+            self.updated = time.monotonic()
+        self.tokens -= 1
+
+
+_queues: "OrderedDict[Any, ChannelQueue]" = OrderedDict()
+
+
+def _channel_key(send_func) -> Any:
+    # channel.send → 頻道 id；interaction.followup.send → 每個 interaction 自己的 webhook token（限流也是分開算的）
+    owner = getattr(send_func, "__self__", None)
+    return getattr(owner, "token", None) or getattr(owner, "id", None) or id(owner)
+
+
+def _queue_for(send_func) -> ChannelQueue:
+    key = _channel_key(send_func)
+    queue = _queues.get(key)
+    if queue is None:
+        queue = ChannelQueue(CHANNEL_SEND_BURST, CHANNEL_SEND_WINDOW_SECONDS)
+        _queues[key] = queue
+        while len(_queues) > MAX_QUEUES:
+            oldest = next(iter(_queues))
+            if _queues[oldest].lock.locked():
+                break
+            del _queues[oldest]
+    else:
+        _queues.move_to_end(key)
+    return queue
+
+
+async def send_text(send_func, text: str, **kwargs) -> Optional[Any]:
+    """切段後依序送出整段回覆；kwargs（view 等）掛在最後一則。回傳最後一則訊息"""
+    queue = _queue_for(send_func)
+    last = None
+    async with queue.lock:
+        if len(text) > DISCORD_MESSAGE_LIMIT and OUTPUT_EMBEDS:
+            embeds = _as_embeds(text)
+            if embeds is not None:
+                await queue.acquire()
+                inc("discord_messages_sent_total", kind="embed")
+                return await send_func(embeds=embeds, **kwargs)
+        chunks = split_message(text)
+        chunk = next(chunks, None)
+        while chunk is not None:
+            following = next(chunks, None)
+            await queue.acquire()
+            inc("discord_messages_sent_total", kind="text")
+            last = await send_func(chunk, **(kwargs if following is None else {}))
+            chunk = following
+    return last
+
+
+describe("discord_messages_sent_total", "Messages sent through the output queue, by kind (text / embed).")
+describe("discord_send_wait_seconds", "Time a send waited locally for the per-channel rate limit.")
@@ -0,0 +1,171 @@
+import os
+import re
+from collections import Counter
+from typing import Iterable, Optional
+
+from config import DEFAULT_SPIN_CANDIDATES, DISH_LEXICON_PATH
+
+# ====== 菜名詞庫 + 評論菜名抽取 =====
+# 詞庫 = 轉盤預設清單 + 常見台南小吃/飲品 + （可選）從評論 n-gram 挖出來的詞（DISH_LEXICON_PATH，一行一個）。
+# 抽取時把詞庫編成 trie 形狀的 regex，一趟掃過評論取最左最長的不重疊命中，再依出現次數與「推薦/好吃」語境排序。
+
+EXTRA_DISHES = [
+    "牛肉湯", "虱目魚湯", "虱目魚粥", "魚皮湯", "蝦捲", "棺材板", "鍋燒意麵", "意麵", "土魠魚羹",
+    "肉燥飯", "滷肉飯", "雞肉飯", "蝦仁飯", "豚骨拉麵", "味噌拉麵", "醬油拉麵", "沾麵", "叉燒",
+    "溏心蛋", "餃子", "咖哩", "咖哩飯", "燒肉", "壽司", "生魚片", "親子丼", "牛丼", "豬排丼",
+    "炸豬排", "炸雞", "薯條", "漢堡", "三明治", "吐司", "蛋餅", "蘿蔔糕", "豆漿", "米漿",
+    "豆花", "剉冰", "芒果冰", "仙草", "紅茶", "奶茶", "珍珠奶茶", "鮮奶茶", "咖啡", "拿鐵",
+    "蛋糕", "布丁", "鬆餅", "可頌", "舒芙蕾", "燉飯", "焗烤", "牛排", "雞排", "鹹酥雞",
+    "滷味", "臭豆腐", "水餃", "鍋貼", "小籠包", "湯包", "煎餃", "酸辣湯", "餛飩", "炒飯",
+    "炒麵", "牛肉麵", "火鍋", "麻辣鍋", "羊肉爐", "薑母鴨", "鹹粥", "肉粽", "米糕", "碗粿",
+]
+
+# 不是菜名的轉盤項目（店型/連鎖店）
+_NON_DISH_SUFFIXES = ("店", "餐廳")
+_NON_DISH = {"自助餐", "麥當勞", "肯德基", "漢堡王", "吃到飽餐廳", "燒肉吃到飽", "健康餐盒", "健康沙拉餐"}
+
+# 緊鄰菜名前後的語境詞（都是兩個字，比對時直接切兩字查 set）
+POSITIVE_BEFORE = {"推薦", "必點", "招牌", "必吃", "超推", "大推"}
+POSITIVE_AFTER = {"好吃", "好喝", "很推", "值得", "必點", "推薦"}
+NEGATIVE_AFTER = {"難吃", "不推", "普通", "太鹹", "偏鹹", "踩雷"}
+_CUE_BONUS = 2.0
+
+# 菜名常見結尾字（挖詞與 fallback 判斷用）
+DISH_SUFFIX_CHARS = set("麵飯湯粥餅線糕粿丼鍋串捲包餃圓羹冰茶酒鬆排雞鴨魚蝦肉蛋卷燒燉堡條")
+_STOP_CHARS = set("的了很也都是有在就還又跟和但不沒會要可")
+_CUE_CONTEXT = re.compile(
+    r"(?:推薦|必點|招牌|必吃|超推|大推)\s*([\u4e00-\u9fff]{2,8})|([\u4e00-\u9fff]{2,8})(?:好吃|好喝|很推|值得)"
+)
+
+
+def seed_dishes() -> list[str]:
+    dishes: list[str] = []
+    for item in DEFAULT_SPIN_CANDIDATES:
+        for part in item.split("/"):
+            part = part.strip()
+            if len(part) < 2 or part in _NON_DISH or part.endswith(_NON_DISH_SUFFIXES):
+                continue
+            dishes.append(part)
+    dishes.extend(EXTRA_DISHES)
+    return list(dict.fromkeys(dishes))
+
+
+def load_mined_dishes(path: str = DISH_LEXICON_PATH) -> list[str]:
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def mine_dish_ngrams(texts: Iterable[str], min_count: int = 3, known: Optional[set] = None) -> list[tuple[str, int]]:
+    """
+    從評論挖候選菜名：只看「推薦X / X好吃」這類語境旁的中文片段，取以菜名常見字結尾的 2~6 字片段，
+    出現次數 >= min_count 且不在 known 裡的才留下（次數高的在前）。
+    """
+    known = known or set()
+    known_pattern = compile_trie_pattern(known)
+    counts: Counter = Counter()
+    for text in texts:
+        for m in _CUE_CONTEXT.finditer(text or ""):
+            grams = _cue_candidates(m)
+            # 最長的候選已經含有詞庫裡的菜名（例如「滷肉飯」→「肉飯」）就不算新詞
+            if grams and not known_pattern.search(grams[-1]):
+                counts.update(grams)
+    mined = [(g, c) for g, c in counts.items() if c >= min_count and g not in known]
+    # 同次數時偏好較長的詞（「豚骨拉麵」勝過「骨拉麵」這種截斷）
+    mined.sort(key=lambda x: (-x[1], -len(x[0]), x[0]))
+    # 去掉被同次數的更長詞包含的截斷片段
+    kept: list[tuple[str, int]] = []
+    for gram, count in mined:
+        if any(gram in longer and count <= c for longer, c in kept):
+            continue
+        kept.append((gram, count))
+    return kept
+
+
+def _cue_candidates(m: re.Match) -> list[str]:
+    """語境旁片段裡可能的菜名：「推薦X…」取 X 的前綴、「…X好吃」取 X 的後綴，短到長排列"""
+    if m.group(1):
+        run = m.group(1)
+        grams = [run[:n] for n in range(2, min(6, len(run)) + 1)]
+    else:
+        run = m.group(2)
+        grams = [run[-n:] for n in range(2, min(6, len(run)) + 1)]
+    return [g for g in grams if g[-1] in DISH_SUFFIX_CHARS and not any(c in _STOP_CHARS for c in g)]
+
+
+def compile_trie_pattern(words: Iterable[str]) -> re.Pattern:
+    """
+    把詞庫編成 trie 形狀的 regex（共用前綴只比一次）。同一層的分支首字都不同，
+    結尾節點的子樹是 greedy optional，所以 finditer 會得到最左最長、不重疊的命中。
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node: dict) -> str:
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            return f"(?:{body})?" if len(branches) == 1 else body + "?"
+        return body
+
+    return re.compile(emit(trie) or r"(?!)")
+
+
+class DishExtractor:
+    def __init__(self, dishes: Iterable[str]):
+        self.dishes = list(dict.fromkeys(d for d in dishes if d))
+        self._pattern = compile_trie_pattern(self.dishes)
+
+    def mentions(self, text: str) -> list[str]:
+        """最左最長、不重疊的菜名命中（「豚骨拉麵」不再另外算一次「拉麵」）"""
+        return self._pattern.findall(text)
+
+    def extract(self, reviews: list[dict], limit: int = 5) -> list[str]:
+        # dict 保留第一次出現的順序，同分時先出現的排前面
+        scores: dict[str, float] = {}
+        for rev in reviews or []:
+            text = rev.get("text", "") or ""
+            for m in self._pattern.finditer(text):
+                start, end = m.span()
+                after = text[end:end + 2]
+                score = 1.0
+                if text[start - 2:start] in POSITIVE_BEFORE or after in POSITIVE_AFTER:
+                    score += _CUE_BONUS
+                elif after in NEGATIVE_AFTER:
+                    score -= _CUE_BONUS
+                dish = m.group()
+                scores[dish] = scores.get(dish, 0.0) + score
+        ranked = sorted((d for d, s in scores.items() if s > 0), key=lambda d: -scores[d])
+        if ranked:
+            return ranked[:limit]
+        return _fallback_extract(reviews, limit)
+
+
+def _fallback_extract(reviews: list[dict], limit: int) -> list[str]:
+    """詞庫完全沒命中時才用 regex，且只收以菜名常見字結尾的片段，避免把句子當菜名"""
+    items: list[str] = []
+    for rev in reviews or []:
+        for m in _CUE_CONTEXT.finditer(rev.get("text", "") or ""):
+            grams = _cue_candidates(m)
+            if grams and grams[-1] not in items:
+                items.append(grams[-1])
+        if len(items) >= limit:
+            break
+    return items[:limit]
+
+
+_extractor: Optional[DishExtractor] = None
+
+
+def get_extractor() -> DishExtractor:
+    global _extractor
+    if _extractor is None:
+        _extractor = DishExtractor(seed_dishes() + load_mined_dishes())
+    return _extractor
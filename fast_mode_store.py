@@ -0,0 +1,9 @@
+import state_store
+
+
+def set_guild_fast_mode(guild_id: int, enabled: bool) -> None:
+    state_store.set(guild_id, "fast_mode", enabled)
+
+
+def get_guild_fast_mode(guild_id: int) -> bool:
+    return bool(state_store.get(guild_id, "fast_mode", False))
@@ -1,17 +1,30 @@
 import asyncio
 import json
 import re
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from typing import Optional
 
-import httpx
 
 import config  # Load .env before food_tool import.
+from dish_lexicon import get_extractor as get_dish_extractor
+from fast_mode_store import get_guild_fast_mode
 from food_tool import Tools as FoodTools
 from llm_client import llm_generate
 from nutrition import llm_translate_list, usda_food_nutrition
+from opening_hours import MIN_OPEN_MINUTES, meal_window
+from place_index import canonical_location
+import query_log
+from prewarm import live_request, record_query
+from profiles import get_profile
+from prompt_budget import build_food_prompt
+from resilience import OPEN_METEO, http_client
+from response_utils import render_food_results
+from result_cache import ResultCache
 from style_store import get_guild_style
+from telemetry import span
 from text_utils import (
     detect_food_location,
     detect_meal_from_text,
@@ -19,41 +32,104 @@ from text_utils import (
     extract_food_filters,
     extract_nutrition_target,
     infer_meal_by_time,
+    mentions_food_filters,
+    mentions_location,
+    request_leftover,
 )
+from wishlist import extract_restaurant_names
+
+_food: Optional[FoodTools] = None
+_food_lock = threading.Lock()
+
+
+def get_food_tools() -> FoodTools:
+    """第一次用到才建立 Tools（import 時不檢查 API key、不建快取），to_thread 裡呼叫也安全"""
+    global _food
+    if _food is None:
+        with _food_lock:
+            if _food is None:
+                _food = FoodTools()
+    return _food
+
+recommendation_cache = ResultCache(
+    soft_ttl=config.FOOD_CACHE_SOFT_TTL_SECONDS,
+    hard_ttl=config.FOOD_CACHE_HARD_TTL_SECONDS,
+    max_entries=config.FOOD_CACHE_MAX_ENTRIES,
+    max_chars=config.FOOD_CACHE_MAX_CHARS,
+)
+
+
+# 天氣快取：尖峰前由 prewarm 預先查好，尖峰時直接用（只快取成功的結果）
+_weather_cache: dict[tuple[str, str], tuple[float, dict]] = {}
 
-food = FoodTools()
+
+def _cached_weather(key: tuple[str, str]) -> Optional[dict]:
+    entry = _weather_cache.get(key)
+    if entry is None or time.monotonic() - entry[0] >= config.WEATHER_CACHE_TTL_SECONDS:
+        return None
+    return entry[1]
+
+
+def _store_weather(key: tuple[str, str], weather: Optional[dict]) -> None:
+    if not weather or weather.get("error"):
+        return
+    _weather_cache[key] = (time.monotonic(), weather)
+    if len(_weather_cache) > 256:
+        oldest = min(_weather_cache, key=lambda k: _weather_cache[k][0])
+        _weather_cache.pop(oldest, None)
 
 
 async def get_current_weather(city: str) -> dict:
-    async with httpx.AsyncClient(timeout=15) as http:
-        geo = await http.get(
-            "https://geocoding-api.open-meteo.com/v1/search",
-            params={"name": city, "count": 1, "language": "zh", "format": "json"},
-        )
-        geo.raise_for_status()
-        g = geo.json()
-        if "results" not in g or not g["results"]:
-            return {"city": city, "error": "找不到城市"}
+    cached = _cached_weather(("city", city))
+    if cached is not None:
+        return cached
+    with span("weather.current", city=city):
+        weather = await _get_current_weather(city)
+    _store_weather(("city", city), weather)
+    return weather
+
+
+async def _get_current_weather(city: str) -> dict:
+    http = http_client()
+    geo = await OPEN_METEO.get(
+        http,
+        config.OPEN_METEO_GEOCODING_URL.rstrip("/") + "/v1/search",
+        params={"name": city, "count": 1, "language": "zh", "format": "json"},
+    )
+    g = geo.json()
+    if "results" not in g or not g["results"]:
+        return {"city": city, "error": "找不到城市"}
 
-        lat = g["results"][0]["latitude"]
-        lon = g["results"][0]["longitude"]
+    lat = g["results"][0]["latitude"]
+    lon = g["results"][0]["longitude"]
 
-        w = await http.get(
-            "https://api.open-meteo.com/v1/forecast",
-            params={"latitude": lat, "longitude": lon, "current_weather": True},
-        )
-        w.raise_for_status()
-        cw = w.json().get("current_weather", {})
-        return {
-            "city": city,
-            "temperature_c": cw.get("temperature"),
-            "windspeed": cw.get("windspeed"),
-            "weathercode": cw.get("weathercode"),
-        }
+    w = await OPEN_METEO.get(
+        http,
+        config.OPEN_METEO_FORECAST_URL.rstrip("/") + "/v1/forecast",
+        params={"latitude": lat, "longitude": lon, "current_weather": True},
+    )
+    cw = w.json().get("current_weather", {})
+    return {
+        "city": city,
+        "temperature_c": cw.get("temperature"),
+        "windspeed": cw.get("windspeed"),
+        "weathercode": cw.get("weathercode"),
+    }
 
 async def get_weather_by_location(location: str) -> Optional[dict]:
+    location = canonical_location(location)
+    cached = _cached_weather(("location", location))
+    if cached is not None:
+        return cached
+    with span("weather.by_location", location=location):
+        weather = await _get_weather_by_location(location)
+    _store_weather(("location", location), weather)
+    return weather
+
+
+async def _get_weather_by_location(location: str) -> Optional[dict]:
     try:
-        latlon = await asyncio.to_thread(food._geocode, location)
+        latlon = await asyncio.to_thread(get_food_tools()._geocode, location)
     except Exception:
         return None
     try:
@@ -62,19 +138,19 @@ async def get_weather_by_location(location: str) -> Optional[dict]:
         lon = float(lon_str)
     except Exception:
         return None
-    async with httpx.AsyncClient(timeout=15) as http:
-        w = await http.get(
-            "https://api.open-meteo.com/v1/forecast",
-            params={"latitude": lat, "longitude": lon, "current_weather": True},
-        )
-        w.raise_for_status()
-        cw = w.json().get("current_weather", {})
-        return {
-            "city": location,
-            "temperature_c": cw.get("temperature"),
-            "windspeed": cw.get("windspeed"),
-            "weathercode": cw.get("weathercode"),
-        }
+    http = http_client()
+    w = await OPEN_METEO.get(
+        http,
+        config.OPEN_METEO_FORECAST_URL.rstrip("/") + "/v1/forecast",
+        params={"latitude": lat, "longitude": lon, "current_weather": True},
+    )
+    cw = w.json().get("current_weather", {})
+    return {
+        "city": location,
+        "temperature_c": cw.get("temperature"),
+        "windspeed": cw.get("windspeed"),
+        "weathercode": cw.get("weathercode"),
+    }
 
 
 async def find_food(
@@ -86,13 +162,33 @@ async def find_food(
     travel_mode: str = "walking",
     ) -> str:
     return await asyncio.to_thread(
-        food.find_food,
+        get_food_tools().find_food,
+        keyword,
+        location,
+        max_travel_time,
+        min_rating,
+        min_reviews,
+        travel_mode,
+    )
+
+async def search_food(
+    keyword: str,
+    location: str = "國立成功大學",
+    max_travel_time: int = 20,
+    min_rating: float = 3.5,
+    min_reviews: int = 0,
+    travel_mode: str = "walking",
+    open_between: Optional[tuple[datetime, datetime]] = None,
+    ) -> list[dict]:
+    return await asyncio.to_thread(
+        get_food_tools().search_places,
         keyword,
         location,
         max_travel_time,
         min_rating,
         min_reviews,
         travel_mode,
+        open_between,
     )
 
 async def llm_extract_food_query(user_text: str) -> tuple[str, str]:
@@ -103,7 +199,7 @@ async def llm_extract_food_query(user_text: str) -> tuple[str, str]:
         f"使用者：{user_text}"
     )
     try:
-        raw = (await llm_generate(prompt)).strip()
+        raw = (await llm_generate(prompt, purpose="food_extract_query")).strip()
     except Exception:
         return ("", "")
 
@@ -145,7 +241,7 @@ async def llm_extract_food_filters(
         f"使用者：{user_text}"
     )
     try:
-        raw = (await llm_generate(prompt)).strip()
+        raw = (await llm_generate(prompt, purpose="food_extract_filters")).strip()
     except Exception:
         return extract_food_filters(
             user_text,
@@ -266,46 +362,203 @@ async def _apply_style(text: str, guild_id: Optional[int]) -> str:
         return text
 
 
-async def run_food_agent(user_text: str, guild_id: Optional[int] = None) -> tuple[str, str]:
-    dish, location_label = await llm_extract_food_query(user_text)
+def is_fast_mode(guild_id: Optional[int]) -> bool:
+    return guild_id is not None and get_guild_fast_mode(guild_id)
+
+
+async def run_food_agent(
+    user_text: str,
+    guild_id: Optional[int] = None,
+    fast: Optional[bool] = None,
+    user_id: Optional[int] = None,
+) -> tuple[str, str]:
+    """
+    fast=None 時依伺服器設定；快速模式只用規則解析、不查天氣、不呼叫 LLM，
+    直接把搜尋結果排版回傳（延遲只剩 Google API）。
+    user_id 有給時套用個人的 /profile 設定（蓋過伺服器設定）。
+    """
+    if fast is None:
+        fast = is_fast_mode(guild_id)
+    with span("agent.food", guild_id=guild_id, fast=fast), live_request(), query_log.track("food", guild_id):
+        return await _run_food_agent(user_text, guild_id, fast, user_id)
+
+
+async def _run_food_agent(
+    user_text: str,
+    guild_id: Optional[int] = None,
+    fast: bool = False,
+    user_id: Optional[int] = None,
+) -> tuple[str, str]:
+    # 有設定預設地點、訊息又沒講地點時，直接用設定檔（座標已存好），不用解析地點也不用 geocode
+    profile = get_profile(guild_id, user_id)
+    named_place = mentions_location(user_text) or bool(_fallback_extract_location(user_text))
+    home = profile if profile.get("location") and not named_place else None
+    if home is not None and profile.get("latlng"):
+        get_food_tools().remember_geocode(home["location"], home["latlng"])
+    # 用預設地點、訊息又只講了菜名（「晚餐想吃拉麵」）時查菜名詞庫，查得到就連 LLM 解析都省了；
+    # 還有其他字（「公館附近拉麵」、「我在信義區想吃拉麵」）就交給 LLM，它解析出的地點會蓋過設定檔
+    lexicon_dish = next(iter(get_dish_extractor().mentions(user_text)), "") if home is not None else ""
+    if lexicon_dish and request_leftover(user_text, lexicon_dish):
+        lexicon_dish = ""
+    if fast or lexicon_dish:
+        dish, location_label = lexicon_dish, ""
+    else:
+        with span("food.extract_query"), query_log.stage("extract_query"):
+            dish, location_label = await llm_extract_food_query(user_text)
     if not dish:
         dish = _fallback_extract_dish(user_text)
-    if not location_label:
-        location_label = _fallback_extract_location(user_text)
-    if not location_label:
-        city_en, location_label = detect_food_location(user_text)
+    if not location_label and home is not None:
+        location_label = home["location"]
+        city_en = home.get("city_en") or extract_city(location_label)
     else:
-        city_en = extract_city(location_label)
+        if not location_label:
+            location_label = _fallback_extract_location(user_text)
+        if not location_label:
+            city_en, location_label = detect_food_location(user_text)
+        else:
+            city_en = extract_city(location_label)
     debug_prefix = f"（解析：地點：{location_label or '未提供'}；餐點：{dish or '未提供'}）"
     meal_by_text = detect_meal_from_text(user_text)
     now = datetime.now(ZoneInfo("Asia/Taipei"))
     meal_guess = meal_by_text or infer_meal_by_time(now)
     meal_src = "使用者描述" if meal_by_text else "當前時間推測"
-    local_time = now.strftime("%H:%M")
-    max_travel_time, min_rating, min_reviews, travel_mode = await llm_extract_food_filters(user_text)
+    # 設定檔的條件當預設值；訊息裡看不出有講條件就不用問 LLM
+    filter_defaults = (
+        profile.get("max_travel_time", 20),
+        profile.get("min_rating", 3.5),
+        profile.get("min_reviews", 0),
+        profile.get("travel_mode", "walking"),
+    )
+    if fast or (profile and not mentions_food_filters(user_text)):
+        max_travel_time, min_rating, min_reviews, travel_mode = extract_food_filters(user_text, *filter_defaults)
+    else:
+        with span("food.extract_filters"), query_log.stage("extract_filters"):
+            max_travel_time, min_rating, min_reviews, travel_mode = await llm_extract_food_filters(
+                user_text, *filter_defaults,
+            )
+    diet = profile.get("diet", "")
     travel_mode_label = {
         "walking": "步行",
         "driving": "車程",
         "bicycling": "騎車",
     }.get(travel_mode, "移動")
 
-    weather = None
-    if location_label:
-        weather = await get_weather_by_location(location_label)
-    if not weather:
-        weather = await get_current_weather(city_en)
     keyword = dish or user_text
     search_kw = keyword if meal_by_text else f"{meal_guess} {keyword}"
-    food_text = await find_food(
-        keyword=search_kw,
-        location=location_label,
-        max_travel_time=max_travel_time,
-        min_rating=min_rating,
-        min_reviews=min_reviews,
-        travel_mode=travel_mode,
+    # 統計與預熱只記解析出的菜名（快速模式沒有 LLM 解析，改用菜名詞庫找），不記原文
+    logged_dish = dish or next(iter(get_dish_extractor().mentions(user_text)), "")
+    if logged_dish:
+        record_query(guild_id, logged_dish, location_label, travel_mode)
+    # 快取 key 只用解析後的條件；風格會改變回覆內容，所以也算進 key（不同風格的伺服器互不共用）
+    style = get_guild_style(guild_id) if guild_id is not None and not fast else ""
+    cache_key = (
+        _normalize_query(search_kw),
+        _normalize_query(location_label),
+        max_travel_time,
+        min_rating,
+        min_reviews,
+        travel_mode,
+        meal_guess,
+        bool(meal_by_text),
+        fast,
+        style,
+        diet,
     )
-    if ("找不到符合條件" in food_text) or ("找不到" in food_text and "餐廳" in food_text):
+
+    async def compose() -> tuple[tuple[str, str], bool]:
+        return await _compose_food_answer(
+            user_text=user_text,
+            guild_id=guild_id,
+            fast=fast,
+            debug_prefix=debug_prefix,
+            city_en=city_en,
+            location_label=location_label,
+            search_kw=search_kw,
+            meal_by_text=meal_by_text,
+            meal_guess=meal_guess,
+            meal_src=meal_src,
+            max_travel_time=max_travel_time,
+            min_rating=min_rating,
+            min_reviews=min_reviews,
+            travel_mode=travel_mode,
+            travel_mode_label=travel_mode_label,
+            diet=diet,
+        )
+
+    record = query_log.current()
+    if record is not None:
+        record.set(
+            keyword=logged_dish,
+            location=location_label,
+            travel_mode=travel_mode,
+            meal=meal_guess,
+            max_travel_time=max_travel_time,
+            min_rating=min_rating,
+            min_reviews=min_reviews,
+            cache=recommendation_cache.state(cache_key),
+            flags=(query_log.FLAG_FAST if fast else 0) | (query_log.FLAG_MEAL_FROM_TEXT if meal_by_text else 0),
+        )
+    return await recommendation_cache.get_or_compute(cache_key, compose)
+
+
+def _normalize_query(text: str) -> str:
+    return " ".join((text or "").split()).casefold()
+
+
+async def _compose_food_answer(
+    *,
+    user_text: str,
+    guild_id: Optional[int],
+    fast: bool,
+    debug_prefix: str,
+    city_en: str,
+    location_label: str,
+    search_kw: str,
+    meal_by_text: Optional[str],
+    meal_guess: str,
+    meal_src: str,
+    max_travel_time: int,
+    min_rating: float,
+    min_reviews: int,
+    travel_mode: str,
+    travel_mode_label: str,
+    diet: str = "",
+) -> tuple[tuple[str, str], bool]:
+    """天氣、搜尋、產生回覆；回傳 ((ans, raw_ans), 可否快取)。背景更新時也會呼叫，所以時間要自己取"""
+    now = datetime.now(ZoneInfo("Asia/Taipei"))
+    local_time = now.strftime("%H:%M")
+    weather = None
+    if not fast:
+        # 天氣只是參考：上游慢或斷路器開啟時就不帶天氣，不要卡住整個回覆
+        with span("food.weather"), query_log.stage("weather"):
+            try:
+                if location_label:
+                    weather = await get_weather_by_location(location_label)
+                if not weather:
+                    weather = await get_current_weather(city_en)
+            except Exception:
+                weather = None
+    # 有講餐別就看那個時段有沒有開，否則看現在起 30 分鐘內是否都營業
+    if meal_by_text:
+        open_between = meal_window(meal_by_text, now)
+    else:
+        open_between = (now, now + timedelta(minutes=MIN_OPEN_MINUTES))
+    with span("food.find_food", keyword=search_kw, location=location_label, travel_mode=travel_mode), \
+            query_log.stage("search"):
+        results = await search_food(
+            keyword=search_kw,
+            location=location_label,
+            max_travel_time=max_travel_time,
+            min_rating=min_rating,
+            min_reviews=min_reviews,
+            travel_mode=travel_mode,
+            open_between=open_between,
+        )
+    query_log.annotate(results=len(results))
+    if not results:
+        food_text = get_food_tools().format_results(results, search_kw, location_label, travel_mode)
         tips = [
+            "只會列出現在有開的店；想找其他時段可以加上餐別（例如「晚餐 拉麵」）。",
             "把評論數門檻降低（例如 2000+ 改 500+ / 1000+）。",
             "放寬移動時間或評分門檻（例如 20 分鐘改 30 分鐘）。",
             "改用更一般的關鍵字或指定區域（例如「早午餐、拉麵、小吃、台南東區」）。",
@@ -316,44 +569,59 @@ async def run_food_agent(user_text: str, guild_id: Optional[int] = None) -> tupl
             "建議你可以這樣調整搜尋方向：\n"
             f"{tip_text}"
         )
-        return debug_prefix + "\n" + message, message
+        # 沒結果可能是上游暫時出錯，不快取
+        return (debug_prefix + "\n" + message, message), False
+
+    if fast:
+        message = render_food_results(results, search_kw, location_label, travel_mode_label)
+        return (debug_prefix + "\n" + message, message), True
+
+    prompt, prompt_stats = build_food_prompt(
+        user_text=user_text,
+        style_hint=_style_hint(guild_id),
+        location_label=location_label,
+        conditions=(
+            f"{max_travel_time} 分鐘內、評分 {min_rating}+、評論數 {min_reviews}+、交通方式 {travel_mode_label}"
+            + (f"、飲食偏好 {diet}" if diet else "")
+        ),
+        meal_line=f"{meal_guess}（來源：{meal_src}）",
+        local_time=local_time,
+        weather=weather,
+        results=results,
+        travel_mode_label=travel_mode_label,
+    )
+
+    try:
+        with span("food.generate", **prompt_stats), query_log.stage("generate"):
+            answer = await llm_generate(prompt, purpose="food_answer")
+        return (debug_prefix + "\n" + answer, answer), True
+    except Exception as e:
+        # LLM 掛掉時退回快速模式的排版，至少把搜尋結果給使用者（不快取，LLM 恢復後重新產生）
+        query_log.mark_error()
+        print(f"food answer LLM failed: {e}")
+        message = (
+            "（LLM 暫時無法使用，先列出搜尋結果）\n"
+            + render_food_results(results, search_kw, location_label, travel_mode_label)
+        )
+        return (debug_prefix + "\n" + message, message), False
+
 
+async def food_blurb(user_text: str, raw_ans: str, guild_id: Optional[int] = None) -> str:
+    """快速模式清單送出後，再用 LLM 補一段短評（失敗或沒設定 LLM 就回空字串）"""
+    if not config.LLM_API_KEY or not extract_restaurant_names(raw_ans):
+        return ""
     prompt = "".join([
-        "你是成大附近的美食推薦助理，回覆要有人情味、口吻自然、資訊完整。\n",
+        "你是成大附近的美食推薦助理，以下清單已經給使用者看過了。\n",
+        "請用繁中寫 2~3 句短評：最推哪一家、為什麼，不要重列清單、不要加連結。\n",
         _style_hint(guild_id),
         f"使用者需求：{user_text}\n",
-        f"搜尋地點：{location_label}\n",
-        f"條件：{max_travel_time} 分鐘內、評分 {min_rating}+、評論數 {min_reviews}+、交通方式 {travel_mode_label}\n",
-        f"餐別：{meal_guess}（來源：{meal_src}）\n",
-        f"現在時間（台灣）：{local_time}\n",
-        f"天氣資料：{json.dumps(weather, ensure_ascii=False)}\n",
-        "搜尋結果（包含距離/評分/評論數/價位/必點/評論摘要）：\n",
-        f"{food_text}\n\n",
-        "請用繁中給 3~5 家推薦，內容要更豐富、有情感，但避免冗長。\n",
-        f"每家請包含：店名（可加簡短亮點標語）、評分與評論數、{travel_mode_label}時間、地圖連結、營業時間、推薦菜品（至少 2 道），以及一段「推薦理由」（1~2 句）。\n",
-        "可以補充 1 句貼心提示（例如適合的場合或天氣）。\n",
-        "推薦菜品必須是名詞短語，且只能從搜尋結果的「必點/推薦菜品清單」挑選；若清單為空，請寫「暫無明確推薦」。\n",
-        "避免產生像句子的菜名或奇怪語法。\n",
-        "格式示例：\n",
-        "[1️⃣] 店名（亮點）\n",
-        "   評分：x.x（xxxx 則評論）\n",
-        f"   {travel_mode_label}：xx 分鐘\n",
-        "   地圖：Google Maps 連結\n",
-        "   營業時間：xx\n",
-        "   推薦菜品：\n",
-        "   • 菜名1 — 亮點描述\n",
-        "   • 菜名2 — 亮點描述\n",
-        "   推薦理由：一句到兩句\n",
-        "   小提醒：一句話\n",
-        "必須把「推薦菜品」寫成具體菜名，避免只寫“推薦招牌”；每家都要附 Google Maps 連結。",
+        f"清單：\n{raw_ans}",
     ])
-
     try:
-        answer = await llm_generate(prompt)
-        return debug_prefix + "\n" + answer, answer
-    except Exception as e:
-        err = f"{debug_prefix}\n抱歉，呼叫 LLM 失敗：{e}"
-        return err, err
+        with span("food.blurb"):
+            return (await llm_generate(prompt, purpose="food_blurb")).strip()
+    except Exception:
+        return ""
 
 
 async def run_weather_agent(user_text: str, guild_id: Optional[int] = None) -> str:
@@ -393,8 +661,12 @@ async def run_chat_agent(user_text: str, guild_id: Optional[int] = None) -> str:
 
 
 async def run_nutrition_agent(user_text: str, guild_id: Optional[int] = None) -> str:
-    target = extract_nutrition_target(user_text)
-    converted = await llm_translate_list([target])
-    target = converted[0] if converted else target
-    result = await usda_food_nutrition(target)
-    return result
+    with query_log.track("nutrition", guild_id) as record:
+        target = extract_nutrition_target(user_text)
+        with query_log.stage("translate"):
+            converted = await llm_translate_list([target])
+        target = converted[0] if converted else target
+        record.set(keyword=target)
+        with query_log.stage("usda"):
+            result = await usda_food_nutrition(target)
+        return result
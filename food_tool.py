@@ -1,7 +1,45 @@
 import os
-import requests
-from typing import List, Dict
-import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+
+from config import GOOGLE_MAPS_BASE_URL, TRAVEL_CALIBRATION_PATH
+from dish_lexicon import get_extractor as get_dish_extractor
+from opening_hours import hours_today, is_open_between, open_status, schedule_for
+from place_index import canonical_location
+from resilience import GOOGLE
+from telemetry import inc, span
+from travel_estimator import TravelEstimator
+
+
+class _TTLCache:
+    """執行緒安全的 LRU + TTL 快取（search_places 跑在 to_thread 裡，背景預熱也會寫入）"""
+
+    def __init__(self, name: str, ttl: float, max_size: int):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: "OrderedDict[object, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or time.monotonic() - entry[0] >= self.ttl:
+                inc("google_cache_total", cache=self.name, result="miss")
+                return None
+            self._data.move_to_end(key)
+        inc("google_cache_total", cache=self.name, result="hit")
+        return entry[1]
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
 
 
 class Tools:
@@ -15,34 +53,65 @@ class Tools:
 
     GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY", "")
 
-    GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
-    PLACES_TEXT_SEARCH_URL = "https://maps.googleapis.com/maps/api/place/textsearch/json"
-    DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
-    PLACE_DETAILS_URL = "https://maps.googleapis.com/maps/api/place/details/json"
+    BASE_URL = GOOGLE_MAPS_BASE_URL.rstrip("/")
+    GEOCODE_URL = f"{BASE_URL}/maps/api/geocode/json"
+    PLACES_TEXT_SEARCH_URL = f"{BASE_URL}/maps/api/place/textsearch/json"
+    DISTANCE_MATRIX_URL = f"{BASE_URL}/maps/api/distancematrix/json"
+    PLACE_DETAILS_URL = f"{BASE_URL}/maps/api/place/details/json"
+
+    DISH_CACHE_SIZE = 2048
+    # 地點座標幾乎不變；搜尋結果與店家資料（評分、評論、營業時間）變得慢，快取到下一輪尖峰前
+    GEOCODE_CACHE_TTL = 24 * 3600
+    SEARCH_CACHE_TTL = 30 * 60
+    DETAILS_CACHE_TTL = 3 * 3600
 
     def __init__(self):
         if not self.GOOGLE_API_KEY:
             raise RuntimeError("GOOGLE_API_KEY not set in environment variables")
+        # search_places 跑在 to_thread 裡，快取要上鎖
+        self._dish_cache: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._dish_lock = threading.Lock()
+        # 由 place_index.start_indexer 掛上；None 表示一律即時搜尋
+        self.place_index = None
+        self.travel_estimator = TravelEstimator(TRAVEL_CALIBRATION_PATH)
+        self._geocode_cache = _TTLCache("geocode", self.GEOCODE_CACHE_TTL, 1024)
+        self._search_cache = _TTLCache("places_search", self.SEARCH_CACHE_TTL, 1024)
+        self._details_cache = _TTLCache("place_details", self.DETAILS_CACHE_TTL, 4096)
 
     # ------------------------------------------------------------
     # 基礎工具
     # ------------------------------------------------------------
+    def _get(self, stage: str, url: str, params: Dict) -> Dict:
+        """所有 Google HTTP 呼叫的共同入口（含 tracing span、斷路器與自適應 timeout）"""
+        with span(f"google.{stage}") as s:
+            r = GOOGLE.get_sync(url, params)
+            s.set(status_code=r.status_code)
+            return r.json()
+
     def _geocode(self, location: str) -> str:
-        """把地點轉成 lat,lng 字串"""
+        """把地點轉成 lat,lng 字串（別名先換成標準名稱，跟 prewarm / place_index 用同一個快取 key）"""
+        location = canonical_location(location)
+        cached = self._geocode_cache.get(location)
+        if cached is not None:
+            return cached
         params = {
             "address": location,
             "key": self.GOOGLE_API_KEY,
             "language": "zh-TW",
         }
-        r = requests.get(self.GEOCODE_URL, params=params, timeout=10)
-        r.raise_for_status()
-        data = r.json()
+        data = self._get("geocode", self.GEOCODE_URL, params)
 
         if not data.get("results"):
             raise ValueError(f"Geocode failed for location: {location}")
 
         loc = data["results"][0]["geometry"]["location"]
-        return f"{loc['lat']},{loc['lng']}"
+        latlng = f"{loc['lat']},{loc['lng']}"
+        self._geocode_cache.put(location, latlng)
+        return latlng
+
+    def remember_geocode(self, location: str, latlng: str) -> None:
+        """已知座標的地點（例如 /profile 設定時 geocode 好的）直接放進快取，搜尋與天氣都不用再查"""
+        self._geocode_cache.put(canonical_location(location), latlng)
 
     def _distance_minutes(self, origin: str, destination: str, mode: str = "walking") -> int:
         """回傳行程時間（分鐘）"""
@@ -53,17 +122,40 @@ class Tools:
             "key": self.GOOGLE_API_KEY,
             "language": "zh-TW",
         }
-        r = requests.get(self.DISTANCE_MATRIX_URL, params=params, timeout=10)
-        r.raise_for_status()
-        data = r.json()
+        data = self._get("distance_matrix", self.DISTANCE_MATRIX_URL, params)
 
         element = data["rows"][0]["elements"][0]
         if element["status"] != "OK":
             return 999
 
-        return int(element["duration"]["value"] / 60)
+        minutes = int(element["duration"]["value"] / 60)
+        self.travel_estimator.observe(origin, destination, mode, minutes)
+        return minutes
+
+    def _distance_minutes_many(self, origin: str, destinations: List[str], mode: str = "walking") -> List[int]:
+        """一次查多個目的地（Distance Matrix 每次最多 25 個），給索引批次預算用"""
+        minutes: List[int] = []
+        for i in range(0, len(destinations), 25):
+            batch = destinations[i:i + 25]
+            params = {
+                "origins": origin,
+                "destinations": "|".join(batch),
+                "mode": mode,
+                "key": self.GOOGLE_API_KEY,
+                "language": "zh-TW",
+            }
+            data = self._get("distance_matrix", self.DISTANCE_MATRIX_URL, params)
+            elements = data["rows"][0]["elements"]
+            for dest, e in zip(batch, elements):
+                value = int(e["duration"]["value"] / 60) if e.get("status") == "OK" else 999
+                self.travel_estimator.observe(origin, dest, mode, value)
+                minutes.append(value)
+        return minutes
 
     def _place_details(self, place_id: str) -> Dict:
+        cached = self._details_cache.get(place_id)
+        if cached is not None:
+            return cached
         params = {
             "place_id": place_id,
             "fields": (
@@ -74,35 +166,46 @@ class Tools:
             "language": "zh-TW",
             "review_sort": "newest",
         }
-        r = requests.get(self.PLACE_DETAILS_URL, params=params, timeout=10)
-        r.raise_for_status()
-        return r.json().get("result", {})
+        details = self._get("place_details", self.PLACE_DETAILS_URL, params).get("result", {})
+        if details:
+            self._details_cache.put(place_id, details)
+        return details
+
+    def _text_search(self, query: str, origin: str, radius: int = 2000) -> Dict:
+        key = (query, origin, radius)
+        cached = self._search_cache.get(key)
+        if cached is not None:
+            return cached
+        params = {
+            "query": query,
+            "location": origin,
+            "radius": radius,
+            "key": self.GOOGLE_API_KEY,
+            "language": "zh-TW",
+        }
+        data = self._get("places_search", self.PLACES_TEXT_SEARCH_URL, params)
+        if data.get("results"):
+            self._search_cache.put(key, data)
+        return data
 
-    def _extract_recommended_items(self, reviews: List[Dict]) -> List[str]:
+    def _extract_recommended_items(self, reviews: List[Dict], place_id: Optional[str] = None) -> List[str]:
         """
-        從評論中抓出推薦/必點的菜名（簡單 regex，最多 5 個）
+        從評論中抓出推薦/必點的菜名（菜名詞庫編成的 trie regex，最左最長比對，依出現次數與語境排序，最多 5 個）。
+        同一家店的結果依 place_id 快取。
         """
-        # e.g. 推薦牛肉麵 / 牛肉麵必點 / 魯肉飯好吃
-        patterns = [
-            re.compile(r"(推薦|必點|招牌|必吃|超推)\s*([^\s，。.!！?？]{1,10})"),
-            re.compile(r"([^\s，。.!！?？]{1,10})(好吃|好喝|很推|值得)"),
-        ]
-        generic_words = {"好吃", "好喝", "很推", "值得", "推薦", "必點", "招牌", "必吃", "超推"}
-        items: List[str] = []
-        for rev in reviews or []:
-            text = rev.get("text", "") or ""
-            for p in patterns:
-                for m in p.finditer(text):
-                    # pattern1: 取推薦後的菜名；pattern2: 取菜名本身（前段）
-                    dish = (m.group(2) if m.re is patterns[0] else m.group(1)) or ""
-                    dish = dish.strip("：:，。.!！?？ 、「」[]()（）")
-                    if not dish or dish in generic_words:
-                        continue
-                    if dish not in items:
-                        items.append(dish)
-            if len(items) >= 5:
-                break
-        return items[:5]
+        if place_id:
+            with self._dish_lock:
+                cached = self._dish_cache.get(place_id)
+                if cached is not None:
+                    self._dish_cache.move_to_end(place_id)
+                    return cached
+        items = get_dish_extractor().extract(reviews, limit=5)
+        if place_id:
+            with self._dish_lock:
+                self._dish_cache[place_id] = items
+                if len(self._dish_cache) > self.DISH_CACHE_SIZE:
+                    self._dish_cache.popitem(last=False)
+        return items
 
     def _top_review_snippet(self, reviews: List[Dict]) -> str:
         for rev in reviews or []:
@@ -114,7 +217,14 @@ class Tools:
     # ------------------------------------------------------------
     # 主要對外工具
     # ------------------------------------------------------------
-    def find_food(
+    TRAVEL_MODE_LABELS = {
+        "walking": "步行",
+        "driving": "車程",
+        "bicycling": "騎車",
+        "transit": "大眾運輸",
+    }
+
+    def search_places(
         self,
         keyword: str,
         location: str = "國立成功大學",
@@ -122,66 +232,100 @@ class Tools:
         min_rating: float = 3.5,
         min_reviews: int = 0,
         travel_mode: str = "walking",
-    ) -> str:
+        open_between: Optional[Tuple[datetime, datetime]] = None,
+    ) -> List[Dict]:
         """
-        搜尋餐廳並回傳給 LLM 使用的推薦資料（文字格式）
+        搜尋餐廳並回傳結構化結果（最多 5 家），給 prompt builder / 文字格式共用。
+        open_between=(開始, 結束) 時剔除這段時間沒開的店，並附上當天營業時間與營業狀態。
         """
         if travel_mode not in {"walking", "driving", "bicycling", "transit"}:
             travel_mode = "walking"
 
-        origin = self._geocode(location)
+        # 熱門地點先查本機索引（place_index 背景建好的），沒命中才打 Google
+        if self.place_index is not None:
+            indexed = self.place_index.lookup(
+                keyword, location, max_travel_time, min_rating, min_reviews, travel_mode, open_between=open_between,
+            )
+            if indexed is not None:
+                return [self._annotate_hours(r, open_between) for r in indexed]
 
-        params = {
-            "query": f"{keyword} 餐廳",
-            "location": origin,
-            "radius": 2000,
-            "key": self.GOOGLE_API_KEY,
-            "language": "zh-TW",
-        }
-        r = requests.get(self.PLACES_TEXT_SEARCH_URL, params=params, timeout=10)
-        r.raise_for_status()
-        data = r.json()
+        origin = self._geocode(location)
+        data = self._text_search(f"{keyword} 餐廳", origin)
 
         results: List[Dict] = []
 
         for item in data.get("results", []):
             place_id = item.get("place_id")
+            dest = f"{item['geometry']['location']['lat']},{item['geometry']['location']['lng']}"
+
+            # 先用本機估計剔除明顯太遠的店（連 Place Details 都省掉）
+            decision, travel_time = self.travel_estimator.classify(origin, dest, travel_mode, max_travel_time)
+            inc("travel_estimates_total", decision=decision, mode=travel_mode)
+            if decision == "out":
+                continue
+
             details = self._place_details(place_id)
 
             rating = details.get("rating", 0)
             reviews = details.get("user_ratings_total", 0)
-            raw_reviews = details.get("reviews", []) or []
-            rec_items = self._extract_recommended_items(raw_reviews)
-            review_snippet = self._top_review_snippet(raw_reviews)
 
             if rating < min_rating or reviews < min_reviews:
                 continue
 
-            dest = f"{item['geometry']['location']['lat']},{item['geometry']['location']['lng']}"
-            travel_time = self._distance_minutes(origin, dest, travel_mode)
+            periods = (details.get("opening_hours") or {}).get("periods")
+            if open_between and not is_open_between(schedule_for(place_id, periods), *open_between):
+                inc("closed_places_filtered_total")
+                continue
+
+            if travel_time is None:
+                travel_time = self._distance_minutes(origin, dest, travel_mode)
 
             if travel_time > max_travel_time:
                 continue
 
-            results.append({
-                "name": details.get("name"),
-                "rating": rating,
-                "reviews": reviews,
-                "price_level": details.get("price_level"),
-                "address": details.get("formatted_address"),
-                "travel_time_min": travel_time,
-                "recommended_items": rec_items,
-                "review_snippet": review_snippet,
-                "opening_hours": (details.get("opening_hours") or {}).get("weekday_text", []),
-                "map_url": details.get("url") or f"https://www.google.com/maps/place/?q=place_id:{place_id}",
-            })
+            results.append(self._annotate_hours(self._place_record(place_id, item, details, travel_time), open_between))
 
             if len(results) >= 5:
                 break
 
-        # --------------------------------------------------------
-        # 回傳給 LLM 的文字（你原本 tool 的用途）
-        # --------------------------------------------------------
+        return results
+
+    def _annotate_hours(self, record: Dict, open_between: Optional[Tuple[datetime, datetime]]) -> Dict:
+        if not open_between:
+            return record
+        at = open_between[0]
+        schedule = schedule_for(record["place_id"], record.get("opening_periods"))
+        return dict(
+            record,
+            hours_today=hours_today(record.get("opening_hours") or [], at),
+            open_status=open_status(schedule, at),
+        )
+
+    def _place_record(self, place_id: str, item: Dict, details: Dict, travel_time: int) -> Dict:
+        """search_places 與 place_index 共用的餐廳資料格式"""
+        raw_reviews = details.get("reviews", []) or []
+        loc = item["geometry"]["location"]
+        return {
+            "place_id": place_id,
+            "name": details.get("name"),
+            "rating": details.get("rating", 0),
+            "reviews": details.get("user_ratings_total", 0),
+            "price_level": details.get("price_level"),
+            "address": details.get("formatted_address"),
+            "lat": loc["lat"],
+            "lng": loc["lng"],
+            "travel_time_min": travel_time,
+            "recommended_items": self._extract_recommended_items(raw_reviews, place_id),
+            "review_snippet": self._top_review_snippet(raw_reviews),
+            "opening_hours": (details.get("opening_hours") or {}).get("weekday_text", []),
+            "opening_periods": (details.get("opening_hours") or {}).get("periods"),
+            "map_url": details.get("url") or f"https://www.google.com/maps/place/?q=place_id:{place_id}",
+        }
+
+    def format_results(self, results: List[Dict], keyword: str, location: str, travel_mode: str = "walking") -> str:
+        """
+        回傳給 LLM 的文字（你原本 tool 的用途）
+        """
         if not results:
             return (
                 f"在 {location} 附近找不到符合條件的「{keyword}」餐廳。\n"
@@ -193,16 +337,13 @@ class Tools:
             "",
         ]
 
-        mode_label = {
-            "walking": "步行",
-            "driving": "車程",
-            "bicycling": "騎車",
-            "transit": "大眾運輸",
-        }.get(travel_mode, "移動")
+        mode_label = self.TRAVEL_MODE_LABELS.get(travel_mode, "步行")
 
         for i, r in enumerate(results, 1):
             hours = r["opening_hours"]
-            hours_text = hours[0] if hours else "營業時間未提供"
+            hours_text = r.get("hours_today") or (hours[0] if hours else "營業時間未提供")
+            if r.get("open_status"):
+                hours_text += f"（{r['open_status']}）"
             rec_text = ', '.join(r['recommended_items']) if r['recommended_items'] else '暫無明確推薦'
             output.append(
                 f"{i}. {r['name']}\n"
@@ -221,3 +362,21 @@ class Tools:
         )
 
         return "\n".join(output)
+
+    def find_food(
+        self,
+        keyword: str,
+        location: str = "國立成功大學",
+        max_travel_time: int = 20,
+        min_rating: float = 3.5,
+        min_reviews: int = 0,
+        travel_mode: str = "walking",
+        open_between: Optional[Tuple[datetime, datetime]] = None,
+    ) -> str:
+        """
+        搜尋餐廳並回傳給 LLM 使用的推薦資料（文字格式）
+        """
+        results = self.search_places(
+            keyword, location, max_travel_time, min_rating, min_reviews, travel_mode, open_between,
+        )
+        return self.format_results(results, keyword, location, travel_mode)
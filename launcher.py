@@ -0,0 +1,161 @@
+"""
+多行程分片啟動器：把 Discord 分片切成幾段，每段一個 bot.py worker 行程，掛掉就重啟。
+
+    python launcher.py                         # worker 數 = CPU 核心數，分片數用 Discord 建議值
+    python launcher.py --workers 4 --shards 8
+
+每個 worker 有自己的 event loop 與 thread pool；共用狀態（待吃清單、風格、開關）在 STATE_DB_PATH。
+會被多個行程同時寫壞的檔案（查詢紀錄、預熱歷史、trace）每個 worker 各用一份，METRICS_PORT 也依序往上加。
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import requests
+
+from config import (
+    DISCORD_TOKEN,
+    METRICS_PORT,
+    PREWARM_HISTORY_PATH,
+    QUERY_LOG_PATH,
+    TRACE_LOG_PATH,
+)
+
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+# 跑超過這麼久才掛的 worker 視為正常，重啟延遲歸零
+HEALTHY_SECONDS = 300.0
+
+
+def recommended_shards() -> int:
+    resp = requests.get(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {DISCORD_TOKEN}"},
+        timeout=10,
+    )
+    resp.raise_for_status()
+    return int(resp.json()["shards"])
+
+
+def split_shards(shard_count: int, workers: int) -> list[list[int]]:
+    """連續切段：[0..k), [k..2k) …，前面幾段多分一個"""
+    workers = max(1, min(workers, shard_count))
+    size, extra = divmod(shard_count, workers)
+    ranges, start = [], 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def worker_path(path: str, index: int) -> str:
+    """query_log.bin → query_log.w0.bin；空字串（功能關閉）維持空字串"""
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.w{index}{ext}"
+
+
+def worker_env(index: int, shard_ids: list[int], shard_count: int) -> dict:
+    env = dict(os.environ)
+    env["SHARD_IDS"] = ",".join(map(str, shard_ids))
+    env["SHARD_COUNT"] = str(shard_count)
+    env["QUERY_LOG_PATH"] = worker_path(QUERY_LOG_PATH, index)
+    env["PREWARM_HISTORY_PATH"] = worker_path(PREWARM_HISTORY_PATH, index)
+    env["TRACE_LOG_PATH"] = worker_path(TRACE_LOG_PATH, index)
+    if METRICS_PORT > 0:
+        env["METRICS_PORT"] = str(METRICS_PORT + index)
+    return env
+
+
+class Worker:
+    def __init__(self, index: int, shard_ids: list[int], shard_count: int):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.env = worker_env(index, shard_ids, shard_count)
+        self.proc: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.backoff = MIN_BACKOFF
+        self.restart_at = 0.0
+
+    def start(self) -> None:
+        self.proc = subprocess.Popen([sys.executable, "bot.py"], env=self.env)
+        self.started_at = time.monotonic()
+        print(f"worker {self.index}: pid {self.proc.pid}, shards {self.shard_ids}")
+
+    def poll(self, now: float) -> None:
+        """掛掉的 worker 依指數退避重啟"""
+        if self.proc is None:
+            if now >= self.restart_at:
+                self.start()
+            return
+        code = self.proc.poll()
+        if code is None:
+            return
+        if now - self.started_at >= HEALTHY_SECONDS:
+            self.backoff = MIN_BACKOFF
+        print(f"worker {self.index}: exited with {code}, restarting in {self.backoff:.0f}s")
+        self.proc = None
+        self.restart_at = now + self.backoff
+        self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+
+    def stop(self) -> None:
+        # 用 SIGINT：discord.py 會正常關閉，atexit（state_store 寫回）才會跑
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.send_signal(signal.SIGINT)
+
+    def wait(self, deadline: float) -> None:
+        if self.proc is None:
+            return
+        try:
+            self.proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker 行程數（不會多於分片數）")
+    parser.add_argument("--shards", type=int, default=0, help="總分片數（0 = 問 Discord 建議值）")
+    args = parser.parse_args()
+
+    shard_count = args.shards or recommended_shards()
+    workers = [
+        Worker(i, shard_ids, shard_count)
+        for i, shard_ids in enumerate(split_shards(shard_count, args.workers))
+    ]
+    print(f"launching {len(workers)} worker(s) for {shard_count} shard(s)")
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    for worker in workers:
+        worker.start()
+    while not stopping:
+        time.sleep(1.0)
+        now = time.monotonic()
+        for worker in workers:
+            worker.poll(now)
+
+    print("stopping workers…")
+    for worker in workers:
+        worker.stop()
+    deadline = time.monotonic() + 10.0
+    for worker in workers:
+        worker.wait(deadline)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 import httpx
 
 from config import LLM_BASE_URL, LLM_API_KEY
+from prompt_budget import estimate_tokens
+from resilience import LLM, http_client
+from telemetry import TOKEN_BUCKETS, inc, observe, span
 
 
-async def llm_generate(prompt: str) -> str:
+async def llm_generate(prompt: str, purpose: str = "generic") -> str:
     if not LLM_API_KEY:
         raise RuntimeError("LLM_API_KEY 未設定")
 
@@ -17,11 +20,27 @@ async def llm_generate(prompt: str) -> str:
         "Authorization": f"Bearer {LLM_API_KEY}",
         "Content-Type": "application/json",
     }
-    async with httpx.AsyncClient(timeout=300) as http:
-        resp = await http.post(url, json=payload, headers=headers)
-        resp.raise_for_status()
+    with span("llm.generate", model=payload["model"], purpose=purpose, prompt_chars=len(prompt)) as s:
+        http = http_client()
+
+        async def attempt(timeout: float) -> httpx.Response:
+            resp = await http.post(url, json=payload, headers=headers, timeout=timeout)
+            resp.raise_for_status()
+            return resp
+
+        # 斷路器開啟時直接丟 CircuitOpenError，呼叫端的 except 會改走規則式解析等降級路徑
+        resp = await LLM.call(attempt)
         data = resp.json()
-        return data.get("response", "") or data.get("text", "")
+        text = data.get("response", "") or data.get("text", "")
+        # Ollama 會回傳實際 token 數；其他 gateway 沒有時用估計值。
+        prompt_tokens = data.get("prompt_eval_count") or estimate_tokens(prompt)
+        response_tokens = data.get("eval_count") or estimate_tokens(text)
+        s.set(response_chars=len(text), prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+        inc("llm_prompt_chars_total", len(prompt), purpose=purpose)
+        inc("llm_response_chars_total", len(text), purpose=purpose)
+        observe("llm_prompt_tokens", prompt_tokens, buckets=TOKEN_BUCKETS, purpose=purpose)
+        observe("llm_response_tokens", response_tokens, buckets=TOKEN_BUCKETS, purpose=purpose)
+        return text
 
 
 async def llm_route_intent(user_text: str) -> str:
@@ -33,7 +52,7 @@ async def llm_route_intent(user_text: str) -> str:
         f"使用者：{user_text}"
     )
     try:
-        label = (await llm_generate(prompt)).strip().lower()
+        label = (await llm_generate(prompt, purpose="route")).strip().lower()
     except Exception:
         return ""
 
@@ -0,0 +1,161 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from config import LOOP_BLOCK_THRESHOLD_MS, LOOP_MONITOR, LOOP_MONITOR_INTERVAL_MS
+from telemetry import describe, inc, observe, set_gauge
+
+# ====== event loop 健康監控 =====
+# - 心跳 task：每 LOOP_MONITOR_INTERVAL_MS 醒來一次，實際睡的時間減掉預期就是 loop lag（event_loop_lag_seconds）。
+# - 看門狗 thread：心跳超過 LOOP_BLOCK_THRESHOLD_MS 沒更新，代表 loop 正被某段同步程式卡住；
+#   這時抓 loop thread 當下的 stack（sys._current_frames），依卡住的位置彙整次數與最長時間，記 log 與 metrics。
+#   同一個位置只有第一次印完整 stack，之後只印一行。
+# - LOOP_MONITOR=debug 另外開 asyncio debug 模式，asyncio 會直接點名超過門檻的 callback / task（額外開銷較大）。
+# - LOOP_MONITOR=off 關閉。
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STACK_LIMIT = 12
+_LIB_PREFIXES = (sys.prefix, sys.base_prefix)
+
+
+class Stall:
+    __slots__ = ("site", "stack", "count", "max_seconds", "total_seconds")
+
+    def __init__(self, site: str, stack: str):
+        self.site = site
+        self.stack = stack
+        self.count = 0
+        self.max_seconds = 0.0
+        self.total_seconds = 0.0
+
+
+def _site(frame) -> str:
+    """卡住位置：最內層、不在標準函式庫 / site-packages 裡的 frame（找不到就用最內層）"""
+    innermost = None
+    f = frame
+    while f is not None:
+        filename = f.f_code.co_filename
+        if innermost is None:
+            innermost = f
+        if "site-packages" not in filename and not filename.startswith(_LIB_PREFIXES) and "<frozen" not in filename:
+            return f"{filename}:{f.f_lineno} in {f.f_code.co_name}"
+        f = f.f_back
+    if innermost is None:
+        return "unknown"
+    return f"{innermost.f_code.co_filename}:{innermost.f_lineno} in {innermost.f_code.co_name}"
+
+
+class LoopMonitor:
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: dict[str, Stall] = {}
+        self._heartbeat = time.monotonic()
+        self._thread_id: Optional[int] = None
+        self._current: Optional[Stall] = None
+        self._current_seconds = 0.0
+        self._stop = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    def start(self, debug: bool = False) -> None:
+        loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        if debug:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+        self._task = asyncio.create_task(self._beat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _beat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self._heartbeat = time.monotonic()
+            observe("event_loop_lag_seconds", lag, buckets=LAG_BUCKETS)
+            set_gauge("event_loop_lag_last_seconds", lag)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.threshold / 2):
+            if self._task is not None and self._task.done():
+                # loop 已經結束（asyncio.run 返回），心跳停了不算卡住
+                return
+            blocked = time.monotonic() - self._heartbeat - self.interval
+            if blocked < self.threshold:
+                self._finish_stall()
+                continue
+            if self._current is not None:
+                # 同一次卡住，更新持續時間就好
+                self._current_seconds = blocked
+                self._current.max_seconds = max(self._current.max_seconds, blocked)
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            site = _site(frame)
+            with self._lock:
+                stall = self.stalls.get(site)
+                first = stall is None
+                if first:
+                    stall = Stall(site, "".join(traceback.format_stack(frame, limit=STACK_LIMIT)))
+                    self.stalls[site] = stall
+                stall.count += 1
+                stall.max_seconds = max(stall.max_seconds, blocked)
+            self._current = stall
+            self._current_seconds = blocked
+            inc("event_loop_blocked_total", site=site)
+            if first:
+                print(f"event loop blocked > {self.threshold * 1000:.0f}ms at {site}\n{stall.stack}", end="")
+            else:
+                print(f"event loop blocked > {self.threshold * 1000:.0f}ms at {site} (#{stall.count})")
+
+    def _finish_stall(self) -> None:
+        stall = self._current
+        if stall is None:
+            return
+        self._current = None
+        # 最後一次看到還卡著時量到的時間（誤差在 threshold / 2 以內）
+        seconds = self._current_seconds
+        stall.total_seconds += seconds
+        observe("event_loop_stall_seconds", seconds, buckets=LAG_BUCKETS)
+
+    def report(self, top: int = 10) -> str:
+        with self._lock:
+            stalls = sorted(self.stalls.values(), key=lambda s: -s.total_seconds)[:top]
+        if not stalls:
+            return f"no event loop stalls over {self.threshold * 1000:.0f}ms"
+        lines = [f"event loop stalls over {self.threshold * 1000:.0f}ms (by total time):"]
+        for s in stalls:
+            lines.append(f"  {s.count:>4}×  max {s.max_seconds * 1000:>7.0f}ms  {s.site}")
+        return "\n".join(lines)
+
+
+_monitor: Optional[LoopMonitor] = None
+
+
+def start_loop_monitor(mode: str = LOOP_MONITOR) -> Optional[LoopMonitor]:
+    """在 event loop 裡呼叫；mode 是 off / on / debug"""
+    global _monitor
+    mode = (mode or "off").lower()
+    if mode in ("off", "0", "false", "no") or _monitor is not None:
+        return _monitor
+    _monitor = LoopMonitor(LOOP_MONITOR_INTERVAL_MS / 1000, LOOP_BLOCK_THRESHOLD_MS / 1000)
+    _monitor.start(debug=mode == "debug")
+    return _monitor
+
+
+describe("event_loop_lag_seconds", "Extra delay of the loop monitor heartbeat over its sleep interval.")
+describe("event_loop_lag_last_seconds", "Most recent event loop lag sample.")
+describe("event_loop_blocked_total", "Times the event loop was blocked past the threshold, by blocking site.")
+describe("event_loop_stall_seconds", "Duration of event loop stalls past the threshold.")
@@ -0,0 +1,56 @@
+from collections import deque
+from typing import Hashable, Iterable
+
+
+class KeywordMatcher:
+    """
+    Aho–Corasick 多關鍵字比對器：建好一次後，一趟掃描就找出文字中出現的所有關鍵字（含重疊，
+    例如「自行車」同時命中「行車」）。每個關鍵字可綁定多個 tag，掃描回傳命中的 tag 集合。
+    """
+
+    def __init__(self, keywords: Iterable[tuple[str, Hashable]]):
+        goto: list[dict[str, int]] = [{}]
+        outputs: list[set] = [set()]
+        for word, tag in keywords:
+            if not word:
+                continue
+            node = 0
+            for ch in word:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    outputs.append(set())
+                node = nxt
+            outputs[node].add(tag)
+
+        # BFS 建 fail link，並把 fail 鏈上的轉移/輸出攤平，掃描時不必回溯。
+        delta: list[dict[str, int]] = [dict() for _ in goto]
+        delta[0] = dict(goto[0])
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            outputs[node] |= outputs[fail[node]]
+            trans = dict(delta[fail[node]])
+            trans.update(goto[node])
+            delta[node] = trans
+            for ch, child in goto[node].items():
+                fail[child] = delta[fail[node]].get(ch, 0) if node else 0
+                queue.append(child)
+
+        self._delta = delta
+        self._outputs = [frozenset(o) for o in outputs]
+
+    def scan(self, text: str) -> frozenset:
+        delta = self._delta
+        outputs = self._outputs
+        node = 0
+        hits: set = set()
+        for ch in text:
+            node = delta[node].get(ch, 0)
+            out = outputs[node]
+            if out:
+                hits |= out
+        return frozenset(hits)
@@ -0,0 +1,172 @@
+import random
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from config import WISHLIST_DEDUP_THRESHOLD
+from text_utils import CITY_MAPPING, FOOD_LOCATION_KEYWORDS, STATION_CITY_KEYWORDS
+
+# ====== 店名正規化與近似重複索引 =====
+# - normalize_name：NFKC（全形 → 半形）、不分大小寫、拿掉括號內容（（台南）、【外帶】）與分店後綴，
+#   再去掉標點、符號、空白。正規化後一樣就算同一家。
+#   分店後綴只認「地名 / 總、本 + 店」（「鼎泰豐 台南店」、「鼎泰豐信義店」、「阿宗麵線總店」），
+#   或隔開的「… 分店 / 門市 / 分館」；「老街咖啡店」、「老街麵包店」的「咖啡」「麵包」不是地名，不會被拿掉。
+# - 正規化後不一樣的，只抓幾乎一樣的寫法（錯字、多一個字）：字元 bigram 的 Jaccard ≥ WISHLIST_DEDUP_THRESHOLD（0.9）、
+#   長度差不到一成，而且數字要一樣、結尾的食物字（麵 / 湯 / 飯…）要一樣——「阿明牛肉麵」跟「阿明牛肉湯」、
+#   「2 號店」跟「1 號店」是不同的店。分店、地名的差別由上面的正規化處理，不靠相似度。
+# - 不逐一比對整份清單：每個名字算 16 個 MinHash，分成 8 段（每段 2 個）當 LSH bucket，
+#   只跟至少一段相同的名字算 Jaccard。查詢成本跟清單長度無關。
+
+NGRAM = 2
+NUM_PERM = 16
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 64) - 1
+# 固定種子：同一個行程裡所有索引的 MinHash 可以互相比較
+_perm_rng = random.Random(0x5EED)
+_PERMS = [(_perm_rng.randrange(1, _PRIME), _perm_rng.randrange(_PRIME)) for _ in range(NUM_PERM)]
+
+BRACKETED = re.compile(r"[(\[{【〔「『<].*?[)\]}】〕」』>]")
+BRANCH_KIND = re.compile(r"(?:分店|分館|門市|店)$")
+BRANCH_SEPARATOR = re.compile(r"[\s\-–—_|/·・]+")
+MAX_BRANCH_LEN = 6
+MIN_LENGTH_RATIO = 0.9
+DIGITS = re.compile(r"\d+")
+# 結尾是這些字時代表賣的東西，不一樣就不是同一家
+FOOD_TAILS = frozenset("麵湯飯粥餅包餃粉鍋羹捲丼堡雞鴨魚肉排茶酒冰粿糕")
+# 常見的分店地名（城市、行政區、商圈）與「總店 / 本店 / 旗艦店」
+BRANCH_PLACES = frozenset(
+    [*CITY_MAPPING]
+    + [name for names, _ in STATION_CITY_KEYWORDS for name in names]
+    + [name for names, _ in FOOD_LOCATION_KEYWORDS for name in names]
+    + [
+        "總", "本", "旗艦", "東區", "西區", "南區", "北區", "中西", "安平", "安南", "永康", "仁德", "歸仁",
+        "新營", "公館", "西門", "忠孝", "站前", "車站", "天母", "民生", "南西", "逢甲", "一中", "巨蛋", "左營",
+        "鳳山", "竹北", "光復", "府前", "育樂", "勝利", "大學",
+    ]
+)
+
+
+def _is_branch_place(token: str) -> bool:
+    return token in BRANCH_PLACES or token.rstrip("區市縣站") in BRANCH_PLACES
+
+
+def _strip_branch(text: str) -> str:
+    m = BRANCH_KIND.search(text)
+    if m is None:
+        return text
+    head = text[:m.start()]
+    parts = BRANCH_SEPARATOR.split(head)
+    if len(parts) > 1 and parts[-1] and len(parts[-1]) <= MAX_BRANCH_LEN:
+        # 有隔開：明講分店 / 門市 / 分館，或店前面是地名
+        if m.group() != "店" or _is_branch_place(parts[-1]):
+            return head[:len(head) - len(parts[-1])].rstrip(" -–—_|/·・")
+        return text
+    # 沒隔開：只拿掉結尾的已知地名，前面至少留兩個字
+    for size in range(1, min(MAX_BRANCH_LEN, len(head) - 2) + 1):
+        if _is_branch_place(head[-size:]):
+            return head[:-size]
+    return text
+
+
+def normalize_name(name: str) -> str:
+    text = unicodedata.normalize("NFKC", name).casefold()
+    text = BRACKETED.sub(" ", text).strip()
+    text = _strip_branch(text)
+    key = "".join(ch for ch in text if unicodedata.category(ch)[0] not in "PSZC")
+    # 整個名字都是符號 / emoji：至少還能比對完全一樣的
+    return key or name.strip()
+
+
+def _comparable(a: str, b: str) -> bool:
+    """兩個正規化後的 key 能不能算近似：數字、結尾食物字一樣，長度差不多"""
+    if DIGITS.findall(a) != DIGITS.findall(b):
+        return False
+    if a[-1] != b[-1] and (a[-1] in FOOD_TAILS or b[-1] in FOOD_TAILS):
+        return False
+    return min(len(a), len(b)) / max(len(a), len(b)) >= MIN_LENGTH_RATIO
+
+
+def shingles(key: str) -> frozenset[str]:
+    if len(key) <= NGRAM:
+        return frozenset((key,))
+    return frozenset(key[i:i + NGRAM] for i in range(len(key) - NGRAM + 1))
+
+
+def minhash(grams: frozenset[str]) -> tuple[int, ...]:
+    hashes = [hash(g) & _MASK for g in grams]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS)
+
+
+def jaccard(a: frozenset[str], b: frozenset[str]) -> float:
+    return len(a & b) / len(a | b)
+
+
+class NameIndex:
+    """一份清單的正規化 / 近似重複索引；find 與 add 的成本跟清單長度無關"""
+
+    def __init__(self, names: Iterable[str] = (), threshold: float = WISHLIST_DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self.keys: dict[str, str] = {}
+        self.norm: dict[str, str] = {}
+        self.grams: dict[str, frozenset[str]] = {}
+        self.buckets: defaultdict[tuple, list[str]] = defaultdict(list)
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def _bands(grams: frozenset[str]) -> list[tuple]:
+        sig = minhash(grams)
+        return [(band, sig[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    def find(self, name: str) -> Optional[str]:
+        """清單裡跟 name 算同一家的項目（沒有就 None）"""
+        key = normalize_name(name)
+        same = self.keys.get(key)
+        if same is not None or self.threshold <= 0:
+            return same
+        grams = shingles(key)
+        best, best_sim = None, self.threshold
+        seen = set()
+        for band in self._bands(grams):
+            for other in self.buckets.get(band, ()):
+                if other in seen:
+                    continue
+                seen.add(other)
+                if not _comparable(key, self.norm[other]):
+                    continue
+                sim = jaccard(grams, self.grams[other])
+                if sim >= best_sim:
+                    best, best_sim = other, sim
+        return best
+
+    def add(self, name: str) -> None:
+        key = normalize_name(name)
+        if key in self.keys:
+            return
+        self.keys[key] = name
+        self.norm[name] = key
+        grams = self.grams[name] = shingles(key)
+        if self.threshold > 0:
+            for band in self._bands(grams):
+                self.buckets[band].append(name)
+
+
+def compact(names: list[str], threshold: float = WISHLIST_DEDUP_THRESHOLD) -> tuple[list[str], list[tuple[str, str]], NameIndex]:
+    """依序保留第一次出現的項目；回傳（保留的清單, [(刪掉的, 對應保留的)], 保留清單的索引）"""
+    index = NameIndex(threshold=threshold)
+    kept: list[str] = []
+    merged: list[tuple[str, str]] = []
+    for name in names:
+        dup = index.find(name)
+        if dup is None:
+            index.add(name)
+            kept.append(name)
+        else:
+            merged.append((name, dup))
+    return kept, merged, index
@@ -1,8 +1,9 @@
 from typing import Optional
-import httpx
 
-from config import LLM_API_KEY, USDA_API_KEY
+from config import LLM_API_KEY, USDA_API_KEY, USDA_BASE_URL
 from llm_client import llm_generate
+from resilience import USDA, http_client
+from telemetry import span
 
 
 def _convert_unit(qty: float, unit: str, target_unit: str) -> tuple[float, str]:
@@ -80,20 +81,21 @@ async def usda_food_nutrition(query: str) -> str:
         "query": query,
         "pageSize": 1,
     }
-    async with httpx.AsyncClient(timeout=20) as http:
-        search = await http.get("https://api.nal.usda.gov/fdc/v1/foods/search", params=params)
-        search.raise_for_status()
+    http = http_client()
+    with span("usda.search"):
+        search = await USDA.get(http, f"{USDA_BASE_URL.rstrip('/')}/fdc/v1/foods/search", params=params)
         sdata = search.json()
-        foods = sdata.get("foods", []) or []
-        if not foods:
-            return "（查無結果，請換更明確的食物名稱）"
-        fdc_id = foods[0].get("fdcId")
-        desc = foods[0].get("description") or query
-        detail = await http.get(
-            f"https://api.nal.usda.gov/fdc/v1/food/{fdc_id}",
+    foods = sdata.get("foods", []) or []
+    if not foods:
+        return "（查無結果，請換更明確的食物名稱）"
+    fdc_id = foods[0].get("fdcId")
+    desc = foods[0].get("description") or query
+    with span("usda.food", fdc_id=fdc_id):
+        detail = await USDA.get(
+            http,
+            f"{USDA_BASE_URL.rstrip('/')}/fdc/v1/food/{fdc_id}",
             params={"api_key": USDA_API_KEY},
         )
-        detail.raise_for_status()
         ddata = detail.json()
 
     nutrients = ddata.get("foodNutrients", []) or []
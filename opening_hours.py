@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from text_utils import MEAL_WINDOWS
+
+# ====== Google Places opening_hours.periods 解析 =====
+# periods 的 day 是 0=星期日…6=星期六、time 是 "HHMM"；這裡一律換成「一週中的第幾分鐘」的區間，
+# 跨週的區間（星期六開到星期日凌晨）結束值會超過一週，查詢時再把區間前後平移一週比對。
+
+WEEK_MINUTES = 7 * 24 * 60
+MIN_OPEN_MINUTES = 30
+CACHE_SIZE = 4096
+CACHE_TTL_SECONDS = 24 * 3600
+
+Schedule = tuple[tuple[int, int], ...]
+ALWAYS_OPEN: Schedule = ((0, WEEK_MINUTES),)
+_SHIFTS = (-WEEK_MINUTES, 0, WEEK_MINUTES)
+
+_cache: "OrderedDict[str, tuple[float, Optional[Schedule]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _week_minute(point: dict) -> int:
+    t = str(point.get("time", "0000")).zfill(4)
+    return int(point.get("day", 0)) * 1440 + int(t[:2]) * 60 + int(t[2:])
+
+
+def parse_periods(periods: Optional[list]) -> Optional[Schedule]:
+    """沒有資料回 None（視為未知，不過濾）；只有 open 沒有 close 的單一 period 代表 24 小時營業"""
+    if not periods:
+        return None
+    if len(periods) == 1 and not periods[0].get("close"):
+        return ALWAYS_OPEN
+    intervals = []
+    for period in periods:
+        start_point, end_point = period.get("open"), period.get("close")
+        if not start_point or not end_point:
+            continue
+        try:
+            start, end = _week_minute(start_point), _week_minute(end_point)
+        except (TypeError, ValueError):
+            continue
+        if end <= start:
+            end += WEEK_MINUTES
+        intervals.append((start, end))
+    return tuple(sorted(intervals)) if intervals else None
+
+
+def schedule_for(place_id: str, periods: Optional[list]) -> Optional[Schedule]:
+    """依 place_id 快取解析結果（營業時間很少變，過期才重新解析）"""
+    now = time.monotonic()
+    if place_id:
+        with _cache_lock:
+            cached = _cache.get(place_id)
+            if cached is not None and now - cached[0] < CACHE_TTL_SECONDS:
+                _cache.move_to_end(place_id)
+                return cached[1]
+    schedule = parse_periods(periods)
+    if place_id:
+        with _cache_lock:
+            _cache[place_id] = (now, schedule)
+            if len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return schedule
+
+
+def _minute_of_week(dt: datetime) -> int:
+    # datetime.weekday()：0=星期一；Google：0=星期日
+    return ((dt.weekday() + 1) % 7) * 1440 + dt.hour * 60 + dt.minute
+
+
+def open_minutes(schedule: Schedule, start: datetime, end: datetime) -> int:
+    """[start, end) 之間有幾分鐘在營業（區間需小於一週）"""
+    s = _minute_of_week(start)
+    e = s + int((end - start).total_seconds() // 60)
+    total = 0
+    for shift in _SHIFTS:
+        for a, b in schedule:
+            total += max(0, min(b + shift, e) - max(a + shift, s))
+    return total
+
+
+def is_open_between(schedule: Optional[Schedule], start: datetime, end: datetime) -> bool:
+    """時段內至少營業 MIN_OPEN_MINUTES（時段較短就要整段都開）；營業時間未知視為可以"""
+    if schedule is None:
+        return True
+    need = min(MIN_OPEN_MINUTES, int((end - start).total_seconds() // 60))
+    return open_minutes(schedule, start, end) >= max(1, need)
+
+
+def open_status(schedule: Optional[Schedule], at: datetime) -> str:
+    """給使用者看的一句話：「營業中，21:00 打烊」/「17:00 開門」"""
+    if schedule is None:
+        return ""
+    if schedule == ALWAYS_OPEN:
+        return "24 小時營業"
+    m = _minute_of_week(at)
+    for shift in _SHIFTS:
+        for a, b in schedule:
+            if a + shift <= m < b + shift:
+                return f"營業中，{(at + timedelta(minutes=b + shift - m)):%H:%M} 打烊"
+    upcoming = [a + shift - m for shift in (0, WEEK_MINUTES) for a, _ in schedule if a + shift > m]
+    if not upcoming:
+        return "已打烊"
+    opens_at = at + timedelta(minutes=min(upcoming))
+    if opens_at.date() == at.date():
+        return f"目前未營業，{opens_at:%H:%M} 開門"
+    return "今日已打烊"
+
+
+def hours_today(weekday_text: list, at: datetime) -> str:
+    """weekday_text 從星期一排起，取當天那一行"""
+    if not weekday_text:
+        return ""
+    if len(weekday_text) == 7:
+        return weekday_text[at.weekday()]
+    return weekday_text[0]
+
+
+def meal_window(meal: str, now: datetime) -> tuple[datetime, datetime]:
+    """餐別對應的下一個時段；正在這個時段就從現在算起"""
+    start_h, end_h = MEAL_WINDOWS.get(meal, (now.hour, now.hour + 1))
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if now.hour < 5 and start_h >= 21:
+        day -= timedelta(days=1)  # 凌晨的宵夜屬於前一天的時段
+    start = day + timedelta(hours=start_h)
+    end = day + timedelta(hours=end_h)
+    if end <= now:
+        start += timedelta(days=1)
+        end += timedelta(days=1)
+    return max(start, now), end
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from config import (
+    PLACE_INDEX_ENABLED,
+    PLACE_INDEX_KEYWORDS,
+    PLACE_INDEX_LOCATIONS,
+    PLACE_INDEX_MIN_RESULTS,
+    PLACE_INDEX_PATH,
+    PLACE_INDEX_REFRESH_MINUTES,
+)
+from dish_lexicon import get_extractor as get_dish_extractor
+from opening_hours import is_open_between, schedule_for
+from telemetry import inc, span
+from text_utils import MEAL_KEYWORDS
+
+# ====== 熱門地點的本機餐廳索引 =====
+# 背景定期爬熱門地點（預設成大）附近的餐廳，存下評分、評論數、必點菜、座標與預先算好的步行時間，
+# 再建「關鍵字 → place_id」反向索引。search_places 先查這裡，沒命中才打 Google。
+
+INDEX_MODES = ("walking",)
+LOCATION_ALIASES = {
+    "成大": "國立成功大學",
+    "成功大學": "國立成功大學",
+    "ncku": "國立成功大學",
+}
+# 搜尋詞裡不算關鍵字的字（run_food_agent 會在前面加餐別）
+_QUERY_STOPWORDS = {w for words in MEAL_KEYWORDS.values() for w in words} | set(MEAL_KEYWORDS) | {"餐廳", "美食", "附近"}
+
+
+def canonical_location(label: str) -> str:
+    label = (label or "").strip()
+    return LOCATION_ALIASES.get(label.lower(), label)
+
+
+def query_terms(keyword: str) -> list[str]:
+    """搜尋詞切成索引用的關鍵字（去掉餐別、「餐廳」這類泛用詞）"""
+    terms: list[str] = []
+    for token in (keyword or "").split():
+        if token in _QUERY_STOPWORDS:
+            continue
+        terms.append(token)
+    return terms
+
+
+def _place_score(record: dict) -> float:
+    # 評論少的高分店打折，避免 5.0（3 則評論）排第一
+    reviews = record.get("reviews") or 0
+    return (record.get("rating") or 0) * reviews / (reviews + 50)
+
+
+class PlaceIndex:
+    def __init__(self, path: str = PLACE_INDEX_PATH):
+        self.path = path
+        # location label -> {"origin", "crawled_at", "places": {place_id: record}, "terms": {term: [place_id]}}
+        self.locations: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        with self._lock:
+            self.locations = data.get("locations", {})
+
+    def save(self) -> None:
+        with self._lock:
+            data = {"locations": self.locations}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    # ------------------------------------------------------------
+    # 建索引（同步，跑在 to_thread 裡）
+    # ------------------------------------------------------------
+    def crawl(self, tools, location: str, keywords: list[str], radius: int = 2000) -> int:
+        location = canonical_location(location)
+        with span("place_index.crawl", location=location, keywords=len(keywords)) as s:
+            origin = tools._geocode(location)
+            found: dict[str, dict] = {}
+            for kw in keywords:
+                params = {
+                    "query": f"{kw} 餐廳",
+                    "location": origin,
+                    "radius": radius,
+                    "key": tools.GOOGLE_API_KEY,
+                    "language": "zh-TW",
+                }
+                data = tools._get("places_search", tools.PLACES_TEXT_SEARCH_URL, params)
+                for item in data.get("results", []):
+                    pid = item.get("place_id")
+                    if not pid:
+                        continue
+                    entry = found.setdefault(pid, {"item": item, "keywords": set()})
+                    entry["keywords"].add(kw)
+
+            place_ids = list(found)
+            dests = [
+                f"{found[pid]['item']['geometry']['location']['lat']},{found[pid]['item']['geometry']['location']['lng']}"
+                for pid in place_ids
+            ]
+            travel = {mode: tools._distance_minutes_many(origin, dests, mode) for mode in INDEX_MODES}
+
+            extractor = get_dish_extractor()
+            places: dict[str, dict] = {}
+            terms: dict[str, set] = {}
+            for i, pid in enumerate(place_ids):
+                details = tools._place_details(pid)
+                if not details:
+                    continue
+                record = tools._place_record(pid, found[pid]["item"], details, travel[INDEX_MODES[0]][i])
+                record["travel_times"] = {mode: travel[mode][i] for mode in INDEX_MODES}
+                places[pid] = record
+
+                place_terms = set(found[pid]["keywords"]) | set(record["recommended_items"])
+                place_terms.update(extractor.mentions(record["name"] or ""))
+                for rev in details.get("reviews", []) or []:
+                    place_terms.update(extractor.mentions(rev.get("text", "") or ""))
+                for term in place_terms:
+                    terms.setdefault(term, set()).add(pid)
+
+            with self._lock:
+                self.locations[location] = {
+                    "origin": origin,
+                    "crawled_at": time.time(),
+                    "places": places,
+                    "terms": {t: sorted(p) for t, p in terms.items()},
+                }
+            s.set(places=len(places), terms=len(terms))
+        self.save()
+        return len(places)
+
+    # ------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------
+    def _match(self, entry: dict, keyword: str) -> Optional[set]:
+        terms = entry["terms"]
+        extractor = get_dish_extractor()
+        matched: Optional[set] = None
+        for term in query_terms(keyword):
+            hits = set(terms.get(term, ()))
+            if not hits:
+                # 沒有完全一樣的詞，就用詞裡的菜名（「豚骨拉麵」→「拉麵」也算）
+                for dish in extractor.mentions(term):
+                    hits.update(terms.get(dish, ()))
+            if not hits:
+                return None
+            matched = hits if matched is None else matched & hits
+        if matched is None:
+            # 只有餐別之類的泛用詞：整區都算
+            return set(entry["places"])
+        return matched
+
+    def lookup(
+        self,
+        keyword: str,
+        location: str,
+        max_travel_time: int,
+        min_rating: float,
+        min_reviews: int,
+        travel_mode: str,
+        limit: int = 5,
+        open_between: Optional[tuple[datetime, datetime]] = None,
+    ) -> Optional[list[dict]]:
+        """命中回傳與 search_places 相同格式的結果；沒索引、過期或結果太少時回 None（改走即時搜尋）"""
+        location = canonical_location(location)
+        with self._lock:
+            entry = self.locations.get(location)
+        result = "miss"
+        try:
+            if entry is None or travel_mode not in INDEX_MODES:
+                return None
+            if time.time() - entry.get("crawled_at", 0) > PLACE_INDEX_REFRESH_MINUTES * 60 * 2:
+                result = "stale"
+                return None
+            matched = self._match(entry, keyword)
+            if not matched:
+                return None
+            picked = []
+            for pid in matched:
+                record = entry["places"].get(pid)
+                if record is None:
+                    continue
+                travel_time = record["travel_times"].get(travel_mode, 999)
+                if record["rating"] < min_rating or record["reviews"] < min_reviews or travel_time > max_travel_time:
+                    continue
+                if open_between and not is_open_between(schedule_for(pid, record.get("opening_periods")), *open_between):
+                    continue
+                picked.append(dict(record, travel_time_min=travel_time))
+            if len(picked) < min(PLACE_INDEX_MIN_RESULTS, limit):
+                return None
+            # 店名或必點菜就有關鍵字的排前面，其次看評分（依評論數打折）
+            wanted = query_terms(keyword)
+            picked.sort(key=lambda r: (
+                -sum(1 for t in wanted if t in (r["name"] or "") or t in r["recommended_items"]),
+                -_place_score(r),
+                r["travel_time_min"],
+                r["place_id"],
+            ))
+            result = "hit"
+            return picked[:limit]
+        finally:
+            inc("place_index_lookups_total", result=result)
+
+
+async def run_indexer(tools, index: PlaceIndex, locations: list[str], keywords: list[str], interval_minutes: float) -> None:
+    """背景重建索引；啟動時若檔案裡的資料還新就先不爬"""
+    while True:
+        for location in locations:
+            entry = index.locations.get(canonical_location(location))
+            age = time.time() - entry["crawled_at"] if entry else math.inf
+            if age < interval_minutes * 60:
+                continue
+            try:
+                count = await asyncio.to_thread(index.crawl, tools, location, keywords)
+                print(f"place index: {location} 已更新 {count} 家")
+            except Exception as e:
+                print(f"place index crawl failed for {location}: {e}")
+        await asyncio.sleep(max(60.0, interval_minutes * 60 / 4))
+
+
+def start_indexer(tools) -> Optional[asyncio.Task]:
+    """載入既有索引、掛到 Tools 上並啟動背景爬蟲（PLACE_INDEX_ENABLED 關閉時什麼都不做）"""
+    if not PLACE_INDEX_ENABLED:
+        return None
+    index = PlaceIndex(PLACE_INDEX_PATH)
+    index.load()
+    tools.place_index = index
+    return asyncio.create_task(
+        run_indexer(tools, index, PLACE_INDEX_LOCATIONS, PLACE_INDEX_KEYWORDS, PLACE_INDEX_REFRESH_MINUTES)
+    )
@@ -0,0 +1,214 @@
+import asyncio
+import contextlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+from zoneinfo import ZoneInfo
+
+from config import (
+    PREWARM_ENABLED,
+    PREWARM_HISTORY_PATH,
+    PREWARM_LEAD_MINUTES,
+    PREWARM_LOCATIONS,
+    PREWARM_MEALS,
+    PREWARM_MIN_INTERVAL_SECONDS,
+    PREWARM_TOP_KEYWORDS,
+)
+from place_index import canonical_location
+from telemetry import inc, span
+from text_utils import MEAL_WINDOWS
+
+# ====== 餐期尖峰前的快取預熱 =====
+# 流量集中在午餐（10:30）、晚餐（17:00）開始那段。尖峰前 PREWARM_LEAD_MINUTES 分鐘，
+# 背景依序預查熱門地點的天氣與座標，以及各伺服器最常搜的關鍵字（Text Search + Place Details），
+# 讓尖峰第一個請求就打到熱的 Tools / 天氣快取。
+# 預熱一次只跑一個上游呼叫、呼叫之間至少間隔 PREWARM_MIN_INTERVAL_SECONDS，有真實請求在跑時先讓路。
+
+TAIPEI = ZoneInfo("Asia/Taipei")
+SAVE_EVERY = 20
+MAX_KEYS_PER_GUILD = 200
+# 有真實請求在跑時，預熱最多等這麼久就照樣繼續（避免長時間忙碌時整輪預熱被餓死）
+MAX_YIELD_SECONDS = 30.0
+
+
+class QueryHistory:
+    """各伺服器的 (關鍵字, 地點, 交通方式) 次數；只記解析後的餐點，不記原文"""
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._counts: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        with self._lock:
+            self._counts = {str(g): {str(k): int(v) for k, v in kws.items()} for g, kws in data.items()}
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = {g: dict(kws) for g, kws in self._counts.items()}
+            self._unsaved = 0
+        tmp = self.path + ".tmp"
+        with self._save_lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+    def _save_quietly(self) -> None:
+        try:
+            self.save()
+        except OSError:
+            pass
+
+    def record(self, guild_id: Optional[int], keyword: str, location: str, travel_mode: str) -> None:
+        keyword = " ".join((keyword or "").split())
+        if guild_id is None or not keyword or not location:
+            return
+        key = "\t".join((keyword, canonical_location(location), travel_mode))
+        with self._lock:
+            counts = self._counts.setdefault(str(guild_id), {})
+            counts[key] = counts.get(key, 0) + 1
+            if len(counts) > MAX_KEYS_PER_GUILD:
+                # 丟掉次數最少的一半，留給新出現的關鍵字空間
+                keep = sorted(counts.items(), key=lambda kv: -kv[1])[: MAX_KEYS_PER_GUILD // 2]
+                self._counts[str(guild_id)] = dict(keep)
+            self._unsaved += 1
+            should_save = self._unsaved >= SAVE_EVERY
+        if should_save:
+            # record 在 event loop 上被呼叫，寫檔丟到 thread pool，不要卡住 loop
+            try:
+                asyncio.get_running_loop().run_in_executor(None, self._save_quietly)
+            except RuntimeError:
+                self._save_quietly()
+
+    def top(self, per_guild: int) -> list[tuple[str, str, str]]:
+        """各伺服器前 per_guild 名合併去重，依總次數排序"""
+        totals: dict[tuple[str, str, str], int] = {}
+        with self._lock:
+            for counts in self._counts.values():
+                for key, n in sorted(counts.items(), key=lambda kv: -kv[1])[:per_guild]:
+                    keyword, location, mode = key.split("\t")
+                    totals[(keyword, location, mode)] = totals.get((keyword, location, mode), 0) + n
+        return sorted(totals, key=lambda k: -totals[k])
+
+
+history = QueryHistory(PREWARM_HISTORY_PATH)
+_live_requests = 0
+
+
+@contextlib.contextmanager
+def live_request():
+    """包住真實的 /eat 請求；預熱看到有請求在跑就先暫停"""
+    global _live_requests
+    _live_requests += 1
+    try:
+        yield
+    finally:
+        _live_requests -= 1
+
+
+def record_query(guild_id: Optional[int], keyword: str, location: str, travel_mode: str) -> None:
+    history.record(guild_id, keyword, location, travel_mode)
+
+
+def next_peak(now: datetime, meals: list[str], lead_minutes: float) -> tuple[str, datetime]:
+    """下一個要預熱的時間點（餐期開始前 lead_minutes 分鐘）與對應餐別"""
+    candidates = []
+    for meal in meals:
+        if meal not in MEAL_WINDOWS:
+            continue
+        start_h = MEAL_WINDOWS[meal][0]
+        day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        at = day + timedelta(hours=start_h) - timedelta(minutes=lead_minutes)
+        if at <= now:
+            at += timedelta(days=1)
+        candidates.append((at, meal))
+    if not candidates:
+        raise ValueError("PREWARM_MEALS 沒有可用的餐別")
+    at, meal = min(candidates)
+    return meal, at
+
+
+class Prewarmer:
+    def __init__(
+        self,
+        tools,
+        warm_weather: Callable[[str], Awaitable[Optional[dict]]],
+        min_interval: float = PREWARM_MIN_INTERVAL_SECONDS,
+    ):
+        self.tools = tools
+        self.warm_weather = warm_weather
+        self.min_interval = min_interval
+
+    async def _yield_to_live_traffic(self) -> None:
+        waited = 0.0
+        while _live_requests > 0 and waited < MAX_YIELD_SECONDS:
+            await asyncio.sleep(0.5)
+            waited += 0.5
+        await asyncio.sleep(self.min_interval)
+
+    async def _step(self, kind: str, func, *args) -> None:
+        await self._yield_to_live_traffic()
+        try:
+            result = func(*args)
+            if asyncio.iscoroutine(result):
+                await result
+            inc("prewarm_tasks_total", kind=kind, result="ok")
+        except Exception as e:
+            inc("prewarm_tasks_total", kind=kind, result="error")
+            print(f"prewarm {kind} failed: {e}")
+
+    async def warm(self, meal: str, locations: list[str], per_guild: int) -> None:
+        keywords = history.top(per_guild)
+        hot_locations = list(dict.fromkeys([canonical_location(l) for l in locations] + [k[1] for k in keywords]))
+        with span("prewarm.run", meal=meal, locations=len(hot_locations), keywords=len(keywords)):
+            for location in hot_locations:
+                await self._step("geocode", asyncio.to_thread, self.tools._geocode, location)
+                await self._step("weather", self.warm_weather, location)
+            # 沒講餐別時 run_food_agent 會在關鍵字前面加上推測的餐別，預熱用同樣的搜尋詞才會命中快取
+            for keyword, location, mode in keywords:
+                await self._step(
+                    "search", asyncio.to_thread, self._warm_search, f"{meal} {keyword}", location, mode,
+                )
+
+    def _warm_search(self, search_kw: str, location: str, mode: str) -> None:
+        # 放寬評分門檻讓 Place Details 都查過一次；之後真實請求各自套用自己的條件
+        self.tools.search_places(search_kw, location, 30, 0.0, 0, mode)
+
+
+async def run_prewarmer(prewarmer: Prewarmer, meals: list[str], lead_minutes: float, locations: list[str], per_guild: int) -> None:
+    while True:
+        meal, at = next_peak(datetime.now(TAIPEI), meals, lead_minutes)
+        await asyncio.sleep(max(0.0, (at - datetime.now(TAIPEI)).total_seconds()))
+        try:
+            await prewarmer.warm(meal, locations, per_guild)
+        except Exception as e:
+            print(f"prewarm failed: {e}")
+        try:
+            await asyncio.to_thread(history.save)
+        except OSError as e:
+            print(f"prewarm history save failed: {e}")
+        # 避免時鐘誤差讓同一個尖峰跑兩次
+        await asyncio.sleep(60)
+
+
+def start_prewarmer(tools, warm_weather: Callable[[str], Awaitable[Optional[dict]]]) -> Optional[asyncio.Task]:
+    """載入查詢紀錄並啟動尖峰前預熱（PREWARM_ENABLED 關閉時只記紀錄、不預熱）"""
+    history.load()
+    if not PREWARM_ENABLED:
+        return None
+    return asyncio.create_task(
+        run_prewarmer(Prewarmer(tools, warm_weather), PREWARM_MEALS, PREWARM_LEAD_MINUTES, PREWARM_LOCATIONS, PREWARM_TOP_KEYWORDS)
+    )
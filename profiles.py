@@ -0,0 +1,55 @@
+from typing import Optional
+
+import state_store
+
+# ====== /eat 預設設定（伺服器 / 個人）=====
+# 存在 state_store：伺服器設定在 (guild_id, "profile")，個人設定在 (user_id, "user_profile")
+# （Discord snowflake 不會重複，所以兩者可以共用 guild_id 欄位）。個人設定會蓋過伺服器設定。
+# 地點在設定時就 geocode 好存成 latlng；訊息裡沒講地點 / 條件時，/eat 直接用這些值，省掉解析與 geocode。
+
+PROFILE_FIELDS = ("location", "latlng", "city_en", "travel_mode", "max_travel_time", "min_rating", "min_reviews", "diet")
+TRAVEL_MODES = ("walking", "driving", "bicycling", "transit")
+SCOPES = {"guild": "profile", "user": "user_profile"}
+
+
+def get_profile(guild_id: Optional[int], user_id: Optional[int] = None) -> dict:
+    """合併後的設定；沒設定的欄位不會出現在結果裡"""
+    merged: dict = {}
+    if guild_id is not None:
+        merged.update(state_store.get(guild_id, SCOPES["guild"], {}))
+    if user_id is not None:
+        merged.update(state_store.get(user_id, SCOPES["user"], {}))
+    return merged
+
+
+def get_scope_profile(owner_id: int, scope: str) -> dict:
+    return state_store.get(owner_id, SCOPES[scope], {})
+
+
+def update_profile(owner_id: int, scope: str, **fields) -> dict:
+    """只更新有給值（不是 None）的欄位；回傳更新後的設定"""
+    changes = {k: v for k, v in fields.items() if k in PROFILE_FIELDS and v is not None}
+    return state_store.update(owner_id, SCOPES[scope], lambda old: {**(old or {}), **changes}, {})
+
+
+def clear_profile(owner_id: int, scope: str) -> None:
+    state_store.update(owner_id, SCOPES[scope], lambda old: {}, {})
+
+
+def describe_profile(profile: dict) -> str:
+    if not profile:
+        return "（沒有設定）"
+    lines = []
+    if profile.get("location"):
+        lines.append(f"地點：{profile['location']}")
+    if profile.get("travel_mode"):
+        lines.append(f"交通方式：{profile['travel_mode']}")
+    if profile.get("max_travel_time") is not None:
+        lines.append(f"路程：{profile['max_travel_time']} 分鐘內")
+    if profile.get("min_rating") is not None:
+        lines.append(f"評分：{profile['min_rating']}+")
+    if profile.get("min_reviews") is not None:
+        lines.append(f"評論數：{profile['min_reviews']}+")
+    if profile.get("diet"):
+        lines.append(f"飲食偏好：{profile['diet']}")
+    return "\n".join(lines) or "（沒有設定）"
@@ -0,0 +1,138 @@
+import json
+import re
+from functools import lru_cache
+from typing import Optional
+
+from config import FOOD_PROMPT_TOKEN_BUDGET
+
+# ====== /eat 推薦 prompt 的 token 預算 =====
+# 固定指示放在最前面且逐字不變，gateway（Ollama）才能重用同一段前綴的 KV cache；
+# 每次變動的資料（需求、天氣、搜尋結果）放在後面，超過預算時逐級壓縮。
+
+_CJK = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估 token 數：CJK 字元約 1 token/字，其餘約 4 字元/token（gemma3 tokenizer 的量級）"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+@lru_cache(maxsize=8)
+def food_instruction_prefix(travel_mode_label: str) -> str:
+    return "".join([
+        "你是成大附近的美食推薦助理，回覆要有人情味、口吻自然、資訊完整。\n",
+        "請用繁中給 3~5 家推薦，內容要更豐富、有情感，但避免冗長。\n",
+        f"每家請包含：店名（可加簡短亮點標語）、評分與評論數、{travel_mode_label}時間、地圖連結、營業時間、推薦菜品（至少 2 道），以及一段「推薦理由」（1~2 句）。\n",
+        "可以補充 1 句貼心提示（例如適合的場合或天氣）。\n",
+        "推薦菜品只能從搜尋結果的「必點」清單挑選；若清單為空，請寫「暫無明確推薦」。\n",
+        "格式示例：\n",
+        "[1️⃣] 店名（亮點）\n",
+        "   評分：x.x（xxxx 則評論）\n",
+        f"   {travel_mode_label}：xx 分鐘\n",
+        "   地圖：Google Maps 連結\n",
+        "   營業時間：xx\n",
+        "   推薦菜品：\n",
+        "   • 菜名1 — 亮點描述\n",
+        "   • 菜名2 — 亮點描述\n",
+        "   推薦理由：一句到兩句\n",
+        "   小提醒：一句話\n",
+        "每家都要附 Google Maps 連結。\n",
+        "----\n",
+    ])
+
+
+@lru_cache(maxsize=8)
+def _prefix_tokens(travel_mode_label: str) -> int:
+    return estimate_tokens(food_instruction_prefix(travel_mode_label))
+
+
+# 壓縮階梯：(評論摘要長度, 是否保留地址, 是否保留價位, 最多幾家)
+_COMPACTION_LEVELS = [
+    (80, True, True, 5),
+    (40, True, True, 5),
+    (0, True, True, 5),
+    (0, False, True, 5),
+    (0, False, False, 5),
+    (0, False, False, 4),
+    (0, False, False, 3),
+]
+
+
+def _hours_text(result: dict) -> str:
+    # 有營業狀態（營業中/幾點打烊）就只給這句，比整天的時段短
+    if result.get("open_status"):
+        return result["open_status"]
+    hours = result.get("opening_hours") or []
+    return result.get("hours_today") or (hours[0] if hours else "未提供")
+
+
+def render_results(results: list[dict], mode_label: str, level: int = 0) -> str:
+    snippet_len, keep_address, keep_price, limit = _COMPACTION_LEVELS[level]
+    blocks = []
+    for i, r in enumerate(results[:limit], 1):
+        rec = "、".join(r.get("recommended_items") or []) or "暫無明確推薦"
+        lines = [
+            f"{i}. {r['name']}",
+            f"{mode_label}{r['travel_time_min']}分｜評分{r['rating']}（{r['reviews']}則）｜營業：{_hours_text(r)}",
+        ]
+        if keep_price and r.get("price_level") is not None:
+            lines[-1] += f"｜價位{r['price_level']}"
+        lines.append(f"必點：{rec}")
+        snippet = (r.get("review_snippet") or "").strip()
+        if snippet_len and snippet:
+            lines.append(f"評論：{snippet[:snippet_len]}")
+        if keep_address and r.get("address"):
+            lines.append(f"地址：{r['address']}")
+        lines.append(f"地圖：{r['map_url']}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def build_food_prompt(
+    *,
+    user_text: str,
+    style_hint: str,
+    location_label: str,
+    conditions: str,
+    meal_line: str,
+    local_time: str,
+    weather: Optional[dict],
+    results: list[dict],
+    travel_mode_label: str,
+    budget: Optional[int] = None,
+) -> tuple[str, dict]:
+    """
+    組出 /eat 最終 prompt，回傳 (prompt, stats)。stats 含估計 token 數與使用的壓縮等級。
+    """
+    budget = FOOD_PROMPT_TOKEN_BUDGET if budget is None else budget
+    prefix = food_instruction_prefix(travel_mode_label)
+    context = "".join([
+        style_hint,
+        f"使用者需求：{user_text}\n",
+        f"搜尋地點：{location_label}\n",
+        f"條件：{conditions}\n",
+        f"餐別：{meal_line}\n",
+        f"現在時間（台灣）：{local_time}\n",
+        f"天氣：{json.dumps(weather, ensure_ascii=False, separators=(',', ':'))}\n",
+        "搜尋結果：\n",
+    ])
+    fixed_tokens = _prefix_tokens(travel_mode_label) + estimate_tokens(context)
+
+    level = 0
+    body = render_results(results, travel_mode_label, level)
+    while level + 1 < len(_COMPACTION_LEVELS) and fixed_tokens + estimate_tokens(body) > budget:
+        level += 1
+        body = render_results(results, travel_mode_label, level)
+
+    prompt = prefix + context + body
+    stats = {
+        "prompt_tokens_est": fixed_tokens + estimate_tokens(body),
+        "prefix_tokens_est": _prefix_tokens(travel_mode_label),
+        "budget": budget,
+        "compaction_level": level,
+        "restaurants": min(len(results), _COMPACTION_LEVELS[level][3]),
+    }
+    return prompt, stats
@@ -0,0 +1,315 @@
+import contextlib
+import contextvars
+import os
+import queue
+import struct
+import threading
+import time
+from typing import Iterator, Optional
+
+from config import QUERY_LOG_BACKUPS, QUERY_LOG_MAX_BYTES, QUERY_LOG_PATH
+from telemetry import describe, inc
+from text_utils import MEAL_WINDOWS
+
+# ====== 解析後查詢的分析紀錄 =====
+# 每筆是固定欄位的二進位紀錄（struct），只記解析後的關鍵字/地點/條件與各階段耗時，不記使用者原文。
+# 熱路徑只做 struct.pack 與 queue.put；寫檔與輪替都在背景 thread。
+# 記錄失敗（欄位打包不了、檔案開不了）只丟掉那筆並計數，不影響查詢本身；檔案開不了時每 REOPEN_SECONDS 秒重試，
+# 期間照樣把 queue 清空，不會越積越多。
+# 分析：python -m benchmarks.query_stats（見 README）
+
+MAGIC = b"EQL1"
+KINDS = ("food", "nutrition", "spin")
+CACHE_STATES = ("", "miss", "hit", "stale")
+TRAVEL_MODES = ("", "walking", "driving", "bicycling", "transit")
+MEALS = ("",) + tuple(MEAL_WINDOWS)
+STAGES = ("extract_query", "extract_filters", "weather", "search", "generate", "translate", "usda")
+
+FLAG_FAST = 1
+FLAG_MEAL_FROM_TEXT = 2
+FLAG_ERROR = 4
+
+# ts, guild_id, kind, cache, travel_mode, meal, flags, max_travel_time, min_rating×10, min_reviews, results, total_ms
+_HEADER = struct.Struct("<dQBBBBBHBIBf")
+_STAGE = struct.Struct("<Bf")
+_LEN = struct.Struct("<H")
+REOPEN_SECONDS = 30.0
+
+
+class QueryRecord:
+    __slots__ = (
+        "kind", "guild_id", "keyword", "location", "cache", "travel_mode", "meal", "flags",
+        "max_travel_time", "min_rating", "min_reviews", "results", "stages", "start", "ts", "total_ms", "closed",
+    )
+
+    def __init__(self, kind: str, guild_id: Optional[int]):
+        self.kind = kind
+        self.guild_id = guild_id
+        self.keyword = ""
+        self.location = ""
+        self.cache = ""
+        self.travel_mode = ""
+        self.meal = ""
+        self.flags = 0
+        self.max_travel_time = 0
+        self.min_rating = 0.0
+        self.min_reviews = 0
+        self.results = 0
+        self.stages: dict[str, float] = {}
+        self.start = time.perf_counter()
+        self.ts = time.time()
+        self.total_ms = 0.0
+        self.closed = False
+
+    def set(self, **fields) -> None:
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # 背景更新（stale-while-revalidate）可能在紀錄送出後才跑完，那時就不再記
+            if not self.closed:
+                self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def _enum(values: tuple, value: str) -> int:
+    try:
+        return values.index(value)
+    except ValueError:
+        return 0
+
+
+def _pack_str(value: str) -> bytes:
+    raw = (value or "").encode("utf-8")[:255]
+    # 截斷時不要留下半個 UTF-8 字元
+    raw = raw.decode("utf-8", "ignore").encode("utf-8")
+    return bytes((len(raw),)) + raw
+
+
+def _clamp(value, hi: int) -> int:
+    # LLM 解析出的條件可能是負數；超出欄位範圍的一律夾到 0..hi
+    return max(0, min(int(value or 0), hi))
+
+
+def pack(record: QueryRecord) -> bytes:
+    stages = [(STAGES.index(name), ms) for name, ms in record.stages.items() if name in STAGES]
+    body = b"".join([
+        _HEADER.pack(
+            record.ts,
+            record.guild_id or 0,
+            _enum(KINDS, record.kind),
+            _enum(CACHE_STATES, record.cache),
+            _enum(TRAVEL_MODES, record.travel_mode),
+            _enum(MEALS, record.meal),
+            record.flags & 0xFF,
+            _clamp(record.max_travel_time, 0xFFFF),
+            _clamp(round((record.min_rating or 0) * 10), 255),
+            _clamp(record.min_reviews, 0xFFFFFFFF),
+            _clamp(record.results, 255),
+            record.total_ms,
+        ),
+        _pack_str(record.keyword),
+        _pack_str(record.location),
+        bytes((len(stages),)),
+        b"".join(_STAGE.pack(i, ms) for i, ms in stages),
+    ])
+    return _LEN.pack(len(body)) + body
+
+
+def unpack(body: bytes) -> dict:
+    (ts, guild_id, kind, cache, mode, meal, flags, max_tt, rating10, min_reviews, results, total_ms) = \
+        _HEADER.unpack_from(body, 0)
+    pos = _HEADER.size
+    strings = []
+    for _ in range(2):
+        n = body[pos]
+        strings.append(body[pos + 1:pos + 1 + n].decode("utf-8", "replace"))
+        pos += 1 + n
+    stages = {}
+    for _ in range(body[pos]):
+        idx, ms = _STAGE.unpack_from(body, pos + 1)
+        stages[STAGES[idx] if idx < len(STAGES) else f"stage{idx}"] = ms
+        pos += _STAGE.size
+    return {
+        "ts": ts,
+        "guild_id": guild_id or None,
+        "kind": KINDS[kind] if kind < len(KINDS) else "unknown",
+        "cache": CACHE_STATES[cache] if cache < len(CACHE_STATES) else "",
+        "travel_mode": TRAVEL_MODES[mode] if mode < len(TRAVEL_MODES) else "",
+        "meal": MEALS[meal] if meal < len(MEALS) else "",
+        "fast": bool(flags & FLAG_FAST),
+        "meal_from_text": bool(flags & FLAG_MEAL_FROM_TEXT),
+        "error": bool(flags & FLAG_ERROR),
+        "max_travel_time": max_tt,
+        "min_rating": rating10 / 10,
+        "min_reviews": min_reviews,
+        "results": results,
+        "total_ms": total_ms,
+        "keyword": strings[0],
+        "location": strings[1],
+        "stages": stages,
+    }
+
+
+def read_records(path: str) -> Iterator[dict]:
+    """讀單一檔案；結尾寫到一半的紀錄直接略過"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} 不是查詢紀錄檔")
+        while True:
+            head = f.read(_LEN.size)
+            if len(head) < _LEN.size:
+                return
+            (n,) = _LEN.unpack(head)
+            body = f.read(n)
+            if len(body) < n:
+                return
+            yield unpack(body)
+
+
+def log_files(path: str = QUERY_LOG_PATH) -> list[str]:
+    """由舊到新：path.N … path.1、path"""
+    files = [f"{path}.{i}" for i in range(QUERY_LOG_BACKUPS, 0, -1)] + [path]
+    return [p for p in files if os.path.exists(p)]
+
+
+# ------------------------------------------------------------
+# 背景寫入 + 輪替
+# ------------------------------------------------------------
+_queue: Optional[queue.SimpleQueue] = None
+_start_lock = threading.Lock()
+_current: contextvars.ContextVar = contextvars.ContextVar("query_record", default=None)
+
+
+def _rotate(path: str, backups: int) -> None:
+    for i in range(backups, 0, -1):
+        src = path if i == 1 else f"{path}.{i - 1}"
+        if os.path.exists(src):
+            os.replace(src, f"{path}.{i}")
+
+
+def _open(path: str):
+    f = open(path, "ab")
+    if f.tell() == 0:
+        f.write(MAGIC)
+    return f
+
+
+def _writer(path: str, q: queue.SimpleQueue, max_bytes: int, backups: int) -> None:
+    f = None
+    retry_at = 0.0
+    while True:
+        data = q.get()
+        try:
+            if f is None:
+                if time.monotonic() < retry_at:
+                    inc("query_log_dropped_total", reason="unavailable")
+                    continue
+                f = _open(path)
+            if f.tell() + len(data) > max_bytes:
+                f.close()
+                f = None
+                if backups > 0:
+                    _rotate(path, backups)
+                else:
+                    os.remove(path)
+                f = _open(path)
+            f.write(data)
+            if q.empty():
+                f.flush()
+        except (OSError, ValueError) as e:
+            print(f"query log write failed, dropping records for {REOPEN_SECONDS:.0f}s: {e}")
+            inc("query_log_dropped_total", reason="write_failed")
+            if f is not None:
+                with contextlib.suppress(OSError, ValueError):
+                    f.close()
+            f = None
+            retry_at = time.monotonic() + REOPEN_SECONDS
+
+
+def _ensure_writer() -> Optional[queue.SimpleQueue]:
+    global _queue
+    if not QUERY_LOG_PATH:
+        return None
+    if _queue is None:
+        with _start_lock:
+            if _queue is None:
+                q = queue.SimpleQueue()
+                threading.Thread(
+                    target=_writer, args=(QUERY_LOG_PATH, q, QUERY_LOG_MAX_BYTES, QUERY_LOG_BACKUPS),
+                    name="query-log-writer", daemon=True,
+                ).start()
+                _queue = q
+    return _queue
+
+
+def emit(record: QueryRecord) -> None:
+    q = _ensure_writer()
+    record.closed = True
+    if q is None:
+        return
+    record.total_ms = (time.perf_counter() - record.start) * 1000
+    try:
+        data = pack(record)
+    except (struct.error, TypeError, ValueError, OverflowError) as e:
+        # 紀錄只是分析用，打包失敗不能蓋掉查詢本身的結果
+        print(f"query log record dropped: {e}")
+        inc("query_log_dropped_total", reason="pack_failed")
+        return
+    q.put(data)
+
+
+@contextlib.contextmanager
+def track(kind: str, guild_id: Optional[int]):
+    """包住一次查詢；區塊結束時送出紀錄（丟例外也會記，並標上 error）"""
+    record = QueryRecord(kind, guild_id)
+    token = _current.set(record)
+    try:
+        yield record
+    except BaseException:
+        record.flags |= FLAG_ERROR
+        raise
+    finally:
+        _current.reset(token)
+        emit(record)
+
+
+def current() -> Optional[QueryRecord]:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """記錄目前查詢某個階段的耗時；不在 track() 裡時什麼都不做"""
+    record = _current.get()
+    if record is None:
+        yield
+        return
+    with record.stage(name):
+        yield
+
+
+def annotate(**fields) -> None:
+    """補目前查詢的欄位（例如搜尋結果數）；紀錄已送出或不在 track() 裡時略過"""
+    record = _current.get()
+    if record is not None and not record.closed:
+        record.set(**fields)
+
+
+def mark_error() -> None:
+    record = _current.get()
+    if record is not None and not record.closed:
+        record.flags |= FLAG_ERROR
+
+
+def log_spin(guild_id: Optional[int], choice: str, source: str = "") -> None:
+    record = QueryRecord("spin", guild_id)
+    record.set(keyword=choice, location=source)
+    emit(record)
+
+
+describe("query_log_dropped_total", "Query log records dropped, by reason (pack_failed / write_failed / unavailable).")
@@ -0,0 +1,333 @@
+import asyncio
+import concurrent.futures
+import math
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+import requests
+
+from config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+    UPSTREAM_HEDGING,
+    UPSTREAM_TIMEOUT_K,
+)
+from telemetry import describe, inc, set_gauge
+
+# ====== 上游共用的韌性層 =====
+# 每個上游（LLM / Google / Open-Meteo / USDA）一個 Upstream：
+# - 斷路器：連續失敗 CIRCUIT_FAILURE_THRESHOLD 次就打開，CIRCUIT_RESET_SECONDS 內直接丟 CircuitOpenError，
+#   之後放一個試探請求（half-open），成功才關回去。呼叫端原本就有的 except 分支就是降級路徑。
+# - 自適應 timeout：成功延遲的 p99 × UPSTREAM_TIMEOUT_K，夾在 [min_timeout, timeout] 之間；樣本不夠時用原本的 timeout。
+# - 對冲請求：冪等的 GET 等超過 p95 還沒回來，就再送一次，先回來的算數。
+#   同步版（requests，跑在 to_thread 裡）：第一個請求直接在呼叫端的 thread 跑（不排隊、量到的就是上游延遲），
+#   只有對冲請求進 _hedge_pool；池子滿了就不對冲。呼叫端的 thread 卡在第一個請求裡、沒辦法中途換手，
+#   所以對冲請求只在第一個請求失敗時接手，第一個成功就不理它。
+
+T = TypeVar("T")
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+_STATE_NAMES = {CLOSED: "closed", HALF_OPEN: "half_open", OPEN: "open"}
+MIN_SAMPLES = 20
+MIN_HEDGE_DELAY = 0.05
+
+# 同步 GET（Google，跑在 to_thread 裡）的對冲請求用的執行緒；名額跟 worker 一樣多，送進去的不會排隊
+HEDGE_WORKERS = 8
+_hedge_pool = concurrent.futures.ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+_hedge_slots = threading.BoundedSemaphore(HEDGE_WORKERS)
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, upstream: str, retry_in: float):
+        super().__init__(f"{upstream} 暫時停用（斷路器開啟，約 {retry_in:.0f} 秒後重試）")
+        self.upstream = upstream
+
+
+def _percentile(sorted_values: list[float], p: float) -> float:
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _is_failure(exc: BaseException) -> bool:
+    """4xx（429 除外）代表請求本身有問題、上游是好的，不算進斷路器"""
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if isinstance(exc, (httpx.HTTPStatusError, requests.HTTPError)) and status is not None:
+        return status >= 500 or status == 429
+    return True
+
+
+class Upstream:
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        min_timeout: float,
+        hedge: bool = False,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS,
+        k: float = UPSTREAM_TIMEOUT_K,
+    ):
+        self.name = name
+        self.max_timeout = timeout
+        self.min_timeout = min(min_timeout, timeout)
+        self.hedge = hedge and UPSTREAM_HEDGING
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.k = k
+        self._latencies: deque = deque(maxlen=200)
+        self._sorted: Optional[list[float]] = None
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # 延遲統計
+    # ------------------------------------------------------------
+    def _quantile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < MIN_SAMPLES:
+                return None
+            if self._sorted is None:
+                self._sorted = sorted(self._latencies)
+            return _percentile(self._sorted, p)
+
+    def timeout(self) -> float:
+        p99 = self._quantile(99)
+        if p99 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.k))
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge or self.state != CLOSED:
+            return None
+        p95 = self._quantile(95)
+        return None if p95 is None else max(MIN_HEDGE_DELAY, p95)
+
+    # ------------------------------------------------------------
+    # 斷路器
+    # ------------------------------------------------------------
+    @property
+    def state(self) -> int:
+        return self._state
+
+    def _transition(self, state: int) -> None:
+        # 呼叫端持有 _lock
+        if state == self._state:
+            return
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        set_gauge("upstream_circuit_state", state, upstream=self.name)
+        inc("upstream_circuit_transitions_total", upstream=self.name, to=_STATE_NAMES[state])
+        print(f"circuit {self.name}: {_STATE_NAMES[state]}")
+
+    def _acquire(self) -> bool:
+        """允許這次呼叫就回 True；half-open 時只放一個試探請求"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    return False
+                self._transition(HALF_OPEN)
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def _export(self, timeout: float) -> None:
+        set_gauge("upstream_timeout_seconds", timeout, upstream=self.name)
+        set_gauge("upstream_circuit_state", self._state, upstream=self.name)
+
+    def _reject(self) -> CircuitOpenError:
+        inc("upstream_calls_total", upstream=self.name, result="rejected")
+        retry_in = max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+        return CircuitOpenError(self.name, retry_in)
+
+    def _success(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+            self._sorted = None
+            self._failures = 0
+            self._probe_in_flight = False
+            self._transition(CLOSED)
+        inc("upstream_calls_total", upstream=self.name, result="ok")
+
+    def _failure(self, exc: BaseException) -> None:
+        timed_out = isinstance(exc, (asyncio.TimeoutError, TimeoutError, httpx.TimeoutException, requests.Timeout))
+        inc("upstream_calls_total", upstream=self.name, result="timeout" if timed_out else "error")
+        with self._lock:
+            self._probe_in_flight = False
+            if not _is_failure(exc):
+                return
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._transition(OPEN)
+
+    def _release(self) -> None:
+        # 呼叫被取消（不是上游的錯）時把試探名額還回去
+        with self._lock:
+            self._probe_in_flight = False
+
+    # ------------------------------------------------------------
+    # 呼叫
+    # ------------------------------------------------------------
+    async def call(self, fn: Callable[[float], Awaitable[T]]) -> T:
+        """fn(timeout) 回傳 awaitable；整段呼叫也用同一個 timeout 包住"""
+        if not self._acquire():
+            raise self._reject()
+        timeout = self.timeout()
+        self._export(timeout)
+        start = time.perf_counter()
+        try:
+            result = await self._hedged_async(fn, timeout)
+        except asyncio.CancelledError:
+            self._release()
+            raise
+        except Exception as e:
+            self._failure(e)
+            raise
+        self._success(time.perf_counter() - start)
+        return result
+
+    async def _hedged_async(self, fn: Callable[[float], Awaitable[T]], timeout: float) -> T:
+        delay = self.hedge_delay()
+        if delay is None or delay >= timeout:
+            return await asyncio.wait_for(fn(timeout), timeout)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        tasks = [asyncio.ensure_future(fn(timeout))]
+        error: Optional[BaseException] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return tasks[0].result()
+            inc("upstream_hedges_total", upstream=self.name)
+            tasks.append(asyncio.ensure_future(fn(max(0.0, deadline - loop.time()))))
+            pending = set(tasks)
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            if error is not None and not pending:
+                raise error
+            raise asyncio.TimeoutError(f"{self.name} timed out after {timeout:.1f}s")
+        finally:
+            # 包含外層被取消的情況：沒跑完的一律取消
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def call_sync(self, fn: Callable[[float], T]) -> T:
+        """同步版（給跑在 to_thread 裡的 requests 呼叫）"""
+        if not self._acquire():
+            raise self._reject()
+        timeout = self.timeout()
+        self._export(timeout)
+        start = time.perf_counter()
+        try:
+            result = self._hedged_sync(fn, timeout)
+        except Exception as e:
+            self._failure(e)
+            raise
+        self._success(time.perf_counter() - start)
+        return result
+
+    def _hedged_sync(self, fn: Callable[[float], T], timeout: float) -> T:
+        delay = self.hedge_delay()
+        if delay is None or delay >= timeout:
+            return fn(timeout)
+        deadline = time.monotonic() + timeout
+        lock = threading.Lock()
+        hedges: list[concurrent.futures.Future] = []
+        finished = False
+
+        def launch() -> None:
+            with lock:
+                if finished:
+                    return
+                if not _hedge_slots.acquire(blocking=False):
+                    inc("upstream_hedges_skipped_total", upstream=self.name)
+                    return
+                inc("upstream_hedges_total", upstream=self.name)
+                future = _hedge_pool.submit(fn, max(0.0, deadline - time.monotonic()))
+                future.add_done_callback(lambda _: _hedge_slots.release())
+                hedges.append(future)
+
+        timer = threading.Timer(delay, launch)
+        timer.daemon = True
+        timer.start()
+        try:
+            return fn(timeout)
+        except Exception:
+            with lock:
+                finished = True
+            timer.cancel()
+            # 第一個請求失敗：已經送出的對冲請求在期限內成功就用它
+            for future in hedges:
+                try:
+                    return future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except Exception:
+                    pass
+            raise
+        finally:
+            with lock:
+                finished = True
+            timer.cancel()
+
+    # ------------------------------------------------------------
+    # 常用的 GET 包裝
+    # ------------------------------------------------------------
+    async def get(self, http: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+        async def attempt(timeout: float) -> httpx.Response:
+            resp = await http.get(url, timeout=timeout, **kwargs)
+            resp.raise_for_status()
+            return resp
+        return await self.call(attempt)
+
+    def get_sync(self, url: str, params: dict) -> requests.Response:
+        def attempt(timeout: float) -> requests.Response:
+            resp = requests.get(url, params=params, timeout=timeout)
+            resp.raise_for_status()
+            return resp
+        return self.call_sync(attempt)
+
+
+LLM = Upstream("llm", timeout=300.0, min_timeout=20.0)
+GOOGLE = Upstream("google", timeout=10.0, min_timeout=2.0, hedge=True)
+OPEN_METEO = Upstream("open_meteo", timeout=15.0, min_timeout=2.0, hedge=True)
+USDA = Upstream("usda", timeout=20.0, min_timeout=3.0, hedge=True)
+
+# 每個 event loop 共用一個 AsyncClient（連線池跟著 loop 走，所以不能跨 loop）。
+# 每次 new 一個 client 都要重建 SSL context、載入整包 CA 憑證，是幾十 ms 的同步 CPU 工作，會直接卡住 loop。
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def http_client() -> httpx.AsyncClient:
+    """目前 event loop 的共用 AsyncClient；timeout 由各 Upstream 每次請求帶入"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(timeout=LLM.max_timeout)
+        _clients[loop] = client
+    return client
+
+
+describe("upstream_circuit_state", "Circuit breaker state per upstream: 0 closed, 1 half-open, 2 open.")
+describe("upstream_circuit_transitions_total", "Circuit breaker state changes, by target state.")
+describe("upstream_calls_total", "Upstream calls by result (ok / error / timeout / rejected by open circuit).")
+describe("upstream_timeout_seconds", "Adaptive timeout currently applied to each upstream.")
+describe("upstream_hedges_total", "Hedged duplicate GETs sent after the p95 latency elapsed.")
+describe("upstream_hedges_skipped_total", "Sync hedges skipped because every hedge worker was busy.")
@@ -1,12 +1,55 @@
-from wishlist import WishlistView, extract_restaurant_names
+from typing import Awaitable, Optional
+
+from discord_output import DISCORD_MESSAGE_LIMIT, send_text
+from wishlist import extract_restaurant_names, wishlist_view
 from text_utils import make_urls_clickable
 
+KEYCAPS = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣"]
+
+
+def render_food_results(results: list[dict], keyword: str, location: str, mode_label: str) -> str:
+    """
+    快速模式：不經 LLM，直接把 search_places 的結構化結果排成跟 LLM 回覆相同的格式
+    （`[1️⃣] 店名` 開頭，wishlist 按鈕照樣抓得到店名）
+    """
+    lines = [f"以下是 {location} 附近的「{keyword}」（快速模式）：", ""]
+    for i, r in enumerate(results[:len(KEYCAPS)]):
+        hours = r.get("opening_hours") or []
+        hours_text = r.get("hours_today") or (hours[0] if hours else "未提供")
+        if r.get("open_status"):
+            hours_text += f"（{r['open_status']}）"
+        rec = r.get("recommended_items") or []
+        lines.append(f"[{KEYCAPS[i]}] {r['name']}")
+        lines.append(f"   評分：{r['rating']}（{r['reviews']} 則評論）")
+        lines.append(f"   {mode_label}：{r['travel_time_min']} 分鐘")
+        lines.append(f"   地圖：{r['map_url']}")
+        lines.append(f"   營業時間：{hours_text}")
+        lines.append(f"   推薦菜品：{'、'.join(rec) if rec else '暫無明確推薦'}")
+        if r.get("review_snippet"):
+            lines.append(f"   評論：{r['review_snippet']}")
+        lines.append("")
+    return "\n".join(lines).rstrip()
 
-async def send_food_result(send_func, ans: str, raw_ans: str) -> None:
-    safe_ans = make_urls_clickable(ans)
-    for i in range(0, len(safe_ans), 1800):
-        await send_func(safe_ans[i:i+1800])
+
+async def send_food_result(send_func, ans: str, raw_ans: str, blurb: Optional[Awaitable[str]] = None) -> None:
+    last = await send_text(send_func, make_urls_clickable(ans))
 
     names = extract_restaurant_names(raw_ans)
     if names:
-        await send_func("想加入待吃清單？點下面按鈕：", view=WishlistView(names))
+        await send_text(send_func, "想加入待吃清單？點下面按鈕：", view=await wishlist_view(names))
+
+    # 快速模式的 LLM 短評：清單先送出，短評好了再補到最後一段（放不下就另發一則）
+    if blurb is None:
+        return
+    try:
+        text = (await blurb).strip()
+    except Exception:
+        return
+    if not text:
+        return
+    extra = "\n\n💬 " + make_urls_clickable(text)
+    # embed 回覆的 content 是空的，短評接在上面會跑到清單前面，所以另發
+    if last is not None and not last.embeds and len(last.content) + len(extra) <= DISCORD_MESSAGE_LIMIT:
+        await last.edit(content=last.content + extra)
+    else:
+        await send_text(send_func, extra.strip())
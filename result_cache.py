@@ -0,0 +1,156 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from telemetry import inc, set_gauge
+
+# ====== 推薦結果快取（stale-while-revalidate）=====
+# key 是解析後的查詢條件（不是使用者原文）。未超過 soft_ttl 直接回；超過 soft_ttl 但未超過 hard_ttl
+# 先回舊答案、背景重算；超過 hard_ttl 或沒有就當場算。同一個 key 同時只會有一個計算在跑。
+# compute() 回傳 (value, cacheable)；cacheable=False（例如 LLM 失敗）只回給這次請求，不寫進快取。
+
+Compute = Callable[[], Awaitable[tuple[Any, bool]]]
+
+
+class ResultCache:
+    def __init__(
+        self,
+        soft_ttl: float,
+        hard_ttl: float,
+        max_entries: int,
+        max_chars: int,
+        name: str = "food",
+    ):
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = max(hard_ttl, soft_ttl)
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.name = name
+        # key -> (寫入時間, value, 估計字數)
+        self._entries: "OrderedDict[Hashable, tuple[float, Any, int]]" = OrderedDict()
+        self._chars = 0
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._background: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.hard_ttl > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._chars = 0
+        self._update_gauges()
+
+    # ------------------------------------------------------------
+    # 讀寫
+    # ------------------------------------------------------------
+    def _lookup(self, key: Hashable) -> tuple[Optional[Any], str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, "miss"
+        stored_at, value, _ = entry
+        age = time.monotonic() - stored_at
+        if age >= self.hard_ttl:
+            self._evict(key)
+            return None, "miss"
+        self._entries.move_to_end(key)
+        return value, "hit" if age < self.soft_ttl else "stale"
+
+    def state(self, key: Hashable) -> str:
+        """不改動快取，只看 key 目前會是 hit / stale / miss（關閉時回空字串）"""
+        if not self.enabled:
+            return ""
+        entry = self._entries.get(key)
+        if entry is None:
+            return "miss"
+        age = time.monotonic() - entry[0]
+        if age >= self.hard_ttl:
+            return "miss"
+        return "hit" if age < self.soft_ttl else "stale"
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        size = _size_of(value)
+        if size > self.max_chars:
+            return
+        self._evict(key)
+        self._entries[key] = (time.monotonic(), value, size)
+        self._chars += size
+        while self._entries and (len(self._entries) > self.max_entries or self._chars > self.max_chars):
+            oldest = next(iter(self._entries))
+            self._evict(oldest)
+        self._update_gauges()
+
+    def _evict(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._chars -= entry[2]
+
+    def _update_gauges(self) -> None:
+        set_gauge("result_cache_entries", len(self._entries), cache=self.name)
+        set_gauge("result_cache_chars", self._chars, cache=self.name)
+
+    # ------------------------------------------------------------
+    # 計算（同 key 合併）
+    # ------------------------------------------------------------
+    async def _compute(self, key: Hashable, compute: Compute) -> Any:
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value, cacheable = await compute()
+            if cacheable:
+                self._store(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 沒有其他人在等時避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _refresh(self, key: Hashable, compute: Compute) -> None:
+        if key in self._inflight:
+            return
+
+        async def runner() -> None:
+            try:
+                await self._compute(key, compute)
+                inc("result_cache_refresh_total", cache=self.name, result="ok")
+            except Exception:
+                inc("result_cache_refresh_total", cache=self.name, result="error")
+
+        task = asyncio.create_task(runner())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def get_or_compute(self, key: Hashable, compute: Compute) -> Any:
+        if not self.enabled:
+            value, _ = await compute()
+            return value
+        value, state = self._lookup(key)
+        inc("result_cache_requests_total", cache=self.name, result=state)
+        if state == "hit":
+            return value
+        if state == "stale":
+            self._refresh(key, compute)
+            return value
+        return await self._compute(key, compute)
+
+
+def _size_of(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_size_of(v) for v in value)
+    return 64
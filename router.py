@@ -2,55 +2,65 @@ from food_agents import run_chat_agent, run_food_agent, run_nutrition_agent, run
 from llm_client import llm_route_intent
 from response_utils import send_food_result
 from spin import detect_spin_source, run_spin_agent
+from telemetry import inc, span
+from text_utils import detect_intents
 
 
 def is_food_query(text: str) -> bool:
-    kw = ["吃", "餐廳", "午餐", "晚餐", "宵夜", "早餐", "便當", "拉麵", "美食", "吃什麼", "吃啥"]
-    return any(k in text for k in kw)
+    return "food" in detect_intents(text)
 
 
 def is_weather_query(text: str) -> bool:
-    kw = ["天氣", "氣溫", "溫度", "下雨", "冷不冷", "熱不熱"]
-    return any(k in text for k in kw)
+    return "weather" in detect_intents(text)
 
 
 def is_nutrition_query(text: str) -> bool:
-    kw = ["營養", "熱量", "卡路里", "蛋白質", "碳水", "脂肪", "營養成分"]
-    return any(k in text for k in kw)
+    return "nutrition" in detect_intents(text)
 
 
 def is_spin_query(text: str) -> bool:
-    kw = ["轉盤", "抽", "隨機", "random", "spin", "wheel", "幫我選", "選一個", "挑一個", "決定"]
-    return any(k in text for k in kw)
+    return "spin" in detect_intents(text)
+
+
+def _keyword_label(intents: set[str]) -> str:
+    for label in ("nutrition", "weather", "food"):
+        if label in intents:
+            return label
+    return "chat"
 
 
 async def run_agent(message) -> str:
     user_text = message.content
-    label = await llm_route_intent(user_text)
+    with span("router.decide") as s:
+        label = await llm_route_intent(user_text)
+        intents = detect_intents(user_text)
+        if label == "spin" and "spin" not in intents:
+            label = ""
+        s.set(label=label or "fallback", intents=sorted(intents))
+    inc("route_decisions_total", source="llm" if label else "keyword", label=label or _keyword_label(intents))
     guild_id = message.guild.id if message.guild else None
-    if label == "spin" and not is_spin_query(user_text):
-        label = ""
+    user_id = message.author.id
     if label == "nutrition":
         return await run_nutrition_agent(user_text, guild_id)
     if label == "weather":
         return await run_weather_agent(user_text, guild_id)
     if label == "food":
-        ans, raw_ans = await run_food_agent(user_text, guild_id)
+        ans, raw_ans = await run_food_agent(user_text, guild_id, user_id=user_id)
         await send_food_result(message.channel.send, ans, raw_ans)
         return ""
     if label == "spin":
         source = detect_spin_source(user_text)
-        await run_spin_agent(message.channel, guild_id, source=source)
+        await run_spin_agent(message.channel, guild_id, source=source, user_id=user_id)
         return ""
     if label == "chat":
         return await run_chat_agent(user_text, guild_id)
 
-    if is_nutrition_query(user_text):
+    if "nutrition" in intents:
         return await run_nutrition_agent(user_text, guild_id)
-    if is_weather_query(user_text):
+    if "weather" in intents:
         return await run_weather_agent(user_text, guild_id)
-    if is_food_query(user_text):
-        ans, raw_ans = await run_food_agent(user_text, guild_id)
+    if "food" in intents:
+        ans, raw_ans = await run_food_agent(user_text, guild_id, user_id=user_id)
         await send_food_result(message.channel.send, ans, raw_ans)
         return ""
     return await run_chat_agent(user_text, guild_id)
@@ -1,14 +1,169 @@
 import asyncio 
 import random
+from collections import OrderedDict
+from datetime import datetime
 from typing import Optional
+from zoneinfo import ZoneInfo
 
 import discord
 
-from config import DEFAULT_SPIN_CANDIDATES
-from food_agents import run_food_agent
+import state_store
+from config import (
+    DEFAULT_SPIN_CANDIDATES,
+    SPIN_HISTORY_HALF_LIFE_DAYS,
+    SPIN_MEAL_BOOST,
+    SPIN_NO_REPEAT,
+    SPIN_RECENCY_BOOST,
+)
+from food_agents import food_blurb, is_fast_mode, run_food_agent
+from query_log import log_spin
 from response_utils import send_food_result
+from text_utils import infer_meal_by_time
 from wishlist import list_wishlist
 
+# ====== 加權轉盤 =====
+# - 靜態權重：清單新舊（越晚加入越重，最新的是最舊的 1 + SPIN_RECENCY_BOOST 倍；只用在待吃清單）
+#   × 餐別（名稱對得上現在餐別的菜乘 SPIN_MEAL_BOOST）。只跟清單內容與時段有關，
+#   用 Vose alias table 預先算好；清單沒改（state_store 裡還是同一個 list 物件）且餐別沒變就一直共用。
+# - 動態權重：每個伺服器被抽中的次數（半衰期 SPIN_HISTORY_HALF_LIFE_DAYS 天）與 no-repeat 視窗
+#   （最近 SPIN_NO_REPEAT 次的結果）每轉一次就變，不進表；從表抽出後以 1 / (1 + 次數) 的機率接受，
+#   落在視窗裡就重抽（rejection sampling）。
+# 每次轉盤的期望成本是 O(1)，跟清單長度無關；只有清單改了才花 O(n) 重建。
+
+TAIPEI = ZoneInfo("Asia/Taipei")
+MAX_TABLES = 512
+MAX_DRAWS = 32
+SPIN_HISTORY_MAX = 256
+_HALF_LIFE = SPIN_HISTORY_HALF_LIFE_DAYS * 86400
+
+# 各餐別的代表菜（午餐、晚餐什麼都吃，不加權）
+MEAL_DISH_HINTS = {
+    "早餐": ("蛋餅", "飯糰", "三明治", "漢堡", "粥", "燒餅", "豆漿", "吐司", "鬆餅", "蘿蔔糕", "饅頭", "水煎包", "肉包"),
+    "下午茶": ("鬆餅", "甜點", "蛋糕", "咖啡", "豆花", "車輪餅", "紅豆餅", "雞蛋糕", "章魚燒", "甜不辣", "刈包"),
+    "宵夜": ("鹽酥雞", "滷味", "臭豆腐", "炸雞", "燒烤", "炭烤", "麻辣燙", "關東煮", "泡麵", "熱炒", "大腸包小腸", "豬血糕"),
+}
+
+
+class AliasTable:
+    """Vose alias method：O(n) 建表，O(1) 抽樣"""
+
+    __slots__ = ("items", "prob", "alias")
+
+    def __init__(self, items: list[str], weights: list[float]):
+        n = len(items)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] += scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # 剩下的（浮點誤差）機率都是 1
+        self.items = items
+        self.prob = prob
+        self.alias = alias
+
+    def draw(self, rng: random.Random = random) -> str:
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+
+
+def _weights(items: list[str], meal: str, recency: bool) -> list[float]:
+    hints = MEAL_DISH_HINTS.get(meal, ())
+    last = max(1, len(items) - 1)
+    weights = []
+    for i, name in enumerate(items):
+        w = 1.0 + SPIN_RECENCY_BOOST * i / last if recency else 1.0
+        if any(h in name for h in hints):
+            w *= SPIN_MEAL_BOOST
+        weights.append(w)
+    return weights
+
+
+_tables: "OrderedDict[tuple, tuple[list[str], AliasTable]]" = OrderedDict()
+
+
+def spin_table(items: list[str], meal: str, recency: bool = False, cache: bool = True) -> AliasTable:
+    """items 的 alias table；同一個 list 物件 + 同一個餐別只建一次（cache=False：臨時清單，不留）"""
+    if not cache:
+        return AliasTable(items, _weights(items, meal, recency))
+    key = (id(items), meal, recency)
+    entry = _tables.get(key)
+    # entry 自己留著 list 的參照，id 不會被別的物件重用；比對 is 確認是同一份清單
+    if entry is not None and entry[0] is items:
+        _tables.move_to_end(key)
+        return entry[1]
+    table = AliasTable(items, _weights(items, meal, recency))
+    _tables[key] = (items, table)
+    while len(_tables) > MAX_TABLES:
+        _tables.popitem(last=False)
+    return table
+
+
+def _decayed(count: float, last_ts: float, now_ts: float) -> float:
+    return count * 0.5 ** (max(0.0, now_ts - last_ts) / _HALF_LIFE)
+
+
+def choose_spin(
+    guild_id: Optional[int],
+    table: AliasTable,
+    now: Optional[datetime] = None,
+    rng: random.Random = random,
+) -> str:
+    """依伺服器歷史從 table 抽出最後結果：最近抽過的不重複、常抽到的降權"""
+    history = state_store.get(guild_id, "spin_history", {}) if guild_id is not None else {}
+    window = min(SPIN_NO_REPEAT, len(table.items) - 1)
+    recent = history.get("recent", [])[-window:] if window > 0 else []
+    picks = history.get("picks", {})
+    now_ts = (now or datetime.now(TAIPEI)).timestamp()
+    fallback = None
+    for _ in range(MAX_DRAWS):
+        item = table.draw(rng)
+        if item in recent:
+            continue
+        count, last_ts = picks.get(item, (0, 0))
+        if rng.random() * (1.0 + _decayed(count, last_ts, now_ts)) < 1.0:
+            return item
+        fallback = item
+    # 清單幾乎都被視窗 / 歷史擋掉：退回不在視窗裡的最後一個，真的沒有就照表抽
+    return fallback or table.draw(rng)
+
+
+def record_spin(guild_id: Optional[int], item: str, now: Optional[datetime] = None) -> None:
+    if guild_id is None:
+        return
+    now_ts = (now or datetime.now(TAIPEI)).timestamp()
+    history = state_store.get(guild_id, "spin_history", {})
+    picks = dict(history.get("picks", {}))
+    count, last_ts = picks.get(item, (0, now_ts))
+    picks[item] = [_decayed(count, last_ts, now_ts) + 1.0, now_ts]
+    if len(picks) > SPIN_HISTORY_MAX:
+        # 只留最近抽過的 SPIN_HISTORY_MAX 道
+        for name, _ in sorted(picks.items(), key=lambda kv: kv[1][1])[: len(picks) - SPIN_HISTORY_MAX]:
+            del picks[name]
+    recent = (history.get("recent", []) + [item])[-SPIN_NO_REPEAT:] if SPIN_NO_REPEAT > 0 else []
+    state_store.set(guild_id, "spin_history", {"recent": recent, "picks": picks})
+
+
+def spin_once(
+    guild_id: Optional[int],
+    candidates: list[str],
+    custom: bool = False,
+    now: Optional[datetime] = None,
+) -> tuple[AliasTable, str]:
+    """回傳（動畫用的 table, 最後結果），並記進伺服器歷史"""
+    now = now or datetime.now(TAIPEI)
+    wishlist = not custom and candidates is not DEFAULT_SPIN_CANDIDATES
+    table = spin_table(candidates, infer_meal_by_time(now), recency=wishlist, cache=not custom)
+    choice = choose_spin(guild_id, table, now)
+    record_spin(guild_id, choice, now)
+    return table, choice
+
 
 def detect_spin_source(text: str) -> Optional[str]:
     if any(k in text for k in ["清單", "待吃", "wishlist"]):
@@ -42,22 +197,25 @@ async def run_spin_agent(
     channel: discord.abc.Messageable,
     guild_id: Optional[int],
     source: Optional[str] = None,
+    user_id: Optional[int] = None,
 ) -> None:
     candidates = pick_spin_candidates(guild_id, [], source)
     if not candidates:
         await channel.send("清單是空的，請先用 /wishlist_show 檢查或用 /spin items 自訂清單。")
         return
 
+    table, last_choice = spin_once(guild_id, candidates)
     msg = await channel.send("🎡 轉盤啟動中…")
     steps = random.randint(8, 12)
     delay = 0.18
-    last_choice = ""
     for _ in range(steps):
-        last_choice = random.choice(candidates)
-        await msg.edit(content=f"🎡 轉盤滾動中… **{last_choice}**")
+        await msg.edit(content=f"🎡 轉盤滾動中… **{table.draw()}**")
         await asyncio.sleep(delay)
         delay = min(delay + 0.05, 0.6)
 
     await msg.edit(content=f"🎯 轉盤結果：**{last_choice}**\n🔎 正在搜尋餐廳…")
-    food_ans, raw_ans = await run_food_agent(last_choice, guild_id)
-    await send_food_result(channel.send, food_ans, raw_ans)
+    log_spin(guild_id, last_choice, source or "auto")
+    fast = is_fast_mode(guild_id)
+    food_ans, raw_ans = await run_food_agent(last_choice, guild_id, fast=fast, user_id=user_id)
+    blurb = food_blurb(last_choice, raw_ans, guild_id) if fast else None
+    await send_food_result(channel.send, food_ans, raw_ans, blurb=blurb)
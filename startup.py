@@ -0,0 +1,109 @@
+import time
+
+# bot.py 最先 import 這個模組，冷啟動計時從這裡開始
+BOOT_START = time.perf_counter()
+
+import asyncio  # noqa: E402
+import hashlib  # noqa: E402
+import importlib  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+from typing import Optional  # noqa: E402
+
+from config import COMMAND_SYNC_PATH  # noqa: E402
+from telemetry import describe, inc, set_gauge  # noqa: E402
+
+# ====== 啟動流程：延後載入 agent、只在指令定義變了才同步 =====
+# 連上 Discord 只需要 discord.py 與指令定義；agent 模組（httpx / requests / Google Tools …）在背景 thread 載入，
+# 第一個用到的指令會等它載完。斜線指令的 schema hash 存在 COMMAND_SYNC_PATH，沒變就不打 sync API。
+
+AGENT_MODULES = ("food_agents", "nutrition", "router", "spin", "place_index", "prewarm")
+
+_timings: dict[str, float] = {}
+_agents_task: Optional[asyncio.Task] = None
+
+
+def mark(phase: str) -> float:
+    """記下某個階段距離開機的秒數（同一階段只記第一次，斷線重連的 on_ready 不算）"""
+    if phase not in _timings:
+        _timings[phase] = time.perf_counter() - BOOT_START
+        set_gauge("startup_seconds", _timings[phase], phase=phase)
+    return _timings[phase]
+
+
+def report() -> str:
+    parts = [f"{phase} {seconds:.2f}s" for phase, seconds in sorted(_timings.items(), key=lambda kv: kv[1])]
+    return "cold start: " + " → ".join(parts)
+
+
+# ------------------------------------------------------------
+# agent 模組延後載入
+# ------------------------------------------------------------
+def _import_agents() -> None:
+    for name in AGENT_MODULES:
+        importlib.import_module(name)
+    # Tools 也順便建好，第一個 /eat 不用再付這個成本
+    importlib.import_module("food_agents").get_food_tools()
+
+
+async def ensure_agents() -> None:
+    """第一次呼叫時在 thread 裡 import 所有 agent 模組；之後直接返回"""
+    global _agents_task
+    if _agents_task is None:
+        _agents_task = asyncio.ensure_future(asyncio.to_thread(_import_agents))
+    task = _agents_task
+    try:
+        await asyncio.shield(task)
+    except Exception:
+        # 載入失敗（例如缺 API key）不要卡住，下一個指令會再試一次並把錯誤回給使用者
+        if _agents_task is task:
+            _agents_task = None
+        raise
+    mark("agents")
+
+
+# ------------------------------------------------------------
+# 斜線指令同步
+# ------------------------------------------------------------
+def command_schema_hash(tree) -> str:
+    payload = sorted((cmd.to_dict(tree) for cmd in tree.get_commands()), key=lambda c: (c.get("type", 1), c["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _load_sync_state() -> dict:
+    if not os.path.exists(COMMAND_SYNC_PATH):
+        return {}
+    try:
+        with open(COMMAND_SYNC_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def save_sync_state(tree, application_id: Optional[int]) -> None:
+    data = {"hash": command_schema_hash(tree), "application_id": application_id, "synced_at": time.time()}
+    with open(COMMAND_SYNC_PATH, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+async def sync_commands_if_changed(client, tree) -> bool:
+    """指令定義跟上次同步時一樣就略過；有變才清掉各伺服器的舊指令並同步全域指令"""
+    state = _load_sync_state()
+    if state.get("hash") == command_schema_hash(tree) and state.get("application_id") == client.application_id:
+        inc("command_sync_total", result="skipped")
+        return False
+    # 只保留全域指令，避免全域 + guild 重複顯示
+    for guild in client.guilds:
+        try:
+            tree.clear_commands(guild=guild)
+            await tree.sync(guild=guild)
+        except Exception as e:
+            print(f"guild clear failed for {guild}: {e}")
+    await tree.sync()
+    save_sync_state(tree, client.application_id)
+    inc("command_sync_total", result="synced")
+    return True
+
+
+describe("startup_seconds", "Seconds from process start to each cold-start phase (login, ready, agents, commands).")
+describe("command_sync_total", "Slash command sync attempts at startup, skipped when the schema hash is unchanged.")
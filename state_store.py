@@ -0,0 +1,336 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable
+
+from config import STATE_DB_PATH, STATE_FLUSH_SECONDS, STATE_SNAPSHOT_MINUTES, WISHLIST_PATH
+from telemetry import describe, observe, set_gauge
+
+# ====== 各伺服器的執行期狀態（SQLite + 記憶體快取）=====
+# 待吃清單、風格、快速模式、一般聊天開關等每個伺服器的設定都存在同一個 SQLite 檔（WAL 模式）。
+# - 讀：全部載入記憶體，get() 只查 dict。
+# - 寫：set() 先改記憶體，背景 thread 每 STATE_FLUSH_SECONDS 秒把累積的修改用一個交易寫回（write-behind）。
+#   update()（讀-改-寫，例如待吃清單）直接在 BEGIN IMMEDIATE 交易裡做，多個 worker 同時改也不會遺失。
+# - 跨行程：每次寫入帶遞增的 seq，背景 thread 順便把其他 worker 寫的新 seq 讀進快取（約一個週期內看到）。
+# - 每 STATE_SNAPSHOT_MINUTES 分鐘用 SQLite backup API 寫一份快照，先寫暫存檔再 os.replace。
+# - PRAGMA user_version 記 schema 版本，開啟時依序跑 _MIGRATIONS；舊版 JSON 檔在 v1 匯入一次。
+# - 另有一張會過期的 key/value 表（put_expiring / get_expiring），給待吃清單按鈕這類「量大、只用一陣子」的資料：
+#   不載入記憶體，直接讀寫 SQLite，背景 thread 每 EXPIRING_PURGE_SECONDS 秒刪掉過期的列。
+
+SCHEMA_VERSION = 3
+EXPIRING_PURGE_SECONDS = 60.0
+
+_LEGACY_FILES = {
+    "wishlist": WISHLIST_PATH,
+    "style": "style.json",
+    "fast_mode": "fast_mode.json",
+}
+
+_local = threading.local()
+_lock = threading.Lock()
+# flush 與 update 互斥：flush 取出的修改還沒寫進去前，update 不能先讀到舊值再被它蓋掉
+_write_lock = threading.Lock()
+_initialized = False
+_cache: dict[tuple[int, str], Any] = {}
+_dirty: dict[tuple[int, str], Any] = {}
+_last_seq = 0
+_MISSING = object()
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(STATE_DB_PATH, timeout=10.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _conn() -> sqlite3.Connection:
+    """每個 thread 一條連線（sqlite3 連線不能跨 thread 共用）"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+    return conn
+
+
+# ------------------------------------------------------------
+# schema 與遷移
+# ------------------------------------------------------------
+def _migrate_v1(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS guild_state ("
+        " guild_id INTEGER NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+        " PRIMARY KEY (guild_id, key))"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    for key, path in _LEGACY_FILES.items():
+        _import_legacy(conn, key, path)
+
+
+def _migrate_v2(conn: sqlite3.Connection) -> None:
+    conn.execute("ALTER TABLE guild_state ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX guild_state_seq ON guild_state (seq)")
+
+
+def _migrate_v3(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE TABLE expiring (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+    )
+    conn.execute("CREATE INDEX expiring_expires_at ON expiring (expires_at)")
+
+
+_MIGRATIONS = {1: _migrate_v1, 2: _migrate_v2, 3: _migrate_v3}
+
+
+def _import_legacy(conn: sqlite3.Connection, key: str, path: str) -> None:
+    marker = f"imported:{key}"
+    if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+        return
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            data = {}
+        conn.executemany(
+            "INSERT OR IGNORE INTO guild_state (guild_id, key, value) VALUES (?, ?, ?)",
+            [(int(gid), key, json.dumps(value, ensure_ascii=False)) for gid, value in data.items()],
+        )
+        print(f"state store: imported {len(data)} guild(s) from {path}")
+    conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, path))
+
+
+def _upgrade(conn: sqlite3.Connection) -> None:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"{STATE_DB_PATH} schema v{version} is newer than this code (v{SCHEMA_VERSION})")
+        for v in range(version + 1, SCHEMA_VERSION + 1):
+            _MIGRATIONS[v](conn)
+            conn.execute(f"PRAGMA user_version = {v}")
+            print(f"state store: migrated {STATE_DB_PATH} to schema v{v}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def load() -> None:
+    """開啟資料庫、跑遷移並把全部狀態載入記憶體（第一次讀寫時也會自動做）"""
+    _ensure_loaded()
+
+
+def _ensure_loaded() -> None:
+    global _initialized, _last_seq
+    if _initialized:
+        return
+    with _lock:
+        if _initialized:
+            return
+        conn = _conn()
+        _upgrade(conn)
+        for guild_id, key, value, seq in conn.execute("SELECT guild_id, key, value, seq FROM guild_state"):
+            _cache[(guild_id, key)] = json.loads(value)
+            _last_seq = max(_last_seq, seq)
+        set_gauge("state_store_keys", len(_cache))
+        _initialized = True
+    threading.Thread(target=_flush_loop, name="state-store-flush", daemon=True).start()
+    atexit.register(flush)
+
+
+# ------------------------------------------------------------
+# 讀寫
+# ------------------------------------------------------------
+def get(guild_id: int, key: str, default: Any = None) -> Any:
+    _ensure_loaded()
+    return _cache.get((int(guild_id), key), default)
+
+
+def set(guild_id: int, key: str, value: Any) -> None:
+    """只改記憶體，背景 thread 批次寫回"""
+    _ensure_loaded()
+    k = (int(guild_id), key)
+    with _lock:
+        _cache[k] = value
+        _dirty[k] = value
+
+
+def update(guild_id: int, key: str, fn: Callable[[Any], Any], default: Any = None) -> Any:
+    """在同一個寫入交易裡讀出最新值、套 fn、寫回；回傳新值（其他 worker 同時改也不會遺失）"""
+    _ensure_loaded()
+    k = (int(guild_id), key)
+    conn = _conn()
+    with _write_lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            with _lock:
+                # 自己還沒寫回的修改比資料庫新；commit 成功後才從 _dirty 拿掉，失敗時留給背景寫回
+                pending = _dirty.get(k, _MISSING)
+            if pending is not _MISSING:
+                current = pending
+            else:
+                row = conn.execute(
+                    "SELECT value FROM guild_state WHERE guild_id = ? AND key = ?", k
+                ).fetchone()
+                current = default if row is None else json.loads(row[0])
+            value = fn(current)
+            _write(conn, [(k, value)])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with _lock:
+            # 交易期間又有 set() 的話，那個值比較新：留著給背景寫回，快取也不蓋掉
+            if _dirty.get(k, _MISSING) is pending:
+                _dirty.pop(k, None)
+                _cache[k] = value
+    return value
+
+
+def _write(conn: sqlite3.Connection, items: list) -> int:
+    # 呼叫端已開好 BEGIN IMMEDIATE；同一批用同一個 seq
+    seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM guild_state").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO guild_state (guild_id, key, value, seq) VALUES (?, ?, ?, ?)"
+        " ON CONFLICT (guild_id, key) DO UPDATE SET value = excluded.value, seq = excluded.seq",
+        [(gid, key, json.dumps(value, ensure_ascii=False), seq) for (gid, key), value in items],
+    )
+    return seq
+
+
+# ------------------------------------------------------------
+# 會過期的 key/value（不進記憶體快取）
+# ------------------------------------------------------------
+def put_expiring(items: dict[str, Any], ttl: float) -> None:
+    """寫入或更新多筆，過期時間一律重設成現在 + ttl 秒"""
+    _ensure_loaded()
+    expires_at = time.time() + ttl
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO expiring (key, value, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            [(key, json.dumps(value, ensure_ascii=False), expires_at) for key, value in items.items()],
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def get_expiring(key: str, default: Any = None) -> Any:
+    _ensure_loaded()
+    row = _conn().execute(
+        "SELECT value FROM expiring WHERE key = ? AND expires_at > ?", (key, time.time())
+    ).fetchone()
+    return default if row is None else json.loads(row[0])
+
+
+def purge_expired() -> int:
+    if not _initialized:
+        return 0
+    deleted = _conn().execute("DELETE FROM expiring WHERE expires_at <= ?", (time.time(),)).rowcount
+    set_gauge("state_store_expiring_keys", _conn().execute("SELECT COUNT(*) FROM expiring").fetchone()[0])
+    return deleted
+
+
+# ------------------------------------------------------------
+# 背景寫回 / 同步其他 worker / 快照
+# ------------------------------------------------------------
+def flush() -> int:
+    """把累積的 set() 用一個交易寫回；回傳寫了幾筆"""
+    if not _initialized:
+        return 0
+    with _write_lock:
+        return _flush_locked()
+
+
+def _flush_locked() -> int:
+    with _lock:
+        if not _dirty:
+            return 0
+        items = list(_dirty.items())
+        _dirty.clear()
+    start = time.perf_counter()
+    conn = _conn()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _write(conn, items)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    except Exception as e:
+        # 放回去下次再試；期間有更新的值就保留新的
+        with _lock:
+            for k, value in items:
+                _dirty.setdefault(k, value)
+        print(f"state store flush failed: {e}")
+        return 0
+    observe("state_store_flush_seconds", time.perf_counter() - start)
+    return len(items)
+
+
+def refresh() -> int:
+    """把其他 worker 寫入的新資料讀進快取；回傳更新幾筆"""
+    global _last_seq
+    if not _initialized:
+        return 0
+    # 與 update 互斥，避免讀到的舊列蓋掉 update 剛寫進快取的新值。
+    # 查詢與 JSON 解析不拿 _lock：event loop 上的 set() 只會被底下合併那一小段擋到
+    with _write_lock:
+        rows = _conn().execute(
+            "SELECT guild_id, key, value, seq FROM guild_state WHERE seq > ?", (_last_seq,)
+        ).fetchall()
+        decoded = [((guild_id, key), json.loads(value), seq) for guild_id, key, value, seq in rows]
+        with _lock:
+            for k, value, seq in decoded:
+                # 本行程還沒寫回的修改比較新，不要蓋掉
+                if k not in _dirty:
+                    _cache[k] = value
+                _last_seq = max(_last_seq, seq)
+            set_gauge("state_store_keys", len(_cache))
+    return len(rows)
+
+
+def snapshot(path: str = "") -> str:
+    """用 backup API 複製一份一致的資料庫；先寫暫存檔再換名，讀到的不會是半份"""
+    path = path or f"{STATE_DB_PATH}.snapshot"
+    tmp = f"{path}.{os.getpid()}.tmp"
+    flush()
+    dest = sqlite3.connect(tmp)
+    try:
+        _conn().backup(dest)
+    finally:
+        dest.close()
+    os.replace(tmp, path)
+    return path
+
+
+def _flush_loop() -> None:
+    next_snapshot = time.monotonic() + STATE_SNAPSHOT_MINUTES * 60
+    next_purge = time.monotonic()
+    while True:
+        time.sleep(STATE_FLUSH_SECONDS)
+        try:
+            flush()
+            refresh()
+            if time.monotonic() >= next_purge:
+                purge_expired()
+                next_purge = time.monotonic() + EXPIRING_PURGE_SECONDS
+            if STATE_SNAPSHOT_MINUTES > 0 and time.monotonic() >= next_snapshot:
+                snapshot()
+                next_snapshot = time.monotonic() + STATE_SNAPSHOT_MINUTES * 60
+        except Exception as e:
+            print(f"state store background task failed: {e}")
+
+
+describe("state_store_keys", "Per-guild state entries held in the in-memory cache.")
+describe("state_store_expiring_keys", "Unexpired rows in the expiring key/value table (wishlist buttons etc.).")
+describe("state_store_flush_seconds", "Time to write one batch of buffered state changes to SQLite.")
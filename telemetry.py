@@ -0,0 +1,227 @@
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# ====== 輕量 tracing / metrics =====
+# 關閉時 span() 回傳共用的 no-op 物件、計數函式直接 return，幾乎沒有額外成本。
+ENABLED = False
+METRIC_PREFIX = "eatbot_"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 768, 1024, 1536, 2048, 3072, 4096, 8192)
+
+_lock = threading.Lock()
+_counters: dict[tuple, float] = {}
+_gauges: dict[tuple, float] = {}
+_histograms: dict[tuple, list] = {}
+_buckets: dict[str, tuple] = {}
+_help: dict[str, str] = {}
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+_trace_queue: Optional[queue.SimpleQueue] = None
+_metrics_server: Optional[ThreadingHTTPServer] = None
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, buckets: tuple = DEFAULT_BUCKETS, **labels) -> None:
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        buckets = _buckets.setdefault(name, buckets)
+        hist = _histograms.get(key)
+        if hist is None:
+            # [各 bucket 計數..., sum, count]
+            hist = _histograms[key] = [0] * len(buckets) + [0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                hist[i] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+def describe(name: str, text: str) -> None:
+    _help[name] = text
+
+
+class Span:
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "start", "_token")
+
+    def __init__(self, name: str, attrs: dict):
+        parent = _current_span.get()
+        self.name = name
+        self.attrs = attrs
+        self.span_id = os.urandom(8).hex()
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start = 0.0
+        self._token = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        duration = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        status = "error" if exc_type else "ok"
+        observe("span_duration_seconds", duration, span=self.name, status=status)
+        if exc_type:
+            inc("span_errors_total", span=self.name, error=exc_type.__name__)
+        if _trace_queue is not None:
+            record = {
+                "ts": time.time() - duration,
+                "name": self.name,
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "duration_ms": round(duration * 1000, 3),
+                "status": status,
+                "attrs": self.attrs,
+            }
+            if exc_type:
+                record["error"] = f"{exc_type.__name__}: {exc}"
+            _trace_queue.put(record)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """用法：`with span("google.place_details", place_id=pid) as s: ...; s.set(status=...)`"""
+    if not ENABLED:
+        return _NOOP_SPAN
+    return Span(name, attrs)
+
+
+# ------------------------------------------------------------
+# 匯出：Prometheus 文字格式 + JSON lines trace log
+# ------------------------------------------------------------
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: tuple, extra: Optional[tuple] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+    lines: list[str] = []
+    seen: set[str] = set()
+
+    def header(name: str, kind: str) -> None:
+        if name in seen:
+            return
+        seen.add(name)
+        if name in _help:
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {_help[name]}")
+        lines.append(f"# TYPE {METRIC_PREFIX}{name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{METRIC_PREFIX}{name}{_fmt_labels(labels)} {value:g}")
+    for (name, labels), value in sorted(gauges.items()):
+        header(name, "gauge")
+        lines.append(f"{METRIC_PREFIX}{name}{_fmt_labels(labels)} {value:g}")
+    for (name, labels), hist in sorted(histograms.items()):
+        header(name, "histogram")
+        for bound, count in zip(_buckets.get(name, DEFAULT_BUCKETS), hist):
+            lines.append(f"{METRIC_PREFIX}{name}_bucket{_fmt_labels(labels, ('le', f'{bound:g}'))} {count}")
+        lines.append(f"{METRIC_PREFIX}{name}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {hist[-1]}")
+        lines.append(f"{METRIC_PREFIX}{name}_sum{_fmt_labels(labels)} {hist[-2]:g}")
+        lines.append(f"{METRIC_PREFIX}{name}_count{_fmt_labels(labels)} {hist[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def _trace_writer(path: str, q: queue.SimpleQueue) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        while True:
+            record = q.get()
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            if q.empty():
+                f.flush()
+
+
+def configure(enabled: bool, metrics_port: int = 0, trace_log_path: str = "", host: str = "127.0.0.1") -> None:
+    """開啟 telemetry；metrics 與 trace log 都在背景 thread 處理，不會卡住 event loop。"""
+    global ENABLED, _trace_queue, _metrics_server
+    ENABLED = enabled
+    if not enabled:
+        return
+    if trace_log_path and _trace_queue is None:
+        _trace_queue = queue.SimpleQueue()
+        threading.Thread(
+            target=_trace_writer, args=(trace_log_path, _trace_queue), name="trace-writer", daemon=True,
+        ).start()
+    if metrics_port and _metrics_server is None:
+        _metrics_server = ThreadingHTTPServer((host, metrics_port), _MetricsHandler)
+        threading.Thread(target=_metrics_server.serve_forever, name="metrics-http", daemon=True).start()
+
+
+describe("span_duration_seconds", "Duration of traced operations (LLM, upstream HTTP, agents).")
+describe("span_errors_total", "Traced operations that raised, by exception type.")
+describe("route_decisions_total", "Router decisions by source and label.")
+describe("llm_prompt_tokens", "Prompt tokens per LLM call (gateway count, or estimate), by purpose.")
+describe("llm_response_tokens", "Response tokens per LLM call (gateway count, or estimate), by purpose.")
@@ -1,9 +1,15 @@
 import re
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional, Tuple
 
+from matcher import KeywordMatcher
+
 MD_LINK = re.compile(r"\[([^\]]+)\]\((https?://[^\s)]+)\)")
 BARE_URL = re.compile(r"(?<!<)(https?://[^\s<>()]+)")
+URL_TRAILING_PUNCT = "。！？!?，,；;：:）)」』"
+TRAILING_SPACES = re.compile(r"[ \t]+\n")
+EXTRA_BLANK_LINES = re.compile(r"\n{3,}")
 
 MEAL_KEYWORDS = {
     "早餐": ["早餐", "早午餐", "brunch", "早安"],
@@ -13,69 +19,147 @@ MEAL_KEYWORDS = {
     "宵夜": ["宵夜", "消夜", "夜宵", "半夜", "凌晨"],
 }
 
+CITY_MAPPING = {
+    "基隆": "Keelung",
+    "新北": "New Taipei",
+    "新北市": "New Taipei",
+    "台南": "Tainan",
+    "臺南": "Tainan",
+    "台北": "Taipei",
+    "臺北": "Taipei",
+    "桃園": "Taoyuan",
+    "新竹": "Hsinchu",
+    "新竹市": "Hsinchu",
+    "新竹縣": "Hsinchu",
+    "苗栗": "Miaoli",
+    "高雄": "Kaohsiung",
+    "台中": "Taichung",
+    "臺中": "Taichung",
+    "彰化": "Changhua",
+    "南投": "Nantou",
+    "雲林": "Yunlin",
+    "嘉義": "Chiayi",
+    "嘉義市": "Chiayi",
+    "嘉義縣": "Chiayi",
+    "屏東": "Pingtung",
+    "宜蘭": "Yilan",
+    "花蓮": "Hualien",
+    "台東": "Taitung",
+    "臺東": "Taitung",
+    "澎湖": "Penghu",
+    "金門": "Kinmen",
+    "連江": "Lienchiang",
+}
+
+STATION_KEYWORDS = ["火車站", "車站", "捷運站"]
+
+STATION_CITY_KEYWORDS = [
+    (["台北", "臺北", "松山", "信義", "大安", "中山", "士林", "內湖", "文山", "北投", "南港", "萬華", "中正", "大同"], "Taipei"),
+    (["新北", "新北市", "板橋", "三重", "新莊", "中和", "永和", "新店", "土城", "蘆洲", "汐止"], "New Taipei"),
+    (["桃園", "中壢", "龜山", "蘆竹", "大園", "八德"], "Taoyuan"),
+    (["台中", "臺中"], "Taichung"),
+    (["台南", "臺南", "成大", "成功大學"], "Tainan"),
+    (["高雄"], "Kaohsiung"),
+]
+
+FOOD_LOCATION_KEYWORDS = [
+    (["台北", "臺北", "台北市"], ("Taipei", "台北市")),
+    (["新北", "新北市"], ("New Taipei", "新北市")),
+    (["桃園", "桃園市"], ("Taoyuan", "桃園市")),
+    (["台中", "臺中", "台中市"], ("Taichung", "台中市")),
+    (["高雄", "高雄市"], ("Kaohsiung", "高雄市")),
+    (["台南", "臺南", "台南市", "成功大學", "成大"], ("Tainan", "國立成功大學")),
+]
+
+# 比對順序即優先順序：「自行車」會同時命中「行車」，沿用原本 driving 優先的行為。
+TRAVEL_MODE_KEYWORDS = {
+    "driving": ["車程", "開車", "駕車", "行車", "車行", "汽車"],
+    "walking": ["步行", "走路"],
+    "bicycling": ["騎車", "自行車", "腳踏車", "單車"],
+}
+
+INTENT_KEYWORDS = {
+    "food": ["吃", "餐廳", "午餐", "晚餐", "宵夜", "早餐", "便當", "拉麵", "美食", "吃什麼", "吃啥"],
+    "weather": ["天氣", "氣溫", "溫度", "下雨", "冷不冷", "熱不熱"],
+    "nutrition": ["營養", "熱量", "卡路里", "蛋白質", "碳水", "脂肪", "營養成分"],
+    "spin": ["轉盤", "抽", "隨機", "random", "spin", "wheel", "幫我選", "選一個", "挑一個", "決定"],
+}
+
+
+def _build_keyword_matcher() -> KeywordMatcher:
+    # tag 為 (類別, 結果)；各函式再依原本的清單順序挑第一個命中的結果。
+    keywords = []
+    for meal, kws in MEAL_KEYWORDS.items():
+        keywords += [(k, ("meal", meal)) for k in kws]
+    keywords += [(k, ("city", k)) for k in CITY_MAPPING]
+    keywords += [(k, ("station", k)) for k in STATION_KEYWORDS]
+    for kws, city in STATION_CITY_KEYWORDS:
+        keywords += [(k, ("station_city", city)) for k in kws]
+    for idx, (kws, _) in enumerate(FOOD_LOCATION_KEYWORDS):
+        keywords += [(k, ("location", idx)) for k in kws]
+    for mode, kws in TRAVEL_MODE_KEYWORDS.items():
+        keywords += [(k, ("travel", mode)) for k in kws]
+    for intent, kws in INTENT_KEYWORDS.items():
+        keywords += [(k, ("intent", intent)) for k in kws]
+    return KeywordMatcher(keywords)
+
+
+KEYWORD_MATCHER = _build_keyword_matcher()
+
+NUTRITION_FILLER = re.compile(r"(請問|請幫我|幫我|想知道|查詢|查|一下|可以|嗎|？|\?)")
+NUTRITION_TERMS = re.compile(r"(營養成分|營養|熱量|卡路里|蛋白質|碳水|脂肪|多少)")
+ENGLISH_PREP_LOCATION = re.compile(r"\b(?:in|near|at|around)\s+([A-Za-z][A-Za-z .,'-]{1,50})", re.IGNORECASE)
+ENGLISH_WORDS = re.compile(r"[A-Za-z][A-Za-z .,'-]{1,50}")
+NON_WORD = re.compile(r"[^\w\s'-]")
+STATION_LABEL = re.compile(r"([\u4e00-\u9fffA-Za-z0-9]+(?:火車站|車站|捷運站))")
+TRAVEL_TIME = re.compile(
+    r"(?:車程|開車|駕車|行車|車行|步行|走路|騎車|自行車|腳踏車|單車)?\s*(\d{1,3})\s*分(?:鐘)?\s*(?:內|以內|左右)?"
+)
+MIN_RATING = re.compile(r"(?:評分|評價)?\s*([0-5](?:\.\d)?)\s*星?\s*(?:以上|起|或以上)")
+# 有這些字才可能講了篩選條件（數字另外判斷）；沒有就直接用預設 / 設定檔的條件
+FILTER_CUES = re.compile(r"分鐘|評分|評價|評論|星|以內|以上|遠")
+MIN_REVIEWS = re.compile(r"(?:至少|最少)?\s*(\d{2,6})\s*(?:則|个|個)?\s*評?論(?:數量)?\s*(?:以上|起|或以上)?")
+
+
+@lru_cache(maxsize=512)
+def scan_keywords(text: str) -> frozenset:
+    """一次掃描回傳所有命中的 (類別, 結果) tag；同一句話被多個函式解析時共用結果。"""
+    return KEYWORD_MATCHER.scan(text)
+
+
+def _md_link_repl(match: re.Match) -> str:
+    label, url = match.groups()
+    label_clean = label.strip()
+    if label_clean == url:
+        return url
+    return f"{label_clean}：{url}"
+
+
+def _bare_url_repl(match: re.Match) -> str:
+    # Trim trailing punctuation so the URL doesn't absorb following text.
+    return match.group(1).rstrip(URL_TRAILING_PUNCT)
+
 
 def make_urls_clickable(text: str) -> str:
     # Keep all bare URLs so Discord converts them to clickable links.
-    def md_repl(match: re.Match) -> str:
-        label, url = match.groups()
-        label_clean = label.strip()
-        if label_clean == url:
-            return url
-        return f"{label_clean}：{url}"
-
-    text = MD_LINK.sub(md_repl, text)
-    def bare_repl(match: re.Match) -> str:
-        url = match.group(1)
-        # Trim trailing punctuation so the URL doesn't absorb following text.
-        return url.rstrip("。！？!?，,；;：:）)」』")
-
-    text = BARE_URL.sub(bare_repl, text)
-    text = re.sub(r"[ \t]+\n", "\n", text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = MD_LINK.sub(_md_link_repl, text)
+    text = BARE_URL.sub(_bare_url_repl, text)
+    text = TRAILING_SPACES.sub("\n", text)
+    text = EXTRA_BLANK_LINES.sub("\n\n", text)
     return text.strip()
 
 
 def extract_nutrition_target(text: str) -> str:
-    cleaned = re.sub(r"(請問|請幫我|幫我|想知道|查詢|查|一下|可以|嗎|？|\?)", "", text)
-    cleaned = re.sub(r"(營養成分|營養|熱量|卡路里|蛋白質|碳水|脂肪|多少)", "", cleaned)
+    cleaned = NUTRITION_FILLER.sub("", text)
+    cleaned = NUTRITION_TERMS.sub("", cleaned)
     cleaned = cleaned.strip()
     return cleaned or text
 
 
 def extract_city(text: str) -> str:
-    mapping = {
-        "基隆": "Keelung",
-        "新北": "New Taipei",
-        "新北市": "New Taipei",
-        "台南": "Tainan",
-        "臺南": "Tainan",
-        "台北": "Taipei",
-        "臺北": "Taipei",
-        "桃園": "Taoyuan",
-        "新竹": "Hsinchu",
-        "新竹市": "Hsinchu",
-        "新竹縣": "Hsinchu",
-        "苗栗": "Miaoli",
-        "高雄": "Kaohsiung",
-        "台中": "Taichung",
-        "臺中": "Taichung",
-        "彰化": "Changhua",
-        "南投": "Nantou",
-        "雲林": "Yunlin",
-        "嘉義": "Chiayi",
-        "嘉義市": "Chiayi",
-        "嘉義縣": "Chiayi",
-        "屏東": "Pingtung",
-        "宜蘭": "Yilan",
-        "花蓮": "Hualien",
-        "台東": "Taitung",
-        "臺東": "Taitung",
-        "澎湖": "Penghu",
-        "金門": "Kinmen",
-        "連江": "Lienchiang",
-    }
-    for k, v in mapping.items():
-        if k in text:
+    hits = scan_keywords(text)
+    for k, v in CITY_MAPPING.items():
+        if ("city", k) in hits:
             return v
     eng_loc = extract_english_location(text)
     if eng_loc:
@@ -83,15 +167,16 @@ def extract_city(text: str) -> str:
     return "Tainan"
 
 
+@lru_cache(maxsize=512)
 def extract_english_location(text: str) -> str:
-    prep = re.search(r"\b(?:in|near|at|around)\s+([A-Za-z][A-Za-z .,'-]{1,50})", text, re.IGNORECASE)
+    prep = ENGLISH_PREP_LOCATION.search(text)
     match = prep.group(1) if prep else None
     if not match:
-        eng = re.search(r"[A-Za-z][A-Za-z .,'-]{1,50}", text)
+        eng = ENGLISH_WORDS.search(text)
         match = eng.group(0) if eng else ""
     if not match:
         return ""
-    cleaned = re.sub(r"[^\w\s'-]", " ", match)
+    cleaned = NON_WORD.sub(" ", match)
     words = cleaned.strip().split()
     stop = {
         "weather", "forecast", "temperature", "temp", "now", "today",
@@ -113,32 +198,19 @@ def extract_english_location(text: str) -> str:
 
 # Find user mentioned city, return (English city, search location label)
 def detect_food_location(text: str) -> Tuple[str, str]:
-    station_match = re.search(r"([\u4e00-\u9fffA-Za-z0-9]+(?:火車站|車站|捷運站))", text)
+    hits = scan_keywords(text)
+    station_match = None
+    if any(("station", k) in hits for k in STATION_KEYWORDS):
+        station_match = STATION_LABEL.search(text)
     if station_match:
         label = station_match.group(1)
-        city_keywords = [
-            (["台北", "臺北", "松山", "信義", "大安", "中山", "士林", "內湖", "文山", "北投", "南港", "萬華", "中正", "大同"], "Taipei"),
-            (["新北", "新北市", "板橋", "三重", "新莊", "中和", "永和", "新店", "土城", "蘆洲", "汐止"], "New Taipei"),
-            (["桃園", "中壢", "龜山", "蘆竹", "大園", "八德"], "Taoyuan"),
-            (["台中", "臺中"], "Taichung"),
-            (["台南", "臺南", "成大", "成功大學"], "Tainan"),
-            (["高雄"], "Kaohsiung"),
-        ]
-        for keywords, city in city_keywords:
-            if any(k in text for k in keywords):
+        for _, city in STATION_CITY_KEYWORDS:
+            if ("station_city", city) in hits:
                 return (city, label)
         return ("Tainan", label)
 
-    mapping = [
-        (["台北", "臺北", "台北市"], ("Taipei", "台北市")),
-        (["新北", "新北市"], ("New Taipei", "新北市")),
-        (["桃園", "桃園市"], ("Taoyuan", "桃園市")),
-        (["台中", "臺中", "台中市"], ("Taichung", "台中市")),
-        (["高雄", "高雄市"], ("Kaohsiung", "高雄市")),
-        (["台南", "臺南", "台南市", "成功大學", "成大"], ("Tainan", "國立成功大學")),
-    ]
-    for keywords, result in mapping:
-        if any(k in text for k in keywords):
+    for idx, (_, result) in enumerate(FOOD_LOCATION_KEYWORDS):
+        if ("location", idx) in hits:
             return result
     eng_loc = extract_english_location(text)
     if eng_loc:
@@ -146,24 +218,66 @@ def detect_food_location(text: str) -> Tuple[str, str]:
     return ("Tainan", "國立成功大學")
 
 
+def mentions_location(text: str) -> bool:
+    """訊息裡是否明確講了地點（城市、車站、地標或英文 in/near …）"""
+    hits = scan_keywords(text)
+    if any(kind in ("city", "station", "location") for kind, _ in hits):
+        return True
+    return bool(ENGLISH_PREP_LOCATION.search(text))
+
+
+# 「晚餐想吃拉麵」這類訊息裡除了菜名、餐別以外常見的字；去掉之後還有剩，就可能講了地點等條件
+MEAL_WORDS = re.compile("|".join(sorted((re.escape(k) for kws in MEAL_KEYWORDS.values() for k in kws), key=len, reverse=True)))
+REQUEST_FILLER = re.compile(
+    r"這附近|附近|有沒有|有什麼|什麼|推薦|一下|幫我|給我|今天|今晚|現在|等等|待會|好吃|好了|餐廳|店家|"
+    r"[我們想要吃喝找來查請的嗎呢吧啊耶店]|[\s\W_]"
+)
+
+
+def request_leftover(text: str, dish: str) -> str:
+    """拿掉菜名、餐別與點餐贅字後剩下的字（空字串代表訊息只講了要吃什麼）"""
+    rest = text.replace(dish, " ") if dish else text
+    return REQUEST_FILLER.sub("", MEAL_WORDS.sub(" ", rest))
+
+
+def mentions_food_filters(text: str) -> bool:
+    """訊息裡是否可能講了路程 / 評分 / 評論數 / 交通方式"""
+    hits = scan_keywords(text)
+    if any(kind == "travel" for kind, _ in hits):
+        return True
+    return any(ch.isdecimal() for ch in text) or bool(FILTER_CUES.search(text))
+
+
 def detect_meal_from_text(text: str) -> Optional[str]:
-    for meal, kws in MEAL_KEYWORDS.items():
-        if any(k in text for k in kws):
+    hits = scan_keywords(text)
+    for meal in MEAL_KEYWORDS:
+        if ("meal", meal) in hits:
             return meal
     return None
 
 
+def detect_intents(text: str) -> set[str]:
+    return {value for category, value in scan_keywords(text) if category == "intent"}
+
+
+# 餐別時段（小時，左閉右開）；宵夜跨午夜到隔天 05:00
+MEAL_WINDOWS = {
+    "早餐": (5.0, 10.5),
+    "午餐": (10.5, 13.5),
+    "下午茶": (13.5, 17.0),
+    "晚餐": (17.0, 21.0),
+    "宵夜": (21.0, 29.0),
+}
+
+
 def infer_meal_by_time(now: datetime) -> str:
     # 05:00-10:30 breakfast; 10:30-13:30 lunch; 13:30-17:00 tea; 17:00-21:00 dinner; 21:00-05:00 late night
     hour = now.hour + now.minute / 60
-    if 5 <= hour < 10.5:
-        return "早餐"
-    if 10.5 <= hour < 13.5:
-        return "午餐"
-    if 13.5 <= hour < 17:
-        return "下午茶"
-    if 17 <= hour < 21:
-        return "晚餐"
+    if hour < 5:
+        hour += 24
+    for meal, (start, end) in MEAL_WINDOWS.items():
+        if start <= hour < end:
+            return meal
     return "宵夜"
 
 
@@ -179,37 +293,31 @@ def extract_food_filters(
     min_reviews = default_min_reviews
     travel_mode = default_travel_mode
 
-    if re.search(r"(車程|開車|駕車|行車|車行|汽車)", text):
-        travel_mode = "driving"
-    elif re.search(r"(步行|走路)", text):
-        travel_mode = "walking"
-    elif re.search(r"(騎車|自行車|腳踏車|單車)", text):
-        travel_mode = "bicycling"
-
-    time_match = re.search(
-        r"(?:車程|開車|駕車|行車|車行|步行|走路|騎車|自行車|腳踏車|單車)?\s*(\d{1,3})\s*分(?:鐘)?\s*(?:內|以內|左右)?",
-        text,
-    )
+    hits = scan_keywords(text)
+    for mode in TRAVEL_MODE_KEYWORDS:
+        if ("travel", mode) in hits:
+            travel_mode = mode
+            break
+
+    # 沒有數字就不可能命中下列條件，省掉三次 regex 掃描。
+    if not any(ch.isdecimal() for ch in text):
+        return max_travel_time, min_rating, min_reviews, travel_mode
+
+    time_match = TRAVEL_TIME.search(text)
     if time_match:
         try:
             max_travel_time = int(time_match.group(1))
         except ValueError:
             pass
 
-    rating_match = re.search(
-        r"(?:評分|評價)?\s*([0-5](?:\.\d)?)\s*星?\s*(?:以上|起|或以上)",
-        text,
-    )
+    rating_match = MIN_RATING.search(text)
     if rating_match:
         try:
             min_rating = float(rating_match.group(1))
         except ValueError:
             pass
 
-    reviews_match = re.search(
-        r"(?:至少|最少)?\s*(\d{2,6})\s*(?:則|个|個)?\s*評?論(?:數量)?\s*(?:以上|起|或以上)?",
-        text,
-    )
+    reviews_match = MIN_REVIEWS.search(text)
     if reviews_match:
         try:
             min_reviews = int(reviews_match.group(1))
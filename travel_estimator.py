@@ -0,0 +1,162 @@
+import json
+import math
+import os
+import threading
+from collections import deque
+from typing import Optional
+
+# ====== 本機行程時間估計 =====
+# 直線距離（haversine）× 每種交通方式的「分鐘/公里」係數。係數從過去 Distance Matrix 的回應校正，
+# 並依目的地所在的網格（約 1 公里見方）分桶，某區樣本夠多就用該區的係數（巷弄多、要繞路的區域會比較慢）。
+# 估計區間完全落在門檻外就直接剔除，完全落在門檻內就直接採用，只有邊界附近的才真的打 Distance Matrix。
+
+EARTH_RADIUS_KM = 6371.0
+CELL_DEG = 0.01
+MAX_SAMPLES = 2000
+MIN_SAMPLES = 20
+MIN_CELL_SAMPLES = 8
+SAVE_EVERY = 25
+
+# 沒有樣本時的保守先驗：(最快, 最慢) 分鐘/公里，另加固定的起步分鐘數
+PRIOR_MIN_PER_KM = {
+    "walking": (11.0, 26.0),
+    "bicycling": (3.5, 9.0),
+    "driving": (1.5, 6.0),
+    "transit": (2.5, 12.0),
+}
+OVERHEAD_MIN = {"walking": 1.0, "bicycling": 2.0, "driving": 3.0, "transit": 8.0}
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    rlat1, rlat2 = math.radians(lat1), math.radians(lat2)
+    dlat = rlat2 - rlat1
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(rlat1) * math.cos(rlat2) * math.sin(dlng / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * math.asin(math.sqrt(a))
+
+
+def parse_latlng(value: str) -> Optional[tuple[float, float]]:
+    try:
+        lat, lng = (float(v) for v in value.split(",", 1))
+    except (AttributeError, ValueError):
+        return None
+    return lat, lng
+
+
+def _cell(lat: float, lng: float) -> tuple[int, int]:
+    return (math.floor(lat / CELL_DEG), math.floor(lng / CELL_DEG))
+
+
+def _quantile(sorted_values: list[float], q: float) -> float:
+    idx = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class TravelEstimator:
+    def __init__(self, path: str = ""):
+        self.path = path
+        # mode -> deque[(dest_lat, dest_lng, 分鐘/公里)]
+        self._samples: dict[str, deque] = {}
+        # mode -> {cell: [分鐘/公里, ...]}，網格只存最近的樣本
+        self._cells: dict[str, dict[tuple[int, int], deque]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._unsaved = 0
+
+    # ------------------------------------------------------------
+    # 校正樣本
+    # ------------------------------------------------------------
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        for mode, samples in data.items():
+            for lat, lng, ratio in samples:
+                self._add(mode, lat, lng, ratio)
+
+    def _add(self, mode: str, lat: float, lng: float, ratio: float) -> None:
+        samples = self._samples.setdefault(mode, deque(maxlen=MAX_SAMPLES))
+        samples.append((lat, lng, ratio))
+        cells = self._cells.setdefault(mode, {})
+        cells.setdefault(_cell(lat, lng), deque(maxlen=64)).append(ratio)
+
+    def observe(self, origin: str, destination: str, mode: str, minutes: int) -> None:
+        """記錄一筆真實的 Distance Matrix 結果（999 = 查不到，略過）"""
+        o, d = parse_latlng(origin), parse_latlng(destination)
+        if o is None or d is None or minutes >= 999:
+            return
+        km = haversine_km(*o, *d)
+        if km < 0.2:
+            return  # 太近的樣本幾乎都是起步時間，對係數沒有參考價值
+        ratio = max(0.0, minutes - OVERHEAD_MIN.get(mode, 1.0)) / km
+        with self._lock:
+            self._ensure_loaded()
+            self._add(mode, d[0], d[1], ratio)
+            self._unsaved += 1
+            should_save = self._unsaved >= SAVE_EVERY
+        if should_save:
+            self.save()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = {mode: list(samples) for mode, samples in self._samples.items()}
+            self._unsaved = 0
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    # ------------------------------------------------------------
+    # 估計
+    # ------------------------------------------------------------
+    def _ratios(self, mode: str, lat: float, lng: float) -> Optional[list[float]]:
+        """目的地附近 3×3 網格樣本夠多就用在地係數，否則用整體；都不夠回 None（用先驗）"""
+        cells = self._cells.get(mode, {})
+        cy, cx = _cell(lat, lng)
+        local = [r for dy in (-1, 0, 1) for dx in (-1, 0, 1) for r in cells.get((cy + dy, cx + dx), ())]
+        if len(local) >= MIN_CELL_SAMPLES:
+            return sorted(local)
+        samples = self._samples.get(mode)
+        if samples and len(samples) >= MIN_SAMPLES:
+            return sorted(r for _, _, r in samples)
+        return None
+
+    def estimate(self, origin: str, destination: str, mode: str) -> Optional[tuple[float, float, float]]:
+        """回傳 (下界, 估計值, 上界) 分鐘；座標解析不了回 None"""
+        o, d = parse_latlng(origin), parse_latlng(destination)
+        if o is None or d is None:
+            return None
+        km = haversine_km(*o, *d)
+        overhead = OVERHEAD_MIN.get(mode, 1.0)
+        with self._lock:
+            self._ensure_loaded()
+            ratios = self._ratios(mode, *d)
+        if ratios is None:
+            low, high = PRIOR_MIN_PER_KM.get(mode, PRIOR_MIN_PER_KM["walking"])
+            mid = (low + high) / 2
+        else:
+            low, mid, high = _quantile(ratios, 0.05), _quantile(ratios, 0.5), _quantile(ratios, 0.95)
+        return (km * low + overhead, km * mid + overhead, km * high + overhead)
+
+    def classify(self, origin: str, destination: str, mode: str, max_minutes: float) -> tuple[str, Optional[int]]:
+        """
+        "out"：一定超過門檻（不用查）；"in"：一定在門檻內（回傳估計分鐘）；"check"：邊界，要打 API 確認
+        """
+        est = self.estimate(origin, destination, mode)
+        if est is None:
+            return "check", None
+        low, mid, high = est
+        if low > max_minutes:
+            return "out", None
+        if high <= max_minutes:
+            return "in", max(1, round(mid))
+        return "check", None
@@ -1,53 +1,110 @@
-import json
-import os 
+import asyncio
+import base64
+import hashlib
 import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
 import discord
 
-from config import WISHLIST_PATH
+import state_store
+from config import WISHLIST_BUTTON_TTL_HOURS
+from name_index import NameIndex, compact, normalize_name
+
+# ====== 待吃清單按鈕 =====
+# 按鈕是 persistent 的 DynamicItem：custom_id = "wl:<ref>"，ref 是店名雜湊（11 字元）。
+# 候選資料（店名）存在 state_store 的 expiring 表，WISHLIST_BUTTON_TTL_HOURS 小時沒再出現就刪掉。
+# 所有訊息的按鈕都由同一個註冊的 handler 處理，不用替每則訊息留 View / closure，重啟後按鈕照樣能用。
+
+# 去重複：每個伺服器的清單有一份 NameIndex（name_index.py），跟它建立時的 list 一起留著；
+# 清單沒被別人改過（同一個物件或內容相同）就沿用並就地加入新項目，否則重建。
+
+CANDIDATE_PREFIX = "wl:"
+MAX_INDEXES = 1024
+COMPACT_CONFIRM_SECONDS = 120
+
+_indexes: "OrderedDict[int, tuple[list[str], NameIndex]]" = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def _index_for(guild_id: int, items: list[str]) -> NameIndex:
+    # 呼叫端持有 _index_lock
+    entry = _indexes.get(guild_id)
+    if entry is not None and (entry[0] is items or entry[0] == items):
+        _indexes.move_to_end(guild_id)
+        return entry[1]
+    index = NameIndex(items)
+    _keep_index(guild_id, items, index)
+    return index
+
 
+def _keep_index(guild_id: int, items: list[str], index: NameIndex) -> None:
+    _indexes[guild_id] = (items, index)
+    _indexes.move_to_end(guild_id)
+    while len(_indexes) > MAX_INDEXES:
+        _indexes.popitem(last=False)
 
-def _load_wishlist() -> dict:
-    if not os.path.exists(WISHLIST_PATH):
-        return {}
-    try:
-        with open(WISHLIST_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
 
+def add_to_wishlist(guild_id: int, name: str) -> tuple[bool, str]:
+    """回傳（是否新加入, 清單裡的名字）；跟既有項目算同一家時不加，回傳那個項目"""
+    existing = None
 
-def _save_wishlist(data: dict) -> None:
-    with open(WISHLIST_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    def add(items: list[str]) -> list[str]:
+        nonlocal existing
+        index = _index_for(guild_id, items)
+        existing = index.find(name)
+        if existing is not None:
+            return items
+        index.add(name)
+        new_items = items + [name]
+        _keep_index(guild_id, new_items, index)
+        return new_items
 
+    with _index_lock:
+        state_store.update(guild_id, "wishlist", add, [])
+    return existing is None, existing or name
 
-def add_to_wishlist(guild_id: int, name: str) -> bool:
-    data = _load_wishlist()
-    key = str(guild_id)
-    items = data.get(key, [])
-    if name in items:
-        return False
-    items.append(name)
-    data[key] = items
-    _save_wishlist(data)
-    return True
+
+def preview_compact(guild_id: int) -> list[tuple[str, str]]:
+    """/wishlist_compact 會合併的項目 [(刪掉的, 保留的)]；不寫回"""
+    return compact(list_wishlist(guild_id))[1]
+
+
+def compact_wishlist(guild_id: int, expected: list[tuple[str, str]]) -> bool:
+    """合併清單裡的重複項目（保留先加入的）；清單在預覽之後被改過、合併結果跟 expected 不同時不動，回傳 False"""
+    applied = False
+
+    def run(items: list[str]) -> list[str]:
+        nonlocal applied
+        kept, merged, index = compact(items)
+        if not merged or merged != expected:
+            return items
+        applied = True
+        _keep_index(guild_id, kept, index)
+        return kept
+
+    with _index_lock:
+        state_store.update(guild_id, "wishlist", run, [])
+    return applied
 
 
 def remove_from_wishlist(guild_id: int, index: int) -> tuple[bool, str]:
-    data = _load_wishlist()
-    key = str(guild_id)
-    items = data.get(key, [])
-    if index < 1 or index > len(items):
-        return False, ""
-    removed = items.pop(index - 1)
-    data[key] = items
-    _save_wishlist(data)
-    return True, removed
+    removed = ""
+
+    def remove(items: list[str]) -> list[str]:
+        nonlocal removed
+        if index < 1 or index > len(items):
+            return items
+        removed = items[index - 1]
+        return items[:index - 1] + items[index:]
+
+    state_store.update(guild_id, "wishlist", remove, [])
+    return bool(removed), removed
 
 
 def list_wishlist(guild_id: int) -> list[str]:
-    data = _load_wishlist()
-    return data.get(str(guild_id), [])
+    return state_store.get(guild_id, "wishlist", [])
 
 
 def extract_restaurant_names(text: str) -> list[str]:
@@ -64,6 +121,7 @@ def extract_restaurant_names(text: str) -> list[str]:
         "8️⃣": "8",
         "9️⃣": "9",
     }
+    seen = set()
     for line in text.splitlines():
         normalized = line
         for k, v in keycap_digits.items():
@@ -72,27 +130,105 @@ def extract_restaurant_names(text: str) -> list[str]:
         m = re.match(r"^\s*\[?\s*\d+\s*[\]\).、．-]?\s*(.+)$", normalized)
         if not m:
             continue
-        name = m.group(1).strip()
-        name = re.split(r"[（(].*$", name)[0].strip()
-        if name and name not in names:
+        name = clean_restaurant_name(m.group(1))
+        key = normalize_name(name)
+        if name and key not in seen:
+            seen.add(key)
             names.append(name)
     return names[:5]
 
 
+NAME_TAIL = re.compile(r"\s*(?:[（(｜|].*|[-–—:：]\s.*|[:：]\s*)$")
+
+
+def clean_restaurant_name(text: str) -> str:
+    """清單行的店名：拿掉粗體、括號 / 分隔線後的說明，合併空白（全形空白也算）"""
+    name = text.replace("**", "").replace("__", "").strip()
+    name = NAME_TAIL.sub("", name)
+    return " ".join(name.split())
+
+
+def candidate_ref(name: str) -> str:
+    digest = hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def remember_candidates(names: list[str]) -> list[str]:
+    """把候選店存進 state_store（重設 TTL），回傳各自的 ref"""
+    items = {CANDIDATE_PREFIX + candidate_ref(name): {"name": name} for name in names}
+    state_store.put_expiring(items, WISHLIST_BUTTON_TTL_HOURS * 3600)
+    return [key[len(CANDIDATE_PREFIX):] for key in items]
+
+
+def get_candidate(ref: str) -> Optional[dict]:
+    return state_store.get_expiring(CANDIDATE_PREFIX + ref)
+
+
+class WishlistButton(discord.ui.DynamicItem[discord.ui.Button], template=r"wl:(?P<ref>[A-Za-z0-9_-]{11})"):
+    def __init__(self, ref: str, label: str = "加入"):
+        super().__init__(
+            discord.ui.Button(label=label, style=discord.ButtonStyle.primary, custom_id=CANDIDATE_PREFIX + ref)
+        )
+        self.ref = ref
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match: re.Match):
+        return cls(match["ref"], item.label or "加入")
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        if interaction.guild_id is None:
+            await interaction.response.send_message("請在伺服器頻道使用此功能。", ephemeral=True)
+            return
+        # SQLite 讀寫（寫入交易可能要等其他 worker 的鎖）都不在 event loop 上做
+        candidate = await asyncio.to_thread(get_candidate, self.ref)
+        if candidate is None:
+            await interaction.response.send_message("這個按鈕已過期，請重新查詢一次。", ephemeral=True)
+            return
+        name = candidate["name"]
+        added, existing = await asyncio.to_thread(add_to_wishlist, interaction.guild_id, name)
+        msg = f"已加入待吃清單：{name}" if added else f"已在待吃清單：{existing}"
+        await interaction.response.send_message(msg, ephemeral=False)
+
+
 class WishlistView(discord.ui.View):
-    def __init__(self, names: list[str]):
-        super().__init__(timeout=300)
-        for idx, name in enumerate(names[:5]):
-            label = f"加入 {idx + 1}"
-            button = discord.ui.Button(label=label, style=discord.ButtonStyle.primary)
-
-            async def on_click(interaction: discord.Interaction, item=name):
-                if interaction.guild_id is None:
-                    await interaction.response.send_message("請在伺服器頻道使用此功能。", ephemeral=True)
-                    return
-                added = add_to_wishlist(interaction.guild_id, item)
-                msg = f"已加入待吃清單：{item}" if added else f"已在待吃清單：{item}"
-                await interaction.response.send_message(msg, ephemeral=False)
-
-            button.callback = on_click
-            self.add_item(button)
+    def __init__(self, refs: list[str]):
+        # 全部都是 DynamicItem：送出後 view store 不會留住這個物件
+        super().__init__(timeout=None)
+        for idx, ref in enumerate(refs[:5]):
+            self.add_item(WishlistButton(ref, f"加入 {idx + 1}"))
+
+
+async def wishlist_view(names: list[str]) -> WishlistView:
+    refs = await asyncio.to_thread(remember_candidates, names[:5])
+    return WishlistView(refs)
+
+
+class CompactConfirmView(discord.ui.View):
+    """/wishlist_compact 的預覽確認：只有下指令的人能按，COMPACT_CONFIRM_SECONDS 秒內有效"""
+
+    def __init__(self, user_id: int, merged: list[tuple[str, str]]):
+        super().__init__(timeout=COMPACT_CONFIRM_SECONDS)
+        self.user_id = user_id
+        self.merged = merged
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("只有執行 /wishlist_compact 的人可以確認。", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="確認合併", style=discord.ButtonStyle.danger)
+    async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        self.stop()
+        await interaction.response.edit_message(view=None)
+        applied = await asyncio.to_thread(compact_wishlist, interaction.guild_id, self.merged)
+        if applied:
+            await interaction.followup.send(f"已合併 {len(self.merged)} 個重複項目。")
+        else:
+            await interaction.followup.send("待吃清單在預覽之後有變動，沒有合併；請重新執行 /wishlist_compact。")
+
+    @discord.ui.button(label="取消", style=discord.ButtonStyle.secondary)
+    async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        self.stop()
+        await interaction.response.edit_message(view=None)
+        await interaction.followup.send("已取消，待吃清單沒有變動。")